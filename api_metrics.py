@@ -0,0 +1,110 @@
+import math
+import re
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import List, Dict
+from urllib.parse import unquote, urlparse
+
+# Bot command or callback currently being handled (e.g. '/saldo', 'bayar_'),
+# set per update by KasirBot and copied into executor threads by AsyncSheetsManager
+current_command: ContextVar[str] = ContextVar('current_command', default='background')
+
+def command_label(update) -> str:
+    """Label an incoming Telegram update by the command or callback that triggered it"""
+    if update.callback_query and update.callback_query.data:
+        # Callback data carries arguments after the first underscore (bayar_{tingkat}_{nama})
+        return update.callback_query.data.split('_', 1)[0] + '_'
+    
+    message = update.effective_message
+    if message is None:
+        return 'other'
+    if message.text and message.text.startswith('/'):
+        return message.text.split()[0].split('@')[0].lower()
+    if message.document:
+        return 'document'
+    return 'text'
+
+def describe_request(method: str, endpoint: str) -> tuple:
+    """Get (operation, worksheet) for a Sheets API request URL"""
+    path = unquote(urlparse(endpoint).path)
+    
+    if '/values/' in path:
+        value_range = path.split('/values/', 1)[1]
+        worksheet = value_range.split('!', 1)[0].strip("'")
+        action = re.search(r':(append|clear)$', value_range)
+        if action:
+            return f'values.{action.group(1)}', worksheet
+        return ('values.get' if method.upper() == 'GET' else 'values.update'), worksheet
+    
+    if '/values:' in path:
+        return 'values.' + path.rsplit(':', 1)[1], '*'
+    if path.endswith(':batchUpdate'):
+        return 'batchUpdate', '*'
+    if method.upper() == 'GET':
+        return 'metadata', '*'
+    return f'{method.upper()} {path.rsplit("/", 1)[-1]}', '*'
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+class ApiMetrics:
+    """Thread-safe per-command aggregation of Sheets API requests
+    
+    Keeps, for every command label, the number of times it ran, the number
+    of API requests it caused, a Counter of (operation, worksheet) and the
+    latest SAMPLE_SIZE request latencies for p50/p95/p99.
+    """
+    
+    SAMPLE_SIZE = 2048
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: Counter = Counter()
+        self._calls: Counter = Counter()
+        self._operations: Dict[str, Counter] = {}
+        self._latencies: Dict[str, deque] = {}
+    
+    def record_command(self, command: str):
+        """Count one handled update for a command"""
+        with self._lock:
+            self._runs[command] += 1
+    
+    def record_request(self, command: str, operation: str, worksheet: str, seconds: float):
+        """Record one API request made while handling a command"""
+        with self._lock:
+            self._calls[command] += 1
+            self._operations.setdefault(command, Counter())[(operation, worksheet)] += 1
+            if command not in self._latencies:
+                self._latencies[command] = deque(maxlen=self.SAMPLE_SIZE)
+            self._latencies[command].append(seconds)
+    
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._runs.clear()
+            self._calls.clear()
+            self._operations.clear()
+            self._latencies.clear()
+    
+    def snapshot(self) -> List[Dict]:
+        """Per-command stats sorted by API calls (most first), latencies in ms"""
+        with self._lock:
+            commands = set(self._runs) | set(self._calls)
+            stats = []
+            for command in commands:
+                samples = sorted(self._latencies.get(command, ()))
+                stats.append({
+                    'command': command,
+                    'runs': self._runs[command],
+                    'api_calls': self._calls[command],
+                    'p50_ms': percentile(samples, 50) * 1000,
+                    'p95_ms': percentile(samples, 95) * 1000,
+                    'p99_ms': percentile(samples, 99) * 1000,
+                    'operations': self._operations.get(command, Counter()).most_common()
+                })
+        return sorted(stats, key=lambda x: (-x['api_calls'], x['command']))
@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+from ledger_actor import LedgerActor
+from storage_backend import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+class AsyncSheetsManager:
+    """Awaitable facade over a StorageBackend that keeps the event loop free
+    
+    Blocking storage calls (gspread or SQLite) run on a bounded thread pool.
+    Writes are serialized per sheet by the backend's own locks, so a debt
+    write holds only its Tingkat sheet and calls on other sheets run
+    concurrently. Calls that touch the ledger (ledger=True) also take one
+    asyncio.Lock, keeping them in arrival order with the LedgerActor's
+    batches; everything else takes no asyncio lock at all.
+    Plain ledger entries (top-up, penarikan, pemasukan, pengeluaran,
+    pelunasan) go through the LedgerActor and return the saldo after their
+    row.
+    """
+    
+    def __init__(self, manager: StorageBackend, max_workers: int = 4):
+        self.manager = manager
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='sheets'
+        )
+        # Keeps calls that touch the ledger in arrival order with the actor's batches
+        self._ledger_lock = asyncio.Lock()
+        self.ledger_actor = LedgerActor(
+            functools.partial(self._run, manager.append_keuangan_batch, ledger=True)
+        )
+    
+    async def _run(self, func, *args, ledger: bool = False, **kwargs):
+        """Run a blocking storage call on the executor, under the ledger lock if ledger is set"""
+        if ledger:
+            async with self._ledger_lock:
+                return await self._run(func, *args, **kwargs)
+        
+        loop = asyncio.get_running_loop()
+        # Carry context variables (e.g. the current bot command) into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(context.run, func, *args, **kwargs)
+        )
+    
+    def get_pressure(self) -> Dict:
+        """Quota pressure of the backend (in-memory, safe to call on the event loop)"""
+        return self.manager.get_pressure()
+    
+    async def close(self):
+        """Write out ledger entries still queued in the actor"""
+        await self.ledger_actor.close()
+    
+    def shutdown(self):
+        """Wait for in-flight Sheets calls and stop the executor"""
+        self._executor.shutdown(wait=True)
+        self.manager.close()
+        logger.info("Sheets executor stopped")
+    
+    async def initialize_sheets(self):
+        return await self._run(self.manager.initialize_sheets)
+    
+    async def flush_outbox(self) -> int:
+        return await self._run(self.manager.flush_outbox)
+    
+    async def reload_worksheets(self):
+        return await self._run(self.manager.reload_worksheets)
+    
+    async def invalidate_cache(self, tingkat: int = None):
+        return await self._run(
+            self.manager.invalidate_cache, tingkat
+        )
+    
+    async def add_transaction(self, data: Dict):
+        return await self._run(
+            self.manager.add_transaction, data
+        )
+    
+    async def get_total_debt(self, nama: str, tingkat: int = None) -> int:
+        return await self._run(
+            self.manager.get_total_debt, nama, tingkat
+        )
+    
+    async def get_debt_breakdown(self, nama: str) -> Dict[int, int]:
+        return await self._run(self.manager.get_debt_breakdown, nama)
+    
+    async def get_unpaid_customers(self, tingkat: int = None) -> List[Dict]:
+        return await self._run(
+            self.manager.get_unpaid_customers, tingkat
+        )
+    
+    async def mark_as_paid(self, nama: str, tingkat: int) -> Dict:
+        return await self._run(
+            self.manager.mark_as_paid, nama, tingkat, ledger=True
+        )
+    
+    async def get_stats(self) -> Dict:
+        return await self._run(self.manager.get_stats)
+    
+    async def import_data(self, tingkat: int, csv_content: str) -> Dict:
+        return await self._run(
+            self.manager.import_data, tingkat, csv_content
+        )
+    
+    async def export_data(self, tingkat: int, since: str = None):
+        return await self._run(
+            self.manager.export_data, tingkat, since
+        )
+    
+    async def set_modal_awal(self, jumlah: int) -> bool:
+        return await self._run(self.manager.set_modal_awal, jumlah, ledger=True)
+    
+    async def get_modal_awal(self) -> int:
+        return await self._run(self.manager.get_modal_awal, ledger=True)
+    
+    async def get_current_saldo(self) -> int:
+        return await self._run(self.manager.get_current_saldo, ledger=True)
+    
+    # Ledger entries return the saldo after their row; penarikan and
+    # pengeluaran return None instead when the saldo is insufficient
+    
+    async def add_topup(self, jumlah: int) -> int:
+        return await self.ledger_actor.submit('Top-up', 'Tambah modal', jumlah, 0)
+    
+    async def add_penarikan(self, jumlah: int) -> int:
+        return await self.ledger_actor.submit('Penarikan', 'Ambil saldo', 0, jumlah)
+    
+    async def add_pemasukan(self, jumlah: int, keterangan: str = 'Pemasukan cash') -> int:
+        return await self.ledger_actor.submit('Pemasukan', keterangan, jumlah, 0)
+    
+    async def add_pengeluaran(self, jumlah: int, keterangan: str = 'Pengeluaran operasional') -> int:
+        return await self.ledger_actor.submit('Pengeluaran', keterangan, 0, jumlah)
+    
+    async def add_pelunasan_to_keuangan(self, nama: str, tingkat: int, jumlah: int) -> int:
+        return await self.ledger_actor.submit('Pelunasan', f'{nama} - Tingkat {tingkat}', jumlah, 0)
+    
+    async def process_payment(self, nama: str, tingkat: int, jumlah: int) -> Dict:
+        return await self._run(
+            self.manager.process_payment, nama, tingkat, jumlah, ledger=True
+        )
+    
+    async def get_keuangan_summary(self) -> Dict:
+        return await self._run(self.manager.get_keuangan_summary, ledger=True)
+    
+    async def verify_ledger(self, repair: bool = False) -> Dict:
+        return await self._run(
+            self.manager.verify_ledger, repair, ledger=True
+        )
+    
+    async def get_dashboard(self) -> Dict:
+        return await self._run(
+            self.manager.get_dashboard
+        )
+    
+    async def get_customer_history(self, nama: str, limit: int = 20) -> List[Dict]:
+        return await self._run(
+            self.manager.get_customer_history, nama, limit
+        )
+    
+    async def get_keuangan_count(self) -> int:
+        return await self._run(self.manager.get_keuangan_count, ledger=True)
+    
+    async def get_keuangan_history(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        return await self._run(
+            self.manager.get_keuangan_history, limit, offset, ledger=True
+        )
+    
+    async def add_debt_quick(self, tingkat: int, nama: str, jumlah: int):
+        return await self._run(
+            self.manager.add_debt_quick, tingkat, nama, jumlah
+        )
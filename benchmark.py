@@ -0,0 +1,162 @@
+"""Benchmark every public SheetsManager method against fake_gspread
+
+Usage:
+    python benchmark.py                          # 100, 1k and 10k customers, all modes
+    python benchmark.py --sizes 1000 --mode cache --latency 0.2
+
+Reports wall time, Sheets API request count and peak traced memory per
+method, so regressions show up in numbers without touching a live sheet.
+Memory tracing slows Python down; pass --no-memory for cleaner timings.
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+from typing import List, Dict
+from fake_gspread import FakeSpreadsheet
+from sheets_manager import SheetsManager
+
+MODES = {
+    'plain': {},
+    'cache': {'cache_ttl': 3600},
+    'write-behind': {'cache_ttl': 3600, 'write_behind': True},
+    'monthly': {'monthly_keuangan': True}
+}
+
+# Client-side quota pacing would dominate the timings, the fake has no quota by default
+UNPACED = {'read_quota': None, 'write_quota': None}
+
+def seed(spreadsheet: FakeSpreadsheet, customers: int):
+    """Fill Tingkat 1-4, History and Keuangan with `customers` rows each"""
+    for tingkat_num in range(1, 5):
+        worksheet = spreadsheet.add_worksheet(f'Tingkat {tingkat_num}', rows=1000, cols=6)
+        worksheet.load([SheetsManager.TINGKAT_HEADERS] + [
+            ['2024-01-01 10:00:00', f'Pelanggan {i}', 'Roti', 2, 3000, 6000]
+            for i in range(customers)
+        ])
+    
+    history = spreadsheet.add_worksheet('History', rows=1000, cols=5)
+    history.load([['Tanggal Lunas', 'Tingkat', 'Tanggal Transaksi', 'Nama', 'Total']] + [
+        ['2024-01-02 10:00:00', 1 + i % 4, '2024-01-01 10:00:00', f'Lunas {i}', 5000]
+        for i in range(customers)
+    ])
+    
+    keuangan = spreadsheet.add_worksheet('Keuangan', rows=1000, cols=6)
+    keuangan.load([['Tanggal', 'Tipe', 'Keterangan', 'Debit', 'Kredit', 'Saldo'],
+                   ['2024-01-01 09:00:00', 'Modal Awal', 'Modal awal usaha', 1000000, 0, 1000000]] + [
+        ['2024-01-02 10:00:00', 'Pelunasan', f'Lunas {i} - Tingkat 1', 5000, 0, 1000000 + 5000 * (i + 1)]
+        for i in range(customers - 1)
+    ])
+
+def scenario(customers: int) -> List:
+    """(label, method name, args) in run order; later steps rely on earlier ones"""
+    middle = f'Pelanggan {customers // 2}'
+    last = f'Pelanggan {customers - 1}'
+    import_csv = 'Tanggal,Nama,Barang,Jumlah,Harga Satuan,Total\n' + ''.join(
+        f'2024-02-01,Import {i},Roti,1,3000,3000\n' for i in range(50)
+    ) + ''.join(
+        f'2024-02-01,Pelanggan {i},Roti,1,3000,3000\n' for i in range(50)
+    )
+    new_transaction = {
+        'tanggal': '2024-02-01 10:00:00', 'tingkat': 1, 'nama': 'Pelanggan Baru',
+        'barang': 'Roti', 'jumlah': 1, 'harga_satuan': 3000, 'total': 3000
+    }
+    merge_transaction = dict(new_transaction, nama=middle)
+    
+    return [
+        ('initialize_sheets', 'initialize_sheets', ()),
+        ('add_transaction (new)', 'add_transaction', (new_transaction,)),
+        ('add_transaction (merge)', 'add_transaction', (merge_transaction,)),
+        ('add_debt_quick', 'add_debt_quick', (2, middle, 5000)),
+        ('get_total_debt (tingkat)', 'get_total_debt', (middle, 1)),
+        ('get_total_debt (all)', 'get_total_debt', (middle,)),
+        ('get_debt_breakdown', 'get_debt_breakdown', (middle,)),
+        ('get_unpaid_customers', 'get_unpaid_customers', ()),
+        ('get_stats', 'get_stats', ()),
+        ('process_payment (partial)', 'process_payment', (last, 3, 1000)),
+        ('process_payment (full)', 'process_payment', (last, 3, 5000)),
+        ('mark_as_paid', 'mark_as_paid', (middle, 4)),
+        ('import_data', 'import_data', (1, import_csv)),
+        ('set_modal_awal', 'set_modal_awal', (500000,)),
+        ('get_modal_awal', 'get_modal_awal', ()),
+        ('get_current_saldo', 'get_current_saldo', ()),
+        ('add_topup', 'add_topup', (10000,)),
+        ('add_penarikan', 'add_penarikan', (5000,)),
+        ('add_pemasukan', 'add_pemasukan', (7000,)),
+        ('add_pengeluaran', 'add_pengeluaran', (3000,)),
+        ('add_pelunasan_to_keuangan', 'add_pelunasan_to_keuangan', (middle, 1, 2000)),
+        ('append_keuangan_batch', 'append_keuangan_batch', ([
+            ('Top-up', 'Tambah modal', 1000, 0),
+            ('Pemasukan', 'Pemasukan cash', 2000, 0),
+            ('Pengeluaran', 'Pengeluaran operasional', 0, 500)
+        ],)),
+        ('flush_outbox', 'flush_outbox', ()),
+        ('get_keuangan_summary', 'get_keuangan_summary', ()),
+        ('get_dashboard (build)', 'get_dashboard', ()),
+        ('add_topup (after dashboard)', 'add_topup', (1000,)),
+        ('get_dashboard (memory)', 'get_dashboard', ()),
+        ('get_keuangan_history', 'get_keuangan_history', (10,)),
+        ('get_customer_history', 'get_customer_history', ('Lunas 7',)),
+        ('export_data', 'export_data', (2,)),
+        ('invalidate_cache', 'invalidate_cache', ()),
+    ]
+
+def run(customers: int, mode: str, latency: float, trace_memory: bool = True) -> List[Dict]:
+    """Run the scenario once and measure each step"""
+    spreadsheet = FakeSpreadsheet(latency=latency)
+    seed(spreadsheet, customers)
+    manager = SheetsManager(None, None, spreadsheet=spreadsheet, **UNPACED, **MODES[mode])
+    
+    results = []
+    for label, method_name, args in scenario(customers):
+        requests_before = spreadsheet.request_count
+        if trace_memory:
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        
+        result = getattr(manager, method_name)(*args)
+        
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] - memory_before if trace_memory else 0
+        if method_name == 'export_data' and result is not None:
+            result.close()
+        
+        results.append({
+            'customers': customers,
+            'mode': mode,
+            'method': label,
+            'ms': elapsed * 1000,
+            'api_calls': spreadsheet.request_count - requests_before,
+            'peak_kib': max(peak, 0) / 1024
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='customers per tingkat')
+    parser.add_argument('--mode', choices=list(MODES), action='append',
+                        help='SheetsManager configuration (repeatable, default: all)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated seconds per API request')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip tracemalloc (peak KiB reported as 0)')
+    args = parser.parse_args()
+    
+    # SheetsManager logs every call at INFO, keep the report readable
+    logging.basicConfig(level=logging.WARNING)
+    
+    if not args.no_memory:
+        tracemalloc.start()
+    print(f"{'customers':>9}  {'mode':<12}  {'method':<28}  {'ms':>10}  {'api':>4}  {'peak KiB':>10}")
+    for customers in args.sizes:
+        for mode in args.mode or list(MODES):
+            for row in run(customers, mode, args.latency, not args.no_memory):
+                print(f"{row['customers']:>9}  {row['mode']:<12}  {row['method']:<28}  "
+                      f"{row['ms']:>10.2f}  {row['api_calls']:>4}  {row['peak_kib']:>10.1f}")
+    if not args.no_memory:
+        tracemalloc.stop()
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,16 @@ from telegram.ext import (
     MessageHandler,
     ConversationHandler,
     ContextTypes,
+    TypeHandler,
     filters,
 )
 from config import Config
 from sheets_manager import SheetsManager
+from sqlite_backend import SQLiteBackend
+from async_sheets_manager import AsyncSheetsManager
+from update_processor import ChatUpdateProcessor
+from api_metrics import current_command, command_label
+from rate_limiter import is_quota_error
 from datetime import datetime
 
 # Setup logging
@@ -24,6 +30,18 @@ logger = logging.getLogger(__name__)
 TINGKAT, NAMA, BARANG, JUMLAH = range(4)
 IMPORT_TINGKAT, IMPORT_FILE = range(4, 6)
 
+# Quota pressure above which handlers skip optional Sheets reads
+PRESSURE_THRESHOLD = 0.8
+
+# Keuangan transactions per /history page
+HISTORY_PAGE_SIZE = 10
+
+# Newest paid-off debts shown by /riwayat
+RIWAYAT_LIMIT = 20
+
+# Update types the handlers use, Telegram sends nothing else
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 # Data barang
 ITEMS = {
     'roti': {'name': 'Roti', 'price': 3000},
@@ -34,10 +52,23 @@ ITEMS = {
 class KasirBot:
     def __init__(self):
         self.config = Config()
-        self.sheets = SheetsManager(
-            self.config.GOOGLE_SHEETS_CREDENTIALS,
-            self.config.SPREADSHEET_ID
-        )
+        if self.config.STORAGE_BACKEND == 'sqlite':
+            storage = SQLiteBackend(self.config.SQLITE_PATH)
+        else:
+            storage = SheetsManager(
+                self.config.GOOGLE_SHEETS_CREDENTIALS,
+                self.config.SPREADSHEET_ID,
+                cache_ttl=self.config.SHEETS_CACHE_TTL,
+                write_behind=bool(self.config.WRITE_BEHIND_INTERVAL),
+                read_quota=self.config.SHEETS_READ_QUOTA,
+                write_quota=self.config.SHEETS_WRITE_QUOTA,
+                max_retries=self.config.SHEETS_MAX_RETRIES,
+                monthly_keuangan=self.config.KEUANGAN_MONTHLY,
+                credentials_info=self.config.GOOGLE_SHEETS_CREDENTIALS_INFO,
+                # One keep-alive connection per worker (token refreshes use their own session)
+                pool_size=self.config.SHEETS_MAX_WORKERS
+            )
+        self.sheets = AsyncSheetsManager(storage, max_workers=self.config.SHEETS_MAX_WORKERS)
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command - mulai transaksi"""
@@ -89,7 +120,7 @@ class KasirBot:
         # Cek total utang yang ada untuk tingkat ini
         try:
             tingkat = int(context.user_data['tingkat'])
-            total_utang = self.sheets.get_total_debt(nama, tingkat)
+            total_utang = await self.sheets.get_total_debt(nama, tingkat)
             utang_info = f'\n💰 Total utang saat ini (Tingkat {tingkat}): *Rp {total_utang:,}*' if total_utang > 0 else ''
         except Exception as e:
             logger.error(f"Error getting debt: {e}")
@@ -156,12 +187,25 @@ class KasirBot:
                 'total': total
             }
             
-            self.sheets.add_transaction(transaction_data)
+            await self.sheets.add_transaction(transaction_data)
             
-            # Get updated total debt for this tingkat
+            # Get updated total debt for this tingkat (optional read, skipped when Sheets is busy)
             nama = context.user_data['nama']
             tingkat = int(context.user_data['tingkat'])
-            total_utang = self.sheets.get_total_debt(nama, tingkat)
+            total_utang = None
+            pressure = self.sheets.get_pressure()
+            if pressure['read'] < PRESSURE_THRESHOLD and not pressure['throttled']:
+                try:
+                    total_utang = await self.sheets.get_total_debt(nama, tingkat)
+                except Exception as e:
+                    # The transaction is already saved, only the summary is missing
+                    if not is_quota_error(e):
+                        raise
+            
+            if total_utang is None:
+                total_line = f'📊 Total utang bisa dicek dengan `/cek {nama}`\n\n'
+            else:
+                total_line = f'📊 *Total Utang {nama} (Tingkat {tingkat}): Rp {total_utang:,}*\n\n'
             
             await update.message.reply_text(
                 '✅ *Transaksi Berhasil Dicatat!*\n\n'
@@ -171,7 +215,7 @@ class KasirBot:
                 f'🔢 Jumlah: *{jumlah}*\n'
                 f'💵 Harga Satuan: *Rp {item["price"]:,}*\n'
                 f'💰 Total Transaksi: *Rp {total:,}*\n\n'
-                f'📊 *Total Utang {nama} (Tingkat {tingkat}): Rp {total_utang:,}*\n\n'
+                f'{total_line}'
                 'Ketik /start untuk transaksi baru\n'
                 'Ketik /lunas untuk pelunasan\n'
                 'Ketik /stats untuk statistik',
@@ -189,6 +233,14 @@ class KasirBot:
             )
             return JUMLAH
         except Exception as e:
+            if is_quota_error(e):
+                # Keep user_data so the same transaction can simply be sent again
+                logger.warning(f"Transaction not saved, Sheets quota exhausted: {e}")
+                await update.message.reply_text(
+                    '⏳ Google Sheets sedang sibuk, transaksi belum tersimpan.\n'
+                    'Kirim ulang jumlah dalam beberapa saat:'
+                )
+                return JUMLAH
             logger.error(f"Error saving transaction: {e}")
             await update.message.reply_text(
                 '❌ Terjadi kesalahan saat menyimpan transaksi. Silakan coba lagi.'
@@ -219,7 +271,7 @@ class KasirBot:
         tingkat = int(query.data.split('_')[2])
         
         try:
-            customers = self.sheets.get_unpaid_customers(tingkat)
+            customers = await self.sheets.get_unpaid_customers(tingkat)
             
             if not customers:
                 await query.edit_message_text(
@@ -263,15 +315,13 @@ class KasirBot:
         nama = parts[2]
         
         try:
-            # Get balance before
-            saldo_sebelum = self.sheets.get_current_saldo()
-            
-            # Mark as paid and get the amount
-            total_dilunasi = self.sheets.mark_as_paid(nama, tingkat)
+            # Saldo before and after come from the same locked write as the Pelunasan row
+            result = await self.sheets.mark_as_paid(nama, tingkat)
             
-            if total_dilunasi > 0:
-                # Get balance after
-                saldo_sekarang = self.sheets.get_current_saldo()
+            if result['success']:
+                total_dilunasi = result['total']
+                saldo_sebelum = result['saldo_sebelum']
+                saldo_sekarang = result['saldo_sekarang']
                 
                 await query.edit_message_text(
                     '✅ *Pelunasan Berhasil!*\n\n'
@@ -293,6 +343,16 @@ class KasirBot:
                 )
             
         except Exception as e:
+            # Only a quota error on the first write leaves nothing stored; once History
+            # has the row, mark_as_paid raises PartialWriteError and a retry would duplicate it
+            if is_quota_error(e):
+                # Leave the customer buttons in place so the payment can be retried
+                logger.warning(f"Pelunasan not processed, Sheets quota exhausted: {e}")
+                await query.message.reply_text(
+                    '⏳ Google Sheets sedang sibuk, pelunasan belum diproses. '
+                    'Tekan tombol nama lagi dalam beberapa saat.'
+                )
+                return
             logger.error(f"Error marking as paid: {e}")
             await query.edit_message_text(
                 '❌ Terjadi kesalahan saat memproses pelunasan.'
@@ -316,8 +376,8 @@ class KasirBot:
             breakdown = []
             grand_total = 0
             
-            for tingkat in range(1, 5):
-                total_tingkat = self.sheets.get_total_debt(nama, tingkat)
+            debt_breakdown = await self.sheets.get_debt_breakdown(nama)
+            for tingkat, total_tingkat in debt_breakdown.items():
                 if total_tingkat > 0:
                     breakdown.append(f'Tingkat {tingkat}: Rp {total_tingkat:,}')
                     grand_total += total_tingkat
@@ -343,10 +403,56 @@ class KasirBot:
                 '❌ Terjadi kesalahan saat mengecek utang.'
             )
     
+    async def riwayat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Command untuk melihat riwayat utang yang sudah lunas"""
+        if not context.args:
+            await update.message.reply_text(
+                '📜 *Cara penggunaan:*\n'
+                '`/riwayat [nama]`\n\n'
+                'Contoh: `/riwayat Yusuf`',
+                parse_mode='Markdown'
+            )
+            return
+        
+        nama = ' '.join(context.args)
+        
+        try:
+            records = await self.sheets.get_customer_history(nama, RIWAYAT_LIMIT)
+            
+            if not records:
+                await update.message.reply_text(
+                    f'📜 Belum ada utang lunas atas nama *{nama}*.',
+                    parse_mode='Markdown'
+                )
+                return
+            
+            lines = [
+                f'{record["tanggal_lunas"]} | Tingkat {record["tingkat"]} | Rp {record["total"]:,}'
+                for record in records
+            ]
+            total_lunas = sum(record['total'] for record in records)
+            
+            message = (
+                f'📜 *Riwayat Lunas*\n\n'
+                f'👤 Nama: *{nama}*\n\n'
+                + '\n'.join(lines) +
+                f'\n\n✅ *Total: Rp {total_lunas:,}*'
+            )
+            if len(records) >= RIWAYAT_LIMIT:
+                message += f'\n\nMenampilkan {RIWAYAT_LIMIT} pelunasan terakhir'
+            
+            await update.message.reply_text(message, parse_mode='Markdown')
+            
+        except Exception as e:
+            logger.error(f"Error getting customer history: {e}")
+            await update.message.reply_text(
+                '❌ Terjadi kesalahan saat mengambil riwayat pelunasan.'
+            )
+    
     async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Command untuk menampilkan statistik"""
         try:
-            stats_data = self.sheets.get_stats()
+            stats_data = await self.sheets.get_stats()
             
             message = '📊 *Statistik Per Tingkat*\n\n'
             
@@ -379,8 +485,9 @@ class KasirBot:
         if not context.args:
             await update.message.reply_text(
                 '📤 *Cara penggunaan:*\n'
-                '`/export [tingkat]`\n\n'
-                'Contoh: `/export 2`',
+                '`/export [tingkat] [sejak YYYY-MM-DD]`\n\n'
+                'Contoh: `/export 2`\n'
+                'Contoh: `/export 2 2024-01-31`',
                 parse_mode='Markdown'
             )
             return
@@ -394,33 +501,43 @@ class KasirBot:
                 )
                 return
             
-            # Get CSV data
-            csv_data = self.sheets.export_data(tingkat)
+            # Optional start date, only rows dated on or after it are exported
+            since = None
+            if len(context.args) > 1:
+                since = datetime.strptime(context.args[1], '%Y-%m-%d').strftime('%Y-%m-%d')
             
-            if not csv_data:
-                await update.message.reply_text(
-                    f'❌ Tidak ada data di Tingkat {tingkat}'
-                )
+            # Get CSV file
+            export_file = await self.sheets.export_data(tingkat, since)
+            
+            if export_file is None:
+                if since:
+                    await update.message.reply_text(
+                        f'❌ Tidak ada data di Tingkat {tingkat} sejak {since}'
+                    )
+                else:
+                    await update.message.reply_text(
+                        f'❌ Tidak ada data di Tingkat {tingkat}'
+                    )
                 return
             
             # Generate filename
-            from datetime import datetime
             filename = f'tingkat_{tingkat}_{datetime.now().strftime("%Y%m%d")}.csv'
-            
-            # Send as document
-            from io import BytesIO
-            csv_bytes = BytesIO(csv_data.encode('utf-8'))
-            csv_bytes.name = filename
-            
-            await update.message.reply_document(
-                document=csv_bytes,
-                filename=filename,
-                caption=f'✅ Export data Tingkat {tingkat}'
-            )
+            caption = f'✅ Export data Tingkat {tingkat}'
+            if since:
+                filename = f'tingkat_{tingkat}_sejak_{since.replace("-", "")}.csv'
+                caption += f' sejak {since}'
+            
+            # Sent from the spooled file (read into memory once for the upload)
+            with export_file:
+                await update.message.reply_document(
+                    document=export_file,
+                    filename=filename,
+                    caption=caption
+                )
             
         except ValueError:
             await update.message.reply_text(
-                '❌ Format tidak valid. Gunakan `/export [tingkat]`',
+                '❌ Format tidak valid. Gunakan `/export [tingkat] [sejak YYYY-MM-DD]`',
                 parse_mode='Markdown'
             )
         except Exception as e:
@@ -485,10 +602,10 @@ class KasirBot:
             
             # Import data
             tingkat = context.user_data['import_tingkat']
-            result = self.sheets.import_data(tingkat, csv_content)
+            result = await self.sheets.import_data(tingkat, csv_content)
             
             # Get total debt after import
-            stats_data = self.sheets.get_stats()
+            stats_data = await self.sheets.get_stats()
             tingkat_total = stats_data['tingkat'][tingkat]['total_debt']
             
             await update.message.reply_text(
@@ -543,7 +660,7 @@ class KasirBot:
                 return
             
             # Try to set modal awal
-            success = self.sheets.set_modal_awal(jumlah)
+            success = await self.sheets.set_modal_awal(jumlah)
             
             if success:
                 await update.message.reply_text(
@@ -553,7 +670,7 @@ class KasirBot:
                 )
             else:
                 # Modal already set
-                modal = self.sheets.get_modal_awal()
+                modal = await self.sheets.get_modal_awal()
                 await update.message.reply_text(
                     f'❌ Modal sudah ditetapkan sebelumnya: *Rp {modal:,}*\n'
                     f'💡 Gunakan /topup untuk menambah saldo',
@@ -590,9 +707,9 @@ class KasirBot:
                 )
                 return
             
-            saldo_sebelum = self.sheets.get_current_saldo()
-            self.sheets.add_topup(jumlah)
-            saldo_sekarang = self.sheets.get_current_saldo()
+            # Saldo right after this row, even when other entries land at the same time
+            saldo_sekarang = await self.sheets.add_topup(jumlah)
+            saldo_sebelum = saldo_sekarang - jumlah
             
             await update.message.reply_text(
                 '✅ *Top-up Berhasil!*\n\n'
@@ -632,7 +749,7 @@ class KasirBot:
                 )
                 return
             
-            saldo_sebelum = self.sheets.get_current_saldo()
+            saldo_sebelum = await self.sheets.get_current_saldo()
             
             # Check if sufficient balance
             if jumlah > saldo_sebelum:
@@ -644,10 +761,11 @@ class KasirBot:
                 )
                 return
             
-            success = self.sheets.add_penarikan(jumlah)
+            saldo_sekarang = await self.sheets.add_penarikan(jumlah)
             
-            if success:
-                saldo_sekarang = self.sheets.get_current_saldo()
+            # None when another entry used up the saldo in the meantime
+            if saldo_sekarang is not None:
+                saldo_sebelum = saldo_sekarang + jumlah
                 await update.message.reply_text(
                     '✅ *Penarikan Berhasil!*\n\n'
                     f'💰 Saldo Sebelum: *Rp {saldo_sebelum:,}*\n'
@@ -693,9 +811,8 @@ class KasirBot:
             # Get keterangan from remaining args
             keterangan = ' '.join(context.args[1:]) if len(context.args) > 1 else 'Pemasukan cash'
             
-            saldo_sebelum = self.sheets.get_current_saldo()
-            self.sheets.add_pemasukan(jumlah, keterangan)
-            saldo_sekarang = self.sheets.get_current_saldo()
+            saldo_sekarang = await self.sheets.add_pemasukan(jumlah, keterangan)
+            saldo_sebelum = saldo_sekarang - jumlah
             
             await update.message.reply_text(
                 '✅ *Pemasukan Berhasil Dicatat!*\n\n'
@@ -740,7 +857,7 @@ class KasirBot:
             # Get keterangan from remaining args
             keterangan = ' '.join(context.args[1:]) if len(context.args) > 1 else 'Pengeluaran operasional'
             
-            saldo_sebelum = self.sheets.get_current_saldo()
+            saldo_sebelum = await self.sheets.get_current_saldo()
             
             # Check if sufficient balance
             if jumlah > saldo_sebelum:
@@ -752,10 +869,11 @@ class KasirBot:
                 )
                 return
             
-            success = self.sheets.add_pengeluaran(jumlah, keterangan)
+            saldo_sekarang = await self.sheets.add_pengeluaran(jumlah, keterangan)
             
-            if success:
-                saldo_sekarang = self.sheets.get_current_saldo()
+            # None when another entry used up the saldo in the meantime
+            if saldo_sekarang is not None:
+                saldo_sebelum = saldo_sekarang + jumlah
                 await update.message.reply_text(
                     '✅ *Pengeluaran Berhasil Dicatat!*\n\n'
                     f'💰 Jumlah: *Rp {jumlah:,}*\n'
@@ -818,10 +936,10 @@ class KasirBot:
                 return
             
             # Add debt using quick method
-            self.sheets.add_debt_quick(tingkat, nama, jumlah)
+            await self.sheets.add_debt_quick(tingkat, nama, jumlah)
             
             # Get updated total debt for this customer
-            total_utang = self.sheets.get_total_debt(nama, tingkat)
+            total_utang = await self.sheets.get_total_debt(nama, tingkat)
             
             await update.message.reply_text(
                 '✅ *Utang Berhasil Dicatat!*\n\n'
@@ -882,7 +1000,7 @@ class KasirBot:
                 return
             
             # Process payment
-            result = self.sheets.process_payment(nama, tingkat, jumlah)
+            result = await self.sheets.process_payment(nama, tingkat, jumlah)
             
             if not result['success']:
                 if result['error'] == 'not_found':
@@ -958,22 +1076,15 @@ class KasirBot:
     async def saldo_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /saldo command to show financial dashboard"""
         try:
-            # Get financial summary
-            summary = self.sheets.get_keuangan_summary()
-            
-            # Get debt stats
-            stats_data = self.sheets.get_stats()
+            # Saldo, per-type totals and debt per tingkat, served from memory
+            summary = await self.sheets.get_dashboard()
             
             # Build debt breakdown
             debt_breakdown = ""
-            total_utang = 0
             for tingkat in range(1, 5):
-                tingkat_debt = stats_data['tingkat'][tingkat]['total_debt']
-                debt_breakdown += f"│ Tingkat {tingkat}: Rp {tingkat_debt:,}\n"
-                total_utang += tingkat_debt
-            
-            # Calculate potential total
-            potensi_total = summary['saldo'] + total_utang
+                debt_breakdown += f"│ Tingkat {tingkat}: Rp {summary['tingkat_debt'][tingkat]:,}\n"
+            total_utang = summary['total_utang']
+            potensi_total = summary['potensi_total']
             
             message = (
                 '💰 *DASHBOARD KEUANGAN JO SHOP*\n\n'
@@ -1017,9 +1128,30 @@ class KasirBot:
             )
     
     async def history_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /history command to show transaction history"""
+        """Handle /history [halaman] command to show transaction history, newest page first"""
         try:
-            history = self.sheets.get_keuangan_history(10)
+            page = 1
+            if context.args:
+                if not context.args[0].isdigit() or int(context.args[0]) < 1:
+                    await update.message.reply_text(
+                        '❌ Format tidak valid. Gunakan `/history [halaman]`\n'
+                        'Contoh: `/history 2` untuk halaman sebelumnya',
+                        parse_mode='Markdown'
+                    )
+                    return
+                page = int(context.args[0])
+            
+            total = await self.sheets.get_keuangan_count()
+            pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+            if page > pages:
+                await update.message.reply_text(
+                    f'📜 Halaman {page} tidak ada, riwayat hanya {pages} halaman.'
+                )
+                return
+            
+            history = await self.sheets.get_keuangan_history(
+                HISTORY_PAGE_SIZE, (page - 1) * HISTORY_PAGE_SIZE
+            )
             
             if not history:
                 await update.message.reply_text(
@@ -1038,7 +1170,7 @@ class KasirBot:
                 'Pengeluaran': '💸'
             }
             
-            message = '📜 *RIWAYAT TRANSAKSI KEUANGAN*\n\n'
+            message = f'📜 *RIWAYAT TRANSAKSI KEUANGAN* (halaman {page}/{pages})\n\n'
             
             for record in history:
                 icon = type_icons.get(record['tipe'], '📝')
@@ -1059,12 +1191,12 @@ class KasirBot:
                 )
             
             # Add current balance
-            current_saldo = self.sheets.get_current_saldo()
+            current_saldo = await self.sheets.get_current_saldo()
             message += f'💰 *Saldo Sekarang: Rp {current_saldo:,}*\n\n'
             
             # Add hint
-            if len(history) >= 10:
-                message += 'Menampilkan 10 transaksi terakhir\n\n'
+            if page < pages:
+                message += f'Ketik /history {page + 1} untuk transaksi sebelumnya\n\n'
             
             message += '💡 Ketik /saldo untuk dashboard lengkap'
             
@@ -1076,18 +1208,124 @@ class KasirBot:
                 '❌ Terjadi kesalahan saat mengambil riwayat transaksi.'
             )
     
+    async def track_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Tag every update with its command so Sheets API calls are attributed to it"""
+        label = command_label(update)
+        current_command.set(label)
+        if self.sheets.manager.metrics:
+            self.sheets.manager.metrics.record_command(label)
+    
+    async def perf_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admin command - show Sheets API calls and latency per bot command"""
+        if update.effective_user.id not in self.config.ADMIN_IDS:
+            await update.message.reply_text('❌ Perintah ini khusus admin.')
+            return
+        
+        metrics = self.sheets.manager.metrics
+        if metrics is None:
+            await update.message.reply_text(
+                'ℹ️ Penyimpanan lokal tidak memakai Google Sheets API.'
+            )
+            return
+        
+        if context.args and context.args[0].lower() == 'reset':
+            metrics.reset()
+            await update.message.reply_text('✅ Statistik API direset.')
+            return
+        
+        stats = metrics.snapshot()
+        if not stats:
+            await update.message.reply_text('📭 Belum ada data API.')
+            return
+        
+        lines = [f'{"perintah":<16}{"run":>5}{"api":>6}{"p50":>7}{"p95":>7}{"p99":>7}']
+        for row in stats:
+            lines.append(
+                f'{row["command"][:15]:<16}{row["runs"]:>5}{row["api_calls"]:>6}'
+                f'{row["p50_ms"]:>7.0f}{row["p95_ms"]:>7.0f}{row["p99_ms"]:>7.0f}'
+            )
+            for (operation, worksheet), count in row['operations'][:3]:
+                lines.append(f'  {operation} {worksheet}: {count}')
+        
+        # Telegram messages are capped at 4096 characters
+        table = '\n'.join(lines)[:3800]
+        await update.message.reply_text(
+            '📈 *Sheets API per perintah* (latensi dalam ms)\n'
+            f'```\n{table}\n```',
+            parse_mode='Markdown'
+        )
+    
+    async def verify_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admin command - rescan Keuangan and compare it with the running totals"""
+        if update.effective_user.id not in self.config.ADMIN_IDS:
+            await update.message.reply_text('❌ Perintah ini khusus admin.')
+            return
+        
+        repair = bool(context.args) and context.args[0].lower() == 'perbaiki'
+        try:
+            drift = await self.sheets.verify_ledger(repair)
+        except Exception as e:
+            logger.error(f"Error in verify handler: {e}")
+            await update.message.reply_text('❌ Gagal memeriksa data keuangan.')
+            return
+        
+        if not drift:
+            await update.message.reply_text('✅ Total keuangan di memori sesuai dengan sheet Keuangan.')
+            return
+        
+        table = '\n'.join(
+            f'{field}: memori {memory} / sheet {sheet}' for field, (memory, sheet) in drift.items()
+        )
+        footer = (
+            '✅ Data di memori sudah disamakan dengan sheet.' if repair
+            else 'Kirim `/verify perbaiki` untuk memuat ulang dari sheet.'
+        )
+        await update.message.reply_text(
+            '⚠️ *Selisih keuangan ditemukan*\n'
+            f'```\n{table}\n```\n{footer}',
+            parse_mode='Markdown'
+        )
+    
+    async def flush_outbox_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Periodic job - send queued write-behind changes to Google Sheets"""
+        current_command.set('job:flush_outbox')
+        try:
+            await self.sheets.flush_outbox()
+        except Exception as e:
+            # Outbox keeps the pending rows, the next run retries them
+            logger.error(f"Error flushing outbox: {e}")
+    
+    async def post_shutdown(self, application: Application):
+        """Let pending Sheets calls finish before the process exits"""
+        current_command.set('shutdown')
+        try:
+            await self.sheets.close()
+            await self.sheets.flush_outbox()
+        except Exception as e:
+            logger.error(f"Error flushing outbox on shutdown: {e}")
+        self.sheets.shutdown()
+    
     def run(self):
         """Run the bot"""
         # Initialize sheets
         try:
-            self.sheets.initialize_sheets()
-            logger.info("Google Sheets initialized successfully")
+            # Runs before the event loop starts, so call the blocking manager directly
+            self.sheets.manager.initialize_sheets()
+            logger.info(f"Storage initialized successfully ({self.config.STORAGE_BACKEND})")
         except Exception as e:
             logger.error(f"Error initializing sheets: {e}")
             return
         
         # Create application
-        application = Application.builder().token(self.config.TELEGRAM_BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(self.config.TELEGRAM_BOT_TOKEN)
+            .post_shutdown(self.post_shutdown)
+            # Different users are served in parallel, each user's updates stay in order
+            # so the conversation handlers see their steps one at a time
+            .concurrent_updates(ChatUpdateProcessor(self.config.CONCURRENT_UPDATES))
+            .build()
+        )
         
         # Conversation handler untuk transaksi
         conv_handler = ConversationHandler(
@@ -1112,12 +1350,15 @@ class KasirBot:
         )
         
         # Add handlers
+        # Group -1 runs first for every update and labels it for API metrics
+        application.add_handler(TypeHandler(Update, self.track_command), group=-1)
         application.add_handler(conv_handler)
         application.add_handler(import_handler)
         application.add_handler(CommandHandler('lunas', self.lunas))
         application.add_handler(CallbackQueryHandler(self.lunas_tingkat_handler, pattern='^lunas_tingkat_'))
         application.add_handler(CallbackQueryHandler(self.lunas_handler, pattern='^bayar_'))
         application.add_handler(CommandHandler('cek', self.cek))
+        application.add_handler(CommandHandler('riwayat', self.riwayat))
         application.add_handler(CommandHandler('stats', self.stats))
         application.add_handler(CommandHandler('export', self.export))
         
@@ -1131,10 +1372,32 @@ class KasirBot:
         application.add_handler(CommandHandler('utang', self.utang_handler))
         application.add_handler(CommandHandler('saldo', self.saldo_handler))
         application.add_handler(CommandHandler('history', self.history_handler))
+        application.add_handler(CommandHandler('perf', self.perf_handler))
+        application.add_handler(CommandHandler('verify', self.verify_handler))
+        
+        # Write-behind mode: flush queued Sheets writes in the background
+        if self.config.WRITE_BEHIND_INTERVAL and self.config.STORAGE_BACKEND == 'sheets':
+            application.job_queue.run_repeating(
+                self.flush_outbox_job,
+                interval=self.config.WRITE_BEHIND_INTERVAL,
+                first=self.config.WRITE_BEHIND_INTERVAL
+            )
         
         # Start bot
-        logger.info("Bot is starting...")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if self.config.WEBHOOK_URL:
+            logger.info(f"Bot is starting (webhook on port {self.config.WEBHOOK_PORT})...")
+            application.run_webhook(
+                listen=self.config.WEBHOOK_LISTEN,
+                port=self.config.WEBHOOK_PORT,
+                url_path=self.config.WEBHOOK_PATH,
+                webhook_url=f'{self.config.WEBHOOK_URL}/{self.config.WEBHOOK_PATH}',
+                # Requests without this X-Telegram-Bot-Api-Secret-Token header are rejected
+                secret_token=self.config.WEBHOOK_SECRET_TOKEN,
+                allowed_updates=ALLOWED_UPDATES
+            )
+        else:
+            logger.info("Bot is starting...")
+            application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == '__main__':
     bot = KasirBot()
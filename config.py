@@ -1,6 +1,7 @@
 import os
 import base64
 import json
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,24 +13,63 @@ class Config:
         self.TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
         self.SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
         
+        # Storage backend: 'sheets' (Google Sheets) or 'sqlite' (local database file)
+        self.STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sheets').strip().lower()
+        self.SQLITE_PATH = os.getenv('SQLITE_PATH', 'botutang.db')
+        
+        # Optional in-memory cache for Tingkat sheets (seconds, empty = disabled)
+        cache_ttl = os.getenv('SHEETS_CACHE_TTL')
+        self.SHEETS_CACHE_TTL = float(cache_ttl) if cache_ttl else None
+        
+        # Write-behind flush interval (seconds, empty = write inline)
+        write_behind_interval = os.getenv('WRITE_BEHIND_INTERVAL')
+        self.WRITE_BEHIND_INTERVAL = float(write_behind_interval) if write_behind_interval else None
+        
+        # Split Keuangan into monthly sheets (Keuangan YYYY-MM) with a per-month summary sheet
+        self.KEUANGAN_MONTHLY = os.getenv('KEUANGAN_MONTHLY', 'false').strip().lower() in ('1', 'true', 'yes')
+        
+        # Worker threads for blocking Google Sheets calls
+        self.SHEETS_MAX_WORKERS = int(os.getenv('SHEETS_MAX_WORKERS', '4'))
+        
+        # Telegram updates handled at the same time, each chat/user still one after another
+        self.CONCURRENT_UPDATES = max(1, int(os.getenv('CONCURRENT_UPDATES', '16')))
+        
+        # Sheets API quotas per minute used for client-side pacing, and retries after a 429
+        self.SHEETS_READ_QUOTA = int(os.getenv('SHEETS_READ_QUOTA', '60'))
+        self.SHEETS_WRITE_QUOTA = int(os.getenv('SHEETS_WRITE_QUOTA', '60'))
+        self.SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+        
+        # Webhook mode: public HTTPS base URL Telegram posts updates to (empty = long polling)
+        self.WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').strip().rstrip('/')
+        self.WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram').strip().strip('/')
+        self.WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '').strip()
+        # Local address of the webhook server (Railway provides PORT)
+        self.WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+        self.WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT') or os.getenv('PORT') or '8443')
+        
+        # Telegram user IDs allowed to run admin commands such as /perf (comma-separated)
+        admin_ids = os.getenv('ADMIN_IDS', '')
+        self.ADMIN_IDS = {int(user_id) for user_id in admin_ids.split(',') if user_id.strip()}
+        
+        # Path to the service account key file, used when CREDENTIALS_BASE64 is not set
+        self.GOOGLE_SHEETS_CREDENTIALS = os.getenv('GOOGLE_SHEETS_CREDENTIALS', 'credentials.json')
+        # Parsed service account key from CREDENTIALS_BASE64, kept in memory only
+        self.GOOGLE_SHEETS_CREDENTIALS_INFO = None
+        
         # Check if credentials in base64 (for Railway/cloud deployment)
         credentials_base64 = os.getenv('CREDENTIALS_BASE64')
         if credentials_base64:
             print("✅ Found CREDENTIALS_BASE64, decoding...")
             try:
-                # Decode base64 and save to file
+                # Decode base64 straight into the key dict, nothing is written to disk
                 credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
-                with open('credentials.json', 'w') as f:
-                    f.write(credentials_json)
-                self.GOOGLE_SHEETS_CREDENTIALS = 'credentials.json'
-                print("✅ credentials.json created successfully!")
+                self.GOOGLE_SHEETS_CREDENTIALS_INFO = json.loads(credentials_json)
+                print("✅ Credentials loaded in memory")
             except Exception as e:
                 print(f"❌ Error decoding CREDENTIALS_BASE64: {e}")
                 raise
         else:
             print("ℹ️ CREDENTIALS_BASE64 not found, using local file")
-            # Use local file
-            self.GOOGLE_SHEETS_CREDENTIALS = os.getenv('GOOGLE_SHEETS_CREDENTIALS', 'credentials.json')
         
         self._validate()
     
@@ -38,10 +78,25 @@ class Config:
         if not self.TELEGRAM_BOT_TOKEN:
             raise ValueError("TELEGRAM_BOT_TOKEN is required in .env file")
         
+        if self.WEBHOOK_URL:
+            # Telegram accepts 1-256 characters from A-Z, a-z, 0-9, _ and -
+            if not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', self.WEBHOOK_SECRET_TOKEN):
+                raise ValueError("WEBHOOK_SECRET_TOKEN (1-256 chars: A-Z, a-z, 0-9, _ or -) is required with WEBHOOK_URL")
+        
+        if self.STORAGE_BACKEND not in ('sheets', 'sqlite'):
+            raise ValueError("STORAGE_BACKEND must be 'sheets' or 'sqlite'")
+        
+        if self.STORAGE_BACKEND == 'sqlite':
+            # Local storage needs neither a spreadsheet nor Google credentials
+            return
+        
         if not self.SPREADSHEET_ID:
             raise ValueError("SPREADSHEET_ID is required in .env file")
         
-        if not os.path.exists(self.GOOGLE_SHEETS_CREDENTIALS):
+        if self.WRITE_BEHIND_INTERVAL and not self.SHEETS_CACHE_TTL:
+            raise ValueError("WRITE_BEHIND_INTERVAL requires SHEETS_CACHE_TTL in .env file")
+        
+        if not self.GOOGLE_SHEETS_CREDENTIALS_INFO and not os.path.exists(self.GOOGLE_SHEETS_CREDENTIALS):
             raise FileNotFoundError(
                 f"Google Sheets credentials file not found: {self.GOOGLE_SHEETS_CREDENTIALS}"
             )
@@ -0,0 +1,12 @@
+import pytest
+import sheets_manager
+import sqlite_backend
+from testkit import FrozenClock
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze the timestamps both backends write; move time by setting clock.current"""
+    monkeypatch.setattr(FrozenClock, 'current', FrozenClock.current)
+    monkeypatch.setattr(sheets_manager, 'datetime', FrozenClock)
+    monkeypatch.setattr(sqlite_backend, 'datetime', FrozenClock)
+    return FrozenClock
@@ -0,0 +1,40 @@
+import time
+from typing import List, Dict
+from ledger import LedgerState
+
+
+class DashboardSnapshot:
+    """Materialized /saldo figures: the ledger's saldo, modal awal and per-Tipe totals plus debt per tingkat"""
+    
+    def __init__(self, ledger: LedgerState):
+        # Shared with SheetsManager, so every Keuangan append is reflected here too
+        self.ledger = ledger
+        self.tingkat_debt = {tingkat_num: 0 for tingkat_num in range(1, 5)}
+        self.built_at = time.monotonic()
+    
+    @classmethod
+    def from_values(cls, ledger: LedgerState, tingkat_totals: Dict[int, List]) -> 'DashboardSnapshot':
+        """Build a snapshot from a ledger state and the Tingkat Total columns"""
+        snapshot = cls(ledger)
+        for tingkat_num, totals in tingkat_totals.items():
+            snapshot.tingkat_debt[tingkat_num] = sum(int(total) for total in totals if total != '')
+        return snapshot
+    
+    def is_fresh(self, ttl: float) -> bool:
+        """Check whether the snapshot is younger than ttl seconds"""
+        return time.monotonic() - self.built_at < ttl
+    
+    def apply_debt(self, tingkat: int, delta: int):
+        """Account for a change of the summed Total of one Tingkat sheet"""
+        self.tingkat_debt[tingkat] += delta
+    
+    def to_dict(self) -> Dict:
+        """Dashboard figures: the get_keuangan_summary keys plus debt per tingkat"""
+        summary = self.ledger.summary()
+        total_utang = sum(self.tingkat_debt.values())
+        return dict(
+            summary,
+            tingkat_debt=dict(self.tingkat_debt),
+            total_utang=total_utang,
+            potensi_total=summary['saldo'] + total_utang
+        )
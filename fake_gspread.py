@@ -0,0 +1,342 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import List, Dict
+import gspread
+import requests
+from gspread.utils import a1_range_to_grid_range, numericise_all, rowcol_to_a1
+
+def api_error(code: int, message: str, status: str) -> gspread.exceptions.APIError:
+    """Build the APIError gspread raises for an error response"""
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({'error': {
+        'code': code, 'message': message, 'status': status
+    }}).encode()
+    return gspread.exceptions.APIError(response)
+
+class FakeHTTPClient:
+    """Stand-in for gspread's HTTP client: counts, delays and rate-limits requests
+    
+    Every FakeWorksheet/FakeSpreadsheet operation goes through request(), one
+    call per real Sheets API request, so SheetsManager's request counting hook
+    sees the same numbers it would against Google.
+    """
+    
+    def __init__(self, latency: float = 0.0, read_quota: int = None,
+                 write_quota: int = None, quota_window: float = 60.0):
+        self.latency = latency
+        # Requests allowed per quota_window seconds (None = unlimited), like Sheets' per-minute quotas
+        self.read_quota = read_quota
+        self.write_quota = write_quota
+        self.quota_window = quota_window
+        self.request_count = 0
+        self.rejected_count = 0
+        self._reads = deque()
+        self._writes = deque()
+        self._lock = threading.Lock()
+    
+    def _quota_exceeded(self, sent: deque, quota: int, now: float) -> bool:
+        """Check the sliding window and record the request if it fits"""
+        while sent and now - sent[0] >= self.quota_window:
+            sent.popleft()
+        if quota is not None and len(sent) >= quota:
+            return True
+        sent.append(now)
+        return False
+    
+    def request(self, method: str, endpoint: str, **kwargs):
+        """Account for one API request, raising APIError 429 when over quota"""
+        if self.latency:
+            time.sleep(self.latency)
+        
+        # GET requests count against the read quota, everything else is a write
+        is_read = method.upper() == 'GET'
+        with self._lock:
+            self.request_count += 1
+            now = time.monotonic()
+            if is_read:
+                exceeded = self._quota_exceeded(self._reads, self.read_quota, now)
+            else:
+                exceeded = self._quota_exceeded(self._writes, self.write_quota, now)
+            if exceeded:
+                self.rejected_count += 1
+        
+        if exceeded:
+            raise api_error(
+                429,
+                f"Quota exceeded for quota metric '{'Read' if is_read else 'Write'} requests'",
+                'RESOURCE_EXHAUSTED'
+            )
+
+class FakeClient:
+    """Minimal gspread Client exposing http_client"""
+    
+    def __init__(self, http_client: FakeHTTPClient):
+        self.http_client = http_client
+
+class FakeWorksheet:
+    """In-memory worksheet implementing the gspread Worksheet calls SheetsManager uses
+    
+    Cells keep the Python value that was written; reads render them the way
+    the API does (get_all_values and get return strings, get_all_records
+    numericises them).
+    """
+    
+    def __init__(self, spreadsheet: 'FakeSpreadsheet', title: str, rows: int, cols: int, sheet_id: int):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self._rows: List[List] = []
+        self._row_count = rows
+        self.col_count = cols
+    
+    @property
+    def row_count(self) -> int:
+        return max(self._row_count, len(self._rows))
+    
+    def _request(self, method: str, path: str):
+        self.spreadsheet._request(method, path)
+    
+    def _rendered(self, rows: List[List]) -> List[List[str]]:
+        """Render cells as formatted strings, dropping trailing empty cells and rows"""
+        rendered = []
+        for row in rows:
+            values = ['' if value is None else str(value) for value in row]
+            while values and values[-1] == '':
+                values.pop()
+            rendered.append(values)
+        while rendered and not rendered[-1]:
+            rendered.pop()
+        return rendered
+    
+    def _grid(self, range_name: str) -> Dict:
+        """Parse an A1 range into 0-based bounds (end exclusive)"""
+        grid = a1_range_to_grid_range(range_name)
+        return {
+            'start_row': grid.get('startRowIndex', 0),
+            'end_row': grid.get('endRowIndex', self.row_count),
+            'start_col': grid.get('startColumnIndex', 0),
+            'end_col': grid.get('endColumnIndex', self.col_count)
+        }
+    
+    def _write(self, start_row: int, start_col: int, values: List[List]):
+        """Write a block of values with its top-left cell at 0-based (row, col)"""
+        for row_offset, row_values in enumerate(values):
+            row_idx = start_row + row_offset
+            while len(self._rows) <= row_idx:
+                self._rows.append([])
+            row = self._rows[row_idx]
+            for col_offset, value in enumerate(row_values):
+                col_idx = start_col + col_offset
+                while len(row) <= col_idx:
+                    row.append('')
+                row[col_idx] = value
+    
+    def _used_rows(self) -> int:
+        """Number of rows up to the last non-empty one"""
+        used = len(self._rows)
+        while used and not any(value not in ('', None) for value in self._rows[used - 1]):
+            used -= 1
+        return used
+    
+    def load(self, rows: List[List]):
+        """Seed rows directly without issuing requests (for benchmarks)"""
+        self._rows = [list(row) for row in rows]
+    
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        self._request('get', f"/values/'{self.title}'")
+        return self._rendered(self._rows)
+    
+    def get_all_records(self, head: int = 1, **kwargs) -> List[Dict]:
+        self._request('get', f"/values/'{self.title}'")
+        values = self._rendered(self._rows)
+        if len(values) < head:
+            return []
+        
+        headers = values[head - 1]
+        records = []
+        for row in values[head:]:
+            row = row + [''] * (len(headers) - len(row))
+            records.append(dict(zip(headers, numericise_all(row[:len(headers)]))))
+        return records
+    
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        self._request('get', f"/values/'{self.title}'!{row}:{row}")
+        rendered = self._rendered(self._rows[row - 1:row])
+        return rendered[0] if rendered else []
+    
+    def _block(self, range_name: str, unformatted: bool = False) -> List[List]:
+        """Values inside an A1 range, rendered unless unformatted, trailing blanks dropped"""
+        grid = self._grid(range_name)
+        rows = [
+            row[grid['start_col']:grid['end_col']]
+            for row in self._rows[grid['start_row']:grid['end_row']]
+        ]
+        if not unformatted:
+            return self._rendered(rows)
+        
+        block = []
+        for row in rows:
+            values = ['' if value is None else value for value in row]
+            while values and values[-1] == '':
+                values.pop()
+            block.append(values)
+        while block and not block[-1]:
+            block.pop()
+        return block
+    
+    def get(self, range_name: str = None, **kwargs) -> List[List[str]]:
+        self._request('get', f"/values/'{self.title}'!{range_name}")
+        return self._block(range_name)
+    
+    def append_row(self, values: List, value_input_option=None, **kwargs):
+        self._request('post', f"/values/'{self.title}'!A1:append")
+        self._write(self._used_rows(), 0, [values])
+    
+    def append_rows(self, values: List[List], value_input_option=None, **kwargs):
+        self._request('post', f"/values/'{self.title}'!A1:append")
+        self._write(self._used_rows(), 0, values)
+    
+    def update_cell(self, row: int, col: int, value):
+        self._request('put', f"/values/'{self.title}'!{rowcol_to_a1(row, col)}")
+        self._write(row - 1, col - 1, [[value]])
+    
+    def update(self, values: List[List] = None, range_name: str = None, **kwargs):
+        self._request('put', f"/values/'{self.title}'!{range_name}")
+        grid = self._grid(range_name or 'A1')
+        self._write(grid['start_row'], grid['start_col'], values)
+    
+    def batch_update(self, data: List[Dict], **kwargs):
+        self._request('post', '/values:batchUpdate')
+        for value_range in data:
+            grid = self._grid(value_range['range'])
+            self._write(grid['start_row'], grid['start_col'], value_range['values'])
+    
+    def delete_rows(self, start_index: int, end_index: int = None):
+        self._request('post', ':batchUpdate')
+        del self._rows[start_index - 1:(end_index or start_index)]
+    
+    def format(self, ranges, format: Dict = None, **kwargs):
+        self._request('post', ':batchUpdate')
+
+class FakeSpreadsheet:
+    """In-memory spreadsheet that can be injected into SheetsManager
+    
+    Example:
+        fake = FakeSpreadsheet(latency=0.2, write_quota=60)
+        manager = SheetsManager(None, None, spreadsheet=fake)
+    """
+    
+    URL = 'https://sheets.googleapis.com/v4/spreadsheets'
+    
+    def __init__(self, latency: float = 0.0, read_quota: int = None,
+                 write_quota: int = None, quota_window: float = 60.0):
+        self.client = FakeClient(FakeHTTPClient(latency, read_quota, write_quota, quota_window))
+        self.id = 'fake-spreadsheet'
+        self._worksheets: Dict[str, FakeWorksheet] = {}
+        # Spreadsheet-level developer metadata entries
+        self.developer_metadata: List[Dict] = []
+    
+    @property
+    def request_count(self) -> int:
+        return self.client.http_client.request_count
+    
+    def _request(self, method: str, path: str):
+        """Send one request for a path relative to the spreadsheet URL"""
+        self.client.http_client.request(method, f'{self.URL}/{self.id}{path}')
+    
+    def worksheets(self) -> List[FakeWorksheet]:
+        self._request('get', '')
+        return list(self._worksheets.values())
+    
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._request('get', '')
+        if title not in self._worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._worksheets[title]
+    
+    def fetch_sheet_metadata(self, params: Dict = None) -> Dict:
+        self._request('get', '')
+        return {
+            'spreadsheetId': self.id,
+            'sheets': [
+                {'properties': {
+                    'sheetId': worksheet.id,
+                    'title': worksheet.title,
+                    'gridProperties': {'rowCount': worksheet.row_count, 'columnCount': worksheet.col_count}
+                }}
+                for worksheet in self._worksheets.values()
+            ],
+            'developerMetadata': [dict(entry) for entry in self.developer_metadata]
+        }
+    
+    def values_batch_get(self, ranges: List[str], params: Dict = None) -> Dict:
+        self._request('get', '/values:batchGet')
+        params = params or {}
+        unformatted = params.get('valueRenderOption') == 'UNFORMATTED_VALUE'
+        by_columns = params.get('majorDimension') == 'COLUMNS'
+        
+        value_ranges = []
+        for range_name in ranges:
+            title, _, cells = range_name.partition('!')
+            title = title.strip("'")
+            if title not in self._worksheets:
+                raise api_error(400, f'Unable to parse range: {range_name}', 'INVALID_ARGUMENT')
+            
+            values = self._worksheets[title]._block(cells, unformatted)
+            if by_columns and values:
+                width = max(len(row) for row in values)
+                values = [[row[col] if col < len(row) else '' for row in values] for col in range(width)]
+                for column in values:
+                    while column and column[-1] == '':
+                        column.pop()
+            
+            value_range = {'range': range_name, 'majorDimension': 'COLUMNS' if by_columns else 'ROWS'}
+            if values:
+                value_range['values'] = values
+            value_ranges.append(value_range)
+        
+        return {'spreadsheetId': self.id, 'valueRanges': value_ranges}
+    
+    def add_worksheet(self, title: str, rows: int, cols: int, **kwargs) -> FakeWorksheet:
+        self._request('post', ':batchUpdate')
+        worksheet = FakeWorksheet(self, title, rows, cols, sheet_id=len(self._worksheets))
+        self._worksheets[title] = worksheet
+        return worksheet
+    
+    def batch_update(self, body: Dict):
+        self._request('post', ':batchUpdate')
+        by_id = {worksheet.id: worksheet for worksheet in self._worksheets.values()}
+        for request in body.get('requests', []):
+            if 'deleteDimension' in request:
+                grid = request['deleteDimension']['range']
+                del by_id[grid['sheetId']]._rows[grid['startIndex']:grid['endIndex']]
+            elif 'addSheet' in request:
+                properties = request['addSheet']['properties']
+                grid = properties.get('gridProperties', {})
+                worksheet = FakeWorksheet(
+                    self, properties['title'], grid.get('rowCount', 1000), grid.get('columnCount', 26),
+                    sheet_id=properties.get('sheetId', len(self._worksheets))
+                )
+                self._worksheets[worksheet.title] = by_id[worksheet.id] = worksheet
+            elif 'updateCells' in request:
+                # Only values are kept, formats are ignored like in format()
+                start = request['updateCells']['start']
+                by_id[start['sheetId']]._write(start.get('rowIndex', 0), start.get('columnIndex', 0), [
+                    [next(iter(cell.get('userEnteredValue', {'stringValue': ''}).values())) for cell in row['values']]
+                    for row in request['updateCells']['rows']
+                ])
+            elif 'createDeveloperMetadata' in request:
+                entry = dict(request['createDeveloperMetadata']['developerMetadata'])
+                entry['metadataId'] = len(self.developer_metadata) + 1
+                self.developer_metadata.append(entry)
+            elif 'updateDeveloperMetadata' in request:
+                update = request['updateDeveloperMetadata']
+                ids = {lookup['developerMetadataLookup']['metadataId'] for lookup in update['dataFilters']}
+                for entry in self.developer_metadata:
+                    if entry['metadataId'] in ids:
+                        entry['metadataValue'] = update['developerMetadata']['metadataValue']
+            else:
+                raise NotImplementedError(f"Fake batch_update does not support: {list(request)}")
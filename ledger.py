@@ -0,0 +1,172 @@
+import re
+from typing import List, Dict
+
+# Original single-sheet ledger, the oldest partition once monthly partitions are enabled
+LEGACY_SHEET = 'Keuangan'
+
+# Per-partition totals of closed monthly partitions
+SUMMARY_SHEET = 'Keuangan Ringkasan'
+
+PARTITION_PATTERN = re.compile(r'^Keuangan (\d{4}-\d{2})$')
+
+def partition_name(month: str) -> str:
+    """Worksheet title of a monthly Keuangan partition (month as YYYY-MM)"""
+    return f'{LEGACY_SHEET} {month}'
+
+def first_data_row(sheet_name: str) -> int:
+    """Sheet row of the first transaction (monthly partitions open with a balance row)"""
+    return 3 if PARTITION_PATTERN.match(sheet_name) else 2
+
+
+class LedgerState:
+    """In-memory tail of the Keuangan ledger (current saldo, modal awal, last row, per-Tipe totals)
+    
+    With monthly partitions the tail is the newest `Keuangan YYYY-MM` sheet;
+    totals of older partitions come from their rows in the summary sheet,
+    so only the current month is ever read in full.
+    """
+    
+    # Keuangan columns: Tanggal, Tipe, Keterangan, Debit, Kredit, Saldo
+    HEADERS = ['Tanggal', 'Tipe', 'Keterangan', 'Debit', 'Kredit', 'Saldo']
+    
+    # Tipe -> (summary key, column summed into it)
+    TIPE_TOTALS = {
+        'Pelunasan': ('total_pelunasan', 'Debit'),
+        'Pembayaran Cicilan': ('total_cicilan', 'Debit'),
+        'Pemasukan': ('total_pemasukan', 'Debit'),
+        'Pengeluaran': ('total_pengeluaran_ops', 'Kredit'),
+        'Penarikan': ('total_penarikan', 'Kredit')
+    }
+    
+    # Tipe of the row that opens a monthly partition with the carried-over saldo
+    OPENING_TIPE = 'Saldo Awal'
+    
+    # Summary sheet columns, one row per closed partition
+    SUMMARY_HEADERS = ['Partisi', 'Saldo Awal', 'Saldo Akhir', 'Modal Awal'] + list(TIPE_TOTALS) + ['Transaksi']
+    
+    def __init__(self, saldo: int = 0, modal_awal: int = None, last_row: int = 1,
+                 sheet_name: str = LEGACY_SHEET):
+        self.saldo = saldo
+        self.modal_awal = modal_awal
+        # Sheet holding the tail (None = no partition created yet)
+        self.sheet_name = sheet_name
+        # Sheet row number of the newest entry (1 = header only)
+        self.last_row = last_row
+        # Running sums per summary key, advanced with every appended row
+        self.totals = {key: 0 for key, _ in self.TIPE_TOTALS.values()}
+        # Transactions across all partitions (opening rows excluded)
+        self.transactions = 0
+        # (sheet name, transactions) of closed partitions, oldest first
+        self.closed: List[tuple] = []
+        self._mark_opening()
+    
+    @property
+    def month(self) -> str:
+        """YYYY-MM of the current partition, None for the legacy sheet"""
+        match = PARTITION_PATTERN.match(self.sheet_name or '')
+        return match.group(1) if match else None
+    
+    @classmethod
+    def from_records(cls, records: List[Dict], closed: List[Dict] = (),
+                     sheet_name: str = LEGACY_SHEET) -> 'LedgerState':
+        """Build state from the current sheet's records and summary rows of closed partitions"""
+        state = cls(last_row=len(records) + 1, sheet_name=sheet_name)
+        
+        for summary in closed:
+            if state.modal_awal is None and summary.get('Modal Awal') not in (None, ''):
+                state.modal_awal = int(summary['Modal Awal'])
+            for tipe, (key, _) in cls.TIPE_TOTALS.items():
+                state.totals[key] += int(summary.get(tipe) or 0)
+            state.saldo = int(summary.get('Saldo Akhir') or 0)
+            state.transactions += int(summary.get('Transaksi') or 0)
+            state.closed.append((summary.get('Partisi'), int(summary.get('Transaksi') or 0)))
+        state._mark_opening()
+        
+        if records:
+            state.saldo = int(records[-1].get('Saldo') or 0)
+        
+        for record in records:
+            if record.get('Tipe') == 'Modal Awal' and state.modal_awal is None:
+                state.modal_awal = int(record.get('Debit') or 0)
+            state._count(record)
+        
+        return state
+    
+    def _mark_opening(self):
+        """Remember the figures the current partition started from"""
+        self._opening = (dict(self.totals), self.transactions, self.saldo)
+    
+    def _count(self, record: Dict):
+        """Add a Keuangan record to the per-Tipe totals and the transaction count"""
+        if record.get('Tipe') in self.TIPE_TOTALS:
+            key, column = self.TIPE_TOTALS[record['Tipe']]
+            self.totals[key] += int(record.get(column) or 0)
+        if record.get('Tipe') != self.OPENING_TIPE:
+            self.transactions += 1
+    
+    def advance(self, row: List) -> int:
+        """Account for a Keuangan row appended after the current tail"""
+        tipe, debit, saldo = row[1], row[3], row[5]
+        self.saldo = int(saldo)
+        self.last_row += 1
+        
+        if tipe == 'Modal Awal' and self.modal_awal is None:
+            self.modal_awal = int(debit)
+        self._count(dict(zip(self.HEADERS, row)))
+        
+        return self.saldo
+    
+    def partition_summary(self) -> List:
+        """Summary sheet row for the current partition"""
+        opening_totals, opening_transactions, opening_saldo = self._opening
+        return [
+            self.sheet_name,
+            opening_saldo,
+            self.saldo,
+            '' if self.modal_awal is None else self.modal_awal
+        ] + [
+            self.totals[key] - opening_totals[key] for key, _ in self.TIPE_TOTALS.values()
+        ] + [self.transactions - opening_transactions]
+    
+    def opening_row(self, month: str) -> List:
+        """First row of a new monthly partition, carrying over the current saldo"""
+        return [f'{month}-01 00:00:00', self.OPENING_TIPE, 'Saldo dibawa dari bulan sebelumnya', 0, 0, self.saldo]
+    
+    def open_partition(self, month: str):
+        """Close the current partition and continue in the one for `month`"""
+        if self.sheet_name is not None:
+            self.closed.append((self.sheet_name, self.transactions - self._opening[1]))
+        self.sheet_name = partition_name(month)
+        # Header plus the opening balance row
+        self.last_row = 2
+        self._mark_opening()
+    
+    def segments(self) -> List[tuple]:
+        """(sheet name, first row, last row) of every partition's transactions, newest first"""
+        segments = []
+        if self.sheet_name is not None:
+            segments.append((self.sheet_name, first_data_row(self.sheet_name), self.last_row))
+        for sheet_name, transactions in reversed(self.closed):
+            first = first_data_row(sheet_name)
+            segments.append((sheet_name, first, first + transactions - 1))
+        return segments
+    
+    def summary(self) -> Dict:
+        """Financial dashboard figures, as returned by get_keuangan_summary"""
+        modal_awal = self.modal_awal or 0
+        totals = self.totals
+        return dict(
+            totals,
+            saldo=self.saldo,
+            modal_awal=modal_awal,
+            profit=self.saldo - modal_awal,
+            total_pendapatan=totals['total_pelunasan'] + totals['total_cicilan'] + totals['total_pemasukan'],
+            total_pengeluaran=totals['total_pengeluaran_ops'] + totals['total_penarikan']
+        )
+    
+    def drift(self, other: 'LedgerState') -> Dict:
+        """Fields that differ from another state, as {field: (self value, other value)}"""
+        fields = ['saldo', 'modal_awal', 'sheet_name', 'last_row', 'transactions']
+        mine = dict(self.totals, **{field: getattr(self, field) for field in fields})
+        theirs = dict(other.totals, **{field: getattr(other, field) for field in fields})
+        return {field: (mine[field], theirs[field]) for field in mine if mine[field] != theirs[field]}
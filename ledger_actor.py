@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from api_metrics import current_command
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerActor:
+    """Single writer for Keuangan appends
+    
+    Callers put (tipe, keterangan, debit, kredit) entries on one
+    asyncio.Queue and await a future. The actor drains whatever is queued
+    into one append batch per tick, so saldo is assigned strictly in queue
+    order from the backend's in-memory tail, and a burst of commands costs
+    a single append request. Each future resolves to the saldo after its
+    row, or None when a withdrawal would take the saldo below zero.
+    """
+    
+    # Most entries written by one batch
+    MAX_BATCH = 50
+    
+    def __init__(self, append_batch):
+        # Coroutine function: list of entries -> saldo after each of them
+        self.append_batch = append_batch
+        # Created on first use so they belong to the running event loop
+        self.queue: asyncio.Queue = None
+        self._task = None
+    
+    async def submit(self, tipe: str, keterangan: str, debit: int, kredit: int) -> int:
+        """Queue one Keuangan row and wait for the saldo after it"""
+        if self._task is None:
+            self.queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((tipe, keterangan, debit, kredit), future))
+        return await future
+    
+    async def _run(self):
+        """Write queued entries, one batch per tick, until cancelled"""
+        # The task inherited the context of whichever command started it, and
+        # a batch mixes entries from several commands, so count it on its own
+        current_command.set('ledger')
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            
+            try:
+                saldos = await self.append_batch([entry for entry, _ in batch])
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} Keuangan row(s): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), saldo in zip(batch, saldos):
+                    # The caller may have given up waiting, the row is written anyway
+                    if not future.done():
+                        future.set_result(saldo)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    async def close(self):
+        """Write out everything still queued and stop the actor"""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
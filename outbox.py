@@ -0,0 +1,50 @@
+from typing import List, Dict
+from sheet_cache import TingkatTable
+
+
+class Outbox:
+    """Pending Sheets writes for write-behind mode
+    
+    Tingkat changes are applied to the cached TingkatTable right away. The
+    outbox only remembers the rows as they were last written to the sheet,
+    so a flush can diff them against the table: removed rows are deleted,
+    changed rows are rewritten once (however many debts were merged into
+    them) and new rows are appended. History and Keuangan rows are kept in
+    arrival order and flushed as one multi-row append per sheet.
+    """
+    
+    def __init__(self):
+        # Tingkat sheet -> records as they currently are on the sheet (row order)
+        self.committed: Dict[str, List[Dict]] = {}
+        # Tingkat sheet -> ids of committed records changed in memory since
+        self.changed: Dict[str, set] = {}
+        # Sheet name -> rows waiting to be appended
+        self.appends: Dict[str, List[List]] = {}
+    
+    def is_empty(self) -> bool:
+        """Check whether there is nothing left to flush"""
+        return not self.committed and not self.appends
+    
+    def is_dirty(self, sheet_name: str) -> bool:
+        """Check whether a Tingkat sheet has unflushed changes"""
+        return sheet_name in self.committed
+    
+    def track(self, sheet_name: str, table: TingkatTable):
+        """Remember the sheet layout before the first unflushed change"""
+        if sheet_name not in self.committed:
+            self.committed[sheet_name] = list(table.records)
+            self.changed[sheet_name] = set()
+    
+    def record_change(self, sheet_name: str, table: TingkatTable, record: Dict):
+        """Mark an existing row as needing a rewrite"""
+        self.track(sheet_name, table)
+        self.changed[sheet_name].add(id(record))
+    
+    def record_append(self, sheet_name: str, row: List):
+        """Queue a row for History or Keuangan"""
+        self.appends.setdefault(sheet_name, []).append(row)
+    
+    def mark_flushed(self, sheet_name: str):
+        """Forget a Tingkat sheet once the sheet matches the table"""
+        self.committed.pop(sheet_name, None)
+        self.changed.pop(sheet_name, None)
@@ -0,0 +1,59 @@
+import random
+import threading
+import time
+import gspread
+
+def is_quota_error(error: Exception) -> bool:
+    """Check whether an exception is a Sheets API 429 (quota exhausted)"""
+    return isinstance(error, gspread.exceptions.APIError) and error.code == 429
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    """Thread-safe token bucket that paces requests to a per-minute quota
+    
+    Refills at quota_per_minute / 60 tokens per second and holds at most
+    `burst` tokens, so idle periods allow a short burst and sustained
+    traffic settles at the quota rate.
+    """
+    
+    def __init__(self, quota_per_minute: int, burst: int = None):
+        self.rate = quota_per_minute / 60.0
+        self.capacity = float(burst or max(1, quota_per_minute // 4))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiting = 0
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self) -> float:
+        """Take one token, blocking until one is available; returns seconds waited"""
+        waited = 0.0
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+                time.sleep(delay)
+                waited += delay
+        finally:
+            with self._lock:
+                self._waiting -= 1
+    
+    def pressure(self) -> float:
+        """Share of the bucket in use, 0.0 (idle) to 1.0 (empty or callers waiting)"""
+        with self._lock:
+            self._refill()
+            in_use = 1 - self._tokens / self.capacity + self._waiting / self.capacity
+        return min(1.0, max(0.0, in_use))
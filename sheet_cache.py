@@ -0,0 +1,128 @@
+import time
+import unicodedata
+from functools import lru_cache
+from typing import List, Dict
+
+
+@lru_cache(maxsize=4096)
+def canonical_name(nama: str) -> str:
+    """Normalize a customer name for matching (NFKC, casefold, collapsed spaces)"""
+    return ' '.join(unicodedata.normalize('NFKC', str(nama)).casefold().split())
+
+
+class TingkatTable:
+    """In-memory copy of one Tingkat sheet, kept in sheet row order"""
+    
+    # First data row in the sheet (row 1 is the header)
+    FIRST_ROW = 2
+    
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        self.loaded_at = time.monotonic()
+        
+        # Canonical name per record (same order as records) and name -> row number
+        self._keys = [canonical_name(record['Nama']) for record in records]
+        self._index: Dict[str, int] = {}
+        for row_idx in range(len(self._keys) + self.FIRST_ROW - 1, self.FIRST_ROW - 1, -1):
+            # Walk bottom-up so the first row wins for duplicate names
+            self._index[self._keys[row_idx - self.FIRST_ROW]] = row_idx
+    
+    def is_fresh(self, ttl: float) -> bool:
+        """Check whether the table is younger than ttl seconds"""
+        return time.monotonic() - self.loaded_at < ttl
+    
+    def find(self, nama: str) -> int:
+        """Get sheet row number for a customer name, or None if not present"""
+        return self._index.get(canonical_name(nama))
+    
+    def record_at(self, row_idx: int) -> Dict:
+        """Get record stored at a sheet row number"""
+        return self.records[row_idx - self.FIRST_ROW]
+    
+    def append(self, record: Dict) -> int:
+        """Append a record and return its sheet row number"""
+        self.records.append(record)
+        row_idx = len(self.records) + self.FIRST_ROW - 1
+        
+        key = canonical_name(record['Nama'])
+        self._keys.append(key)
+        self._index.setdefault(key, row_idx)
+        return row_idx
+    
+    def update(self, row_idx: int, fields: Dict):
+        """Update fields of the record at a sheet row number"""
+        self.records[row_idx - self.FIRST_ROW].update(fields)
+    
+    def delete(self, row_idx: int) -> Dict:
+        """Remove the record at a sheet row number (rows below shift up)"""
+        position = row_idx - self.FIRST_ROW
+        record = self.records.pop(position)
+        key = self._keys.pop(position)
+        
+        for other_key, other_row in self._index.items():
+            if other_row > row_idx:
+                self._index[other_key] = other_row - 1
+        
+        if self._index.get(key) == row_idx:
+            # Promote a remaining duplicate of the same name, if any
+            del self._index[key]
+            for offset in range(position, len(self._keys)):
+                if self._keys[offset] == key:
+                    self._index[key] = offset + self.FIRST_ROW
+                    break
+        return record
+
+
+class SheetCache:
+    """Write-through cache of Tingkat sheets with TTL-based refresh"""
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._tables: Dict[str, TingkatTable] = {}
+    
+    def get(self, sheet_name: str) -> TingkatTable:
+        """Get cached table, or None if missing or expired"""
+        table = self._tables.get(sheet_name)
+        if table is None or not table.is_fresh(self.ttl):
+            return None
+        return table
+    
+    def peek(self, sheet_name: str) -> TingkatTable:
+        """Get cached table even if expired (None if never loaded)"""
+        return self._tables.get(sheet_name)
+    
+    def put(self, sheet_name: str, table: TingkatTable):
+        """Store a freshly loaded table"""
+        self._tables[sheet_name] = table
+    
+    def invalidate(self, sheet_name: str = None):
+        """Drop one cached sheet, or every sheet if no name is given"""
+        if sheet_name is None:
+            self._tables.clear()
+        else:
+            self._tables.pop(sheet_name, None)
+
+
+class HistoryIndex:
+    """Customer -> History sheet row numbers, built from the Nama column and extended on append"""
+    
+    # First data row in the sheet (row 1 is the header)
+    FIRST_ROW = 2
+    
+    def __init__(self, names: List):
+        self._rows: Dict[str, List[int]] = {}
+        # Sheet row number of the newest entry (1 = header only)
+        self.last_row = self.FIRST_ROW - 1
+        for nama in names:
+            self.append(nama)
+    
+    def append(self, nama) -> int:
+        """Index a row added after the current last row, returns its row number"""
+        self.last_row += 1
+        if nama not in ('', None):
+            self._rows.setdefault(canonical_name(nama), []).append(self.last_row)
+        return self.last_row
+    
+    def find(self, nama: str) -> List[int]:
+        """Get sheet row numbers of a customer's History rows, oldest first"""
+        return self._rows.get(canonical_name(nama), [])
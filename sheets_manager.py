@@ -1,109 +1,735 @@
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from gspread.utils import absolute_range_name, rowcol_to_a1
 from typing import List, Dict
+import copy
+import csv
+import functools
+import inspect
+import io
 import logging
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
+from sheet_cache import SheetCache, TingkatTable, HistoryIndex, canonical_name
+from ledger import LedgerState, LEGACY_SHEET, SUMMARY_SHEET, PARTITION_PATTERN, partition_name
+from dashboard import DashboardSnapshot
+from outbox import Outbox
+from storage_backend import StorageBackend, PartialWriteError, parse_import_row
+from api_metrics import ApiMetrics, current_command, describe_request
+from rate_limiter import TokenBucket, backoff_delay, is_quota_error
+from sheets_transport import SheetsTransport, load_credentials
 
 logger = logging.getLogger(__name__)
 
-class SheetsManager:
+def count_api_calls(func):
+    """Log how many Sheets API requests one SheetsManager command issued"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        # Nested commands (e.g. mark_as_paid -> add_pelunasan_to_keuangan) count toward the outer one
+        outermost = getattr(self._local, 'api_calls', None) is None
+        if outermost:
+            self._local.api_calls = 0
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            if outermost:
+                logger.info(f"{func.__name__}: {self._local.api_calls} Sheets API call(s)")
+                self._local.api_calls = None
+    return wrapper
+
+# Thread locks are always taken in this order so multi-sheet commands cannot deadlock.
+# 'Keuangan' guards the whole ledger, whichever monthly partition is current.
+ALL_TINGKAT = [f'Tingkat {tingkat_num}' for tingkat_num in range(1, 5)]
+LOCK_ORDER = ALL_TINGKAT + ['History', 'Keuangan']
+
+def holds_sheets(*sheet_names):
+    """Run a SheetsManager method under the thread locks of the sheets it writes
+    
+    Names may refer to the method's arguments ('Tingkat {tingkat}'); a tingkat
+    of None stands for every Tingkat sheet and no names at all for every sheet.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            arguments = signature.bind(self, *args, **kwargs)
+            arguments.apply_defaults()
+            names = []
+            for sheet_name in sheet_names:
+                resolved = sheet_name.format(**arguments.arguments)
+                names += ALL_TINGKAT if resolved == 'Tingkat None' else [resolved]
+            with self._holding(names or LOCK_ORDER):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class SheetsManager(StorageBackend):
     """Manager for Google Sheets operations"""
     
     # Column indices for tingkat sheets (1-based for gspread)
     TOTAL_COLUMN_INDEX = 6
     
-    def __init__(self, credentials_path: str, spreadsheet_id: str):
+    # Export reads this many rows per request
+    EXPORT_CHUNK_ROWS = 500
+    
+    # Retry delays after a 429: full jitter over BACKOFF_BASE * 2^attempt seconds, capped
+    BACKOFF_BASE = 1.0
+    BACKOFF_CAP = 32.0
+    
+    HISTORY_HEADERS = ['Tanggal Lunas', 'Tingkat', 'Tanggal Transaksi', 'Nama', 'Total']
+    
+    # Spreadsheet developer metadata recording the schema initialize_sheets last set up;
+    # bump SCHEMA_VERSION whenever the sheets, headers or header formats change
+    SCHEMA_METADATA_KEY = 'botutang_schema_version'
+    SCHEMA_VERSION = 1
+    
+    # get_stats and the /saldo snapshot are reused this long (seconds) when the Tingkat cache is off
+    STATS_TTL = 30.0
+    
+    def __init__(self, credentials_path: str, spreadsheet_id: str, cache_ttl: float = None,
+                 write_behind: bool = False, spreadsheet=None, read_quota: int = 60,
+                 write_quota: int = 60, max_retries: int = 5, monthly_keuangan: bool = False,
+                 credentials_info: Dict = None, pool_size: int = 10):
         self.credentials_path = credentials_path
+        # Parsed service account key, used instead of credentials_path when given (never written to disk)
+        self.credentials_info = credentials_info
         self.spreadsheet_id = spreadsheet_id
         self.client = None
         self.spreadsheet = None
-        self._connect()
+        # Keep-alive connections shared by the Sheets worker threads
+        self.pool_size = pool_size
+        # Pooled HTTP session and token refresher (None for an injected spreadsheet)
+        self.transport = None
+        # Tingkat sheet cache is opt-in (cache_ttl in seconds, None = disabled)
+        self.cache = SheetCache(cache_ttl) if cache_ttl else None
+        # Write-behind mode queues writes for flush_outbox() instead of sending them inline
+        if write_behind and not self.cache:
+            raise ValueError("Write-behind mode requires the Tingkat cache (cache_ttl)")
+        self.outbox = Outbox() if write_behind else None
+        # Keuangan saldo/modal/last row, loaded once and advanced on every append
+        self.ledger = None
+        # Roll Keuangan into `Keuangan YYYY-MM` sheets, only the current month is read on hot paths
+        self.monthly_keuangan = monthly_keuangan
+        # Per-thread API call counter for the command currently running
+        self._local = threading.local()
+        # Per bot command request counts and latencies (see /perf)
+        self.metrics = ApiMetrics()
+        # Client-side pacing to the per-minute Sheets quotas (None = unpaced)
+        self.read_bucket = TokenBucket(read_quota) if read_quota else None
+        self.write_bucket = TokenBucket(write_quota) if write_quota else None
+        self.max_retries = max_retries
+        # monotonic() time of the last 429 response
+        self._last_throttled = None
+        # Worksheet title -> handle, from one metadata fetch (None = not loaded yet)
+        self._worksheets = None
+        # Tingkat sheet -> change counter, bumped by every write made through this manager
+        self._tingkat_versions: Dict[str, int] = {}
+        # (versions, monotonic() time, result) of the last get_stats computation
+        self._stats_memo = None
+        # /saldo figures kept up to date by the write helpers (None = not built yet)
+        self.dashboard = None
+        # Customer -> History row numbers, extended on every History append (None = not built yet)
+        self.history_index = None
+        # Sheet name -> RLock held while a command reads or changes that sheet's state
+        self._locks = {name: threading.RLock() for name in LOCK_ORDER}
+        
+        if spreadsheet is None:
+            self._connect()
+        else:
+            # Injected spreadsheet (e.g. fake_gspread.FakeSpreadsheet) skips authentication
+            self.spreadsheet = spreadsheet
+            self.client = spreadsheet.client
+            self._instrument_client()
     
     def _connect(self):
         """Connect to Google Sheets"""
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
+        credentials = load_credentials(self.credentials_path, self.credentials_info)
+        self.transport = SheetsTransport(credentials, self.pool_size)
+        # First token now, later ones in the background before they expire
+        self.transport.start()
+        self.client = gspread.Client(auth=credentials, session=self.transport.session)
+        self._instrument_client()
+        self.spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+    
+    def close(self):
+        """Stop the token refresher and close pooled connections"""
+        if self.transport:
+            self.transport.stop()
+    
+    def _instrument_client(self):
+        """Hook the gspread HTTP client so every API request is paced, retried, counted and timed"""
+        # gspread 6 sends requests through client.http_client, gspread 5 through client itself
+        http = getattr(self.client, 'http_client', self.client)
+        send = http.request
+        
+        def counted_request(method, endpoint, *args, **kwargs):
+            if getattr(self._local, 'api_calls', None) is not None:
+                self._local.api_calls += 1
+            started = time.perf_counter()
+            try:
+                return send(method, endpoint, *args, **kwargs)
+            finally:
+                operation, worksheet = describe_request(method, endpoint)
+                self.metrics.record_request(
+                    current_command.get(), operation, worksheet, time.perf_counter() - started
+                )
         
-        credentials = ServiceAccountCredentials.from_json_keyfile_name(
-            self.credentials_path, scope
+        @functools.wraps(send)
+        def paced_request(method, endpoint, *args, **kwargs):
+            bucket = self.read_bucket if method.upper() == 'GET' else self.write_bucket
+            for attempt in range(self.max_retries + 1):
+                if bucket:
+                    bucket.acquire()
+                try:
+                    return counted_request(method, endpoint, *args, **kwargs)
+                except gspread.exceptions.APIError as e:
+                    if not is_quota_error(e) or attempt == self.max_retries:
+                        raise
+                    self._last_throttled = time.monotonic()
+                    delay = backoff_delay(attempt, self.BACKOFF_BASE, self.BACKOFF_CAP)
+                    logger.warning(f"Sheets quota hit ({method.upper()}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    time.sleep(delay)
+        
+        http.request = paced_request
+    
+    def get_pressure(self) -> Dict:
+        """Current load on the Sheets quotas (0.0 idle to 1.0 saturated)"""
+        throttled = (
+            self._last_throttled is not None
+            and time.monotonic() - self._last_throttled < 60
         )
-        self.client = gspread.authorize(credentials)
-        self.spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+        return {
+            'read': self.read_bucket.pressure() if self.read_bucket else 0.0,
+            'write': self.write_bucket.pressure() if self.write_bucket else 0.0,
+            # A 429 was seen within the last minute
+            'throttled': throttled
+        }
+    
+    def reload_worksheets(self):
+        """Fetch spreadsheet metadata once and rebuild the worksheet handle map"""
+        self._worksheets = {worksheet.title: worksheet for worksheet in self.spreadsheet.worksheets()}
+        logger.info(f"Worksheet map loaded: {len(self._worksheets)} sheet(s)")
+    
+    def _worksheet(self, sheet_name: str):
+        """Get a worksheet handle, fetching metadata only when the sheet is not known yet"""
+        if self._worksheets is None or sheet_name not in self._worksheets:
+            self.reload_worksheets()
+        if sheet_name not in self._worksheets:
+            raise gspread.WorksheetNotFound(sheet_name)
+        return self._worksheets[sheet_name]
+    
+    def _add_worksheet(self, title: str, rows: int, cols: int):
+        """Create a worksheet and remember its handle"""
+        worksheet = self.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+        if self._worksheets is not None:
+            self._worksheets[title] = worksheet
+        return worksheet
+    
+    def _load_tingkat(self, sheet_name: str, worksheet=None) -> TingkatTable:
+        """Get Tingkat sheet records, served from cache when enabled"""
+        table = self._cached_tingkat(sheet_name)
+        if table is not None:
+            return table
+        
+        if worksheet is None:
+            worksheet = self._worksheet(sheet_name)
+        table = TingkatTable(worksheet.get_all_records())
+        
+        if self.cache:
+            self.cache.put(sheet_name, table)
+        return table
+    
+    def _cached_tingkat(self, sheet_name: str) -> TingkatTable:
+        """Get a Tingkat table that can be used without a request, or None"""
+        if self.outbox and self.outbox.is_dirty(sheet_name):
+            # Unflushed changes live only in memory, never refresh over them
+            return self.cache.peek(sheet_name)
+        if self.cache:
+            return self.cache.get(sheet_name)
+        return None
+    
+    @contextmanager
+    def _holding(self, sheet_names: List[str]):
+        """Hold the thread locks of several sheets, acquired in LOCK_ORDER"""
+        with ExitStack() as stack:
+            for sheet_name in sorted(set(sheet_names), key=LOCK_ORDER.index):
+                stack.enter_context(self._locks[sheet_name])
+            yield
+    
+    def _ledger_state(self) -> LedgerState:
+        """Get in-memory Keuangan state, loading it on first use"""
+        if self.ledger is None:
+            with self._holding(['Keuangan']):
+                # Another thread may have loaded it while this one waited
+                if self.ledger is None:
+                    self.reload_ledger()
+        return self.ledger
+    
+    def _current_keuangan_sheet(self) -> str:
+        """Title of the sheet holding the newest Keuangan rows (None before the first partition)"""
+        if not self.monthly_keuangan:
+            return LEGACY_SHEET
+        if self._worksheets is None:
+            self.reload_worksheets()
+        partitions = sorted(title for title in self._worksheets if PARTITION_PATTERN.match(title))
+        if partitions:
+            return partitions[-1]
+        return LEGACY_SHEET if LEGACY_SHEET in self._worksheets else None
+    
+    def _ledger_ranges(self) -> tuple:
+        """(current sheet, ranges) holding the ledger: partition summaries and the current sheet"""
+        sheet_name = self._current_keuangan_sheet()
+        ranges = []
+        if self.monthly_keuangan:
+            last_column = rowcol_to_a1(1, len(LedgerState.SUMMARY_HEADERS)).rstrip('1')
+            ranges.append(absolute_range_name(SUMMARY_SHEET, f'A2:{last_column}'))
+        if sheet_name is not None:
+            ranges.append(absolute_range_name(sheet_name, 'A2:F'))
+        return sheet_name, ranges
+    
+    def _ledger_from(self, sheet_name: str, value_ranges: List[Dict]) -> LedgerState:
+        """Build the ledger state from value ranges read for _ledger_ranges()"""
+        value_ranges = list(value_ranges)
+        closed = []
+        if self.monthly_keuangan:
+            closed = [
+                dict(zip(LedgerState.SUMMARY_HEADERS, row))
+                for row in value_ranges.pop(0).get('values', []) if row
+            ]
+        records = []
+        if sheet_name is not None:
+            records = [dict(zip(LedgerState.HEADERS, row)) for row in value_ranges.pop(0).get('values', [])]
+        return LedgerState.from_records(records, closed, sheet_name)
+    
+    def _read_ledger(self) -> LedgerState:
+        """Read the ledger state with one batched request"""
+        sheet_name, ranges = self._ledger_ranges()
+        value_ranges = self.spreadsheet.values_batch_get(ranges, params={
+            'valueRenderOption': 'UNFORMATTED_VALUE'
+        }).get('valueRanges', [])
+        return self._ledger_from(sheet_name, value_ranges)
+    
+    @holds_sheets('Keuangan')
+    def reload_ledger(self):
+        """Rebuild saldo, modal awal, last row and totals from the current Keuangan sheet"""
+        self.ledger = self._read_ledger()
+        # The snapshot may no longer match the sheet the ledger was just rebuilt from
+        self.dashboard = None
+        logger.info(f"Ledger loaded: saldo Rp {self.ledger.saldo:,}, {self.ledger.sheet_name} row {self.ledger.last_row}")
     
-    def initialize_keuangan_sheet(self):
-        """Initialize Keuangan sheet for financial transactions"""
+    def _ledger_landed(self, transactions: int, saldo: int) -> bool:
+        """Re-read the ledger after a failed append, True if the rows are on the sheet anyway"""
         try:
-            keuangan_headers = ['Tanggal', 'Tipe', 'Keterangan', 'Debit', 'Kredit', 'Saldo']
+            self.reload_ledger()
+        except Exception as e:
+            logger.error(f"Error re-reading Keuangan after a failed append: {e}")
+            # Load it again on next use instead of building on a tail that may be stale;
+            # the /saldo snapshot was derived from that tail too
+            self.ledger = None
+            self.dashboard = None
+            return False
+        return (self.ledger.transactions, self.ledger.saldo) == (transactions, saldo)
+    
+    def _open_keuangan_partition(self, state: LedgerState, month: str):
+        """Close the current Keuangan partition and start `Keuangan YYYY-MM` with an opening balance row"""
+        summary_row = state.partition_summary() if state.sheet_name is not None else None
+        
+        title = partition_name(month)
+        worksheet = self._add_worksheet(title, rows=1000, cols=len(LedgerState.HEADERS))
+        worksheet.update(range_name='A1:F2', values=[LedgerState.HEADERS, state.opening_row(month)])
+        worksheet.format('A1:F1', {
+            'textFormat': {'bold': True},
+            'backgroundColor': {'red': 0.2, 'green': 0.8, 'blue': 0.4}
+        })
+        
+        # Totals of the closed partition, so summaries never rescan it
+        if summary_row is not None:
+            if self.outbox:
+                self.outbox.record_append(SUMMARY_SHEET, summary_row)
+            else:
+                self._worksheet(SUMMARY_SHEET).append_row(summary_row)
+        
+        state.open_partition(month)
+        logger.info(f"Keuangan partition {title} opened with saldo Rp {state.saldo:,}")
+    
+    def _append_keuangan_row(self, row: List) -> int:
+        """Append a Keuangan row and advance the in-memory ledger state"""
+        return self._append_keuangan_rows([row])[-1]
+    
+    def _append_keuangan_rows(self, rows: List[List]) -> List[int]:
+        """Append Keuangan rows with one request per partition and advance the ledger state"""
+        state = self._ledger_state()
+        saldos = []
+        start = 0
+        while start < len(rows):
+            if self.monthly_keuangan:
+                month = rows[start][0][:7]
+                if state.month is None or month > state.month:
+                    self._open_keuangan_partition(state, month)
+            
+            # Rows up to the next month boundary land in the current partition
+            end = start + 1
+            while end < len(rows) and not (self.monthly_keuangan and rows[end][0][:7] > state.month):
+                end += 1
+            chunk = rows[start:end]
+            
+            if self.outbox:
+                for row in chunk:
+                    self.outbox.record_append(state.sheet_name, row)
+            else:
+                self._worksheet(state.sheet_name).append_rows(chunk)
+            saldos += [state.advance(row) for row in chunk]
+            start = end
+        return saldos
+    
+    def _append_history_row(self, row: List):
+        """Back up a settled debt to the History sheet"""
+        if self.outbox:
+            self.outbox.record_append('History', row)
+        else:
+            self._worksheet('History').append_row(row)
+        if self.history_index:
+            # Queued rows keep their order, so the row number holds once flushed
+            self.history_index.append(row[3])
+    
+    def _history_index(self) -> HistoryIndex:
+        """Get the History name index, building it on first use"""
+        if self.history_index is None:
+            self.reload_history_index()
+        return self.history_index
+    
+    @holds_sheets('History')
+    def reload_history_index(self):
+        """Build the customer -> History rows index from the Tanggal Lunas and Nama columns"""
+        value_ranges = self.spreadsheet.values_batch_get(
+            [absolute_range_name('History', 'A2:A'), absolute_range_name('History', 'D2:D')],
+            params={'majorDimension': 'COLUMNS'}
+        ).get('valueRanges', [])
+        tanggal, names = [
+            (value_range.get('values') or [[]])[0] for value_range in value_ranges
+        ] if len(value_ranges) == 2 else ([], [])
+        # The API drops trailing empty cells, so a History row without Nama at the end would
+        # shorten the Nama column; Tanggal Lunas is always filled and gives the real row count
+        rows = max(len(tanggal), len(names))
+        self.history_index = HistoryIndex(names + [''] * (rows - len(names)))
+        logger.info(f"History index loaded: {self.history_index.last_row - 1} row(s)")
+    
+    def _tingkat_values(self, record: Dict) -> List:
+        """Get a Tingkat record as a sheet row"""
+        return [record.get(header, '') for header in self.TINGKAT_HEADERS]
+    
+    def _touch_tingkat(self, sheet_name: str, debt_delta: int = 0):
+        """Mark a Tingkat sheet as changed and move its summed Total by debt_delta"""
+        self._tingkat_versions[sheet_name] = self._tingkat_versions.get(sheet_name, 0) + 1
+        if self.dashboard and debt_delta:
+            self.dashboard.apply_debt(int(sheet_name.rsplit(' ', 1)[1]), debt_delta)
+    
+    def _total_change(self, record: Dict, fields: Dict) -> int:
+        """How much an update of fields changes a record's Total"""
+        if 'Total' not in fields:
+            return 0
+        return int(fields['Total'] or 0) - int(record.get('Total') or 0)
+    
+    def _write_tingkat_row(self, worksheet, sheet_name: str, table: TingkatTable, row_idx: int, fields: Dict):
+        """Update fields of an existing Tingkat row (queued in write-behind mode)"""
+        debt_delta = self._total_change(table.record_at(row_idx), fields)
+        if self.outbox:
+            self.outbox.record_change(sheet_name, table, table.record_at(row_idx))
+        else:
+            cells = self._tingkat_cells(row_idx, dict(table.record_at(row_idx), **fields), fields)
+            if cells:
+                worksheet.batch_update(cells, value_input_option='USER_ENTERED')
+        table.update(row_idx, fields)
+        self._touch_tingkat(sheet_name, debt_delta)
+    
+    def _tingkat_cells(self, row_idx: int, record: Dict, names) -> List[Dict]:
+        """batch_update ranges writing the named columns of one Tingkat row, never Nama
+        
+        Nama only changes through appends (RAW). Rewriting it would send back
+        the value get_all_records already numericised ('007' -> 7), and
+        USER_ENTERED would parse names such as '=...', '1/2' or '+62...'.
+        Contiguous columns share one range.
+        """
+        values = self._tingkat_values(record)
+        columns = sorted(self.TINGKAT_HEADERS.index(name) for name in names if name != 'Nama')
+        spans = []
+        for column in columns:
+            if spans and column == spans[-1][1] + 1:
+                spans[-1][1] = column
+            else:
+                spans.append([column, column])
+        return [
+            {
+                'range': f'{rowcol_to_a1(row_idx, first + 1)}:{rowcol_to_a1(row_idx, last + 1)}',
+                'values': [values[first:last + 1]]
+            }
+            for first, last in spans
+        ]
+    
+    def _write_tingkat_batch(self, worksheet, sheet_name: str, table: TingkatTable,
+                             updates: Dict[int, Dict], new_rows: List[List]):
+        """Apply many row updates and new rows with one request each"""
+        if self.outbox:
+            for row_idx, fields in updates.items():
+                self._write_tingkat_row(worksheet, sheet_name, table, row_idx, fields)
+            for row in new_rows:
+                self._append_tingkat_row(worksheet, sheet_name, table, row)
+            return
+        
+        debt_delta = sum(self._total_change(table.record_at(row_idx), fields) for row_idx, fields in updates.items())
+        debt_delta += sum(int(row[self.TOTAL_COLUMN_INDEX - 1] or 0) for row in new_rows)
+        
+        if updates:
+            worksheet.batch_update([
+                cells
+                for row_idx, fields in updates.items()
+                for cells in self._tingkat_cells(row_idx, dict(table.record_at(row_idx), **fields), fields)
+            ], value_input_option='USER_ENTERED')
+            for row_idx, fields in updates.items():
+                table.update(row_idx, fields)
+        
+        if new_rows:
+            worksheet.append_rows(new_rows)
+            for row in new_rows:
+                table.append(dict(zip(self.TINGKAT_HEADERS, row)))
+        self._touch_tingkat(sheet_name, debt_delta)
+    
+    def _append_tingkat_row(self, worksheet, sheet_name: str, table: TingkatTable, row: List):
+        """Add a new customer row (queued in write-behind mode)"""
+        if self.outbox:
+            self.outbox.track(sheet_name, table)
+        else:
+            worksheet.append_row(row)
+        table.append(dict(zip(self.TINGKAT_HEADERS, row)))
+        self._touch_tingkat(sheet_name, int(row[self.TOTAL_COLUMN_INDEX - 1] or 0))
+    
+    def _delete_tingkat_row(self, worksheet, sheet_name: str, table: TingkatTable, row_idx: int):
+        """Remove a settled customer row (queued in write-behind mode)"""
+        if self.outbox:
+            self.outbox.track(sheet_name, table)
+        else:
+            worksheet.delete_rows(row_idx)
+        record = table.delete(row_idx)
+        self._touch_tingkat(sheet_name, -int(record.get('Total') or 0))
+    
+    def _tingkat_worksheet(self, sheet_name: str):
+        """Get a Tingkat worksheet for inline writes (not needed in write-behind mode)"""
+        return None if self.outbox else self._worksheet(sheet_name)
+    
+    @count_api_calls
+    @holds_sheets()
+    def flush_outbox(self) -> int:
+        """Send queued write-behind changes to Sheets in batched requests"""
+        if not self.outbox or self.outbox.is_empty():
+            return 0
+        
+        try:
+            written = 0
             
-            try:
-                keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-            except gspread.WorksheetNotFound:
-                keuangan_sheet = self.spreadsheet.add_worksheet(
-                    title='Keuangan', rows=1000, cols=6
-                )
+            for sheet_name in list(self.outbox.committed):
+                written += self._flush_tingkat(sheet_name)
             
-            # Check if headers exist
-            if not keuangan_sheet.row_values(1):
-                keuangan_sheet.append_row(keuangan_headers)
-                # Format header with green background
-                keuangan_sheet.format('A1:F1', {
-                    'textFormat': {'bold': True},
-                    'backgroundColor': {'red': 0.2, 'green': 0.8, 'blue': 0.4}
-                })
-                logger.info("Created Keuangan sheet")
+            # History and Keuangan: one multi-row append per sheet, RAW like the inline appends
+            for sheet_name in list(self.outbox.appends):
+                rows = self.outbox.appends[sheet_name]
+                self._worksheet(sheet_name).append_rows(rows)
+                del self.outbox.appends[sheet_name]
+                written += len(rows)
+            
+            logger.info(f"Outbox flushed: {written} row(s) written")
+            return written
             
         except Exception as e:
-            logger.error(f"Error initializing Keuangan sheet: {e}")
+            logger.error(f"Error flushing outbox: {e}")
             raise
     
+    def _flush_tingkat(self, sheet_name: str) -> int:
+        """Bring one Tingkat sheet in line with its cached table"""
+        table = self.cache.peek(sheet_name)
+        committed = self.outbox.committed[sheet_name]
+        changed = self.outbox.changed[sheet_name]
+        worksheet = self._worksheet(sheet_name)
+        current_ids = {id(record) for record in table.records}
+        written = 0
+        
+        # Each step updates the outbox only after it succeeded, so a failed
+        # flush can be retried without applying anything twice
+        deleted_rows = [
+            row_idx for row_idx, record in enumerate(committed, start=TingkatTable.FIRST_ROW)
+            if id(record) not in current_ids
+        ]
+        if deleted_rows:
+            # Bottom-up so earlier deletions do not shift later ones
+            self.spreadsheet.batch_update({'requests': [
+                {'deleteDimension': {'range': {
+                    'sheetId': worksheet.id,
+                    'dimension': 'ROWS',
+                    'startIndex': row_idx - 1,
+                    'endIndex': row_idx
+                }}}
+                for row_idx in sorted(deleted_rows, reverse=True)
+            ]})
+            committed = [record for record in committed if id(record) in current_ids]
+            self.outbox.committed[sheet_name] = committed
+            written += len(deleted_rows)
+        
+        changed_rows = [
+            (row_idx, record)
+            for row_idx, record in enumerate(committed, start=TingkatTable.FIRST_ROW)
+            if id(record) in changed
+        ]
+        if changed_rows:
+            # The outbox does not track which fields changed, so every column but Nama is sent
+            worksheet.batch_update([
+                cells
+                for row_idx, record in changed_rows
+                for cells in self._tingkat_cells(row_idx, record, self.TINGKAT_HEADERS)
+            ], value_input_option='USER_ENTERED')
+            changed.clear()
+            written += len(changed_rows)
+        
+        # Surviving rows keep their order, so anything past them is new
+        new_records = table.records[len(committed):]
+        if new_records:
+            worksheet.append_rows([self._tingkat_values(record) for record in new_records])
+            written += len(new_records)
+        
+        self.outbox.mark_flushed(sheet_name)
+        return written
+    
+    @holds_sheets()
+    def invalidate_cache(self, tingkat: int = None):
+        """Drop cached Tingkat data so the next read reloads from Sheets"""
+        self._stats_memo = None
+        self.dashboard = None
+        self.history_index = None
+        if not self.cache:
+            return
+        
+        sheet_names = [f'Tingkat {tingkat}'] if tingkat else [f'Tingkat {num}' for num in range(1, 5)]
+        for sheet_name in sheet_names:
+            if self.outbox and self.outbox.is_dirty(sheet_name):
+                logger.warning(f"Not invalidating {sheet_name}: unflushed write-behind changes")
+                continue
+            self.cache.invalidate(sheet_name)
+        logger.info(f"Cache invalidated: {f'Tingkat {tingkat}' if tingkat else 'all Tingkat sheets'}")
+    
+    def _schema(self) -> List[tuple]:
+        """(title, headers, grid rows, header background) of every sheet this configuration needs"""
+        schema = [
+            (f'Tingkat {tingkat_num}', self.TINGKAT_HEADERS, 1000, {'red': 0.2, 'green': 0.6, 'blue': 0.8})
+            for tingkat_num in range(1, 5)
+        ]
+        schema.append(('History', self.HISTORY_HEADERS, 1000, {'red': 0.8, 'green': 0.8, 'blue': 0.8}))
+        if self.monthly_keuangan:
+            # Monthly partitions are created on their first transaction
+            schema.append((SUMMARY_SHEET, LedgerState.SUMMARY_HEADERS, 100, None))
+        else:
+            schema.append((LEGACY_SHEET, LedgerState.HEADERS, 1000, {'red': 0.2, 'green': 0.8, 'blue': 0.4}))
+        return schema
+    
+    def _header_request(self, sheet_id: int, headers: List[str], background: Dict) -> Dict:
+        """batchUpdate request writing (and formatting) a header row"""
+        cells = []
+        for header in headers:
+            cell = {'userEnteredValue': {'stringValue': header}}
+            if background:
+                cell['userEnteredFormat'] = {'textFormat': {'bold': True}, 'backgroundColor': background}
+            cells.append(cell)
+        return {'updateCells': {
+            'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+            'rows': [{'values': cells}],
+            'fields': 'userEnteredValue,userEnteredFormat(textFormat,backgroundColor)' if background else 'userEnteredValue'
+        }}
+    
+    def _bootstrap_schema(self) -> List[str]:
+        """Create missing sheets and header rows, returns the titles of sheets created
+        
+        One metadata read finds the sheets and the schema marker; if the marker
+        matches SCHEMA_VERSION and every sheet exists, nothing else is sent.
+        Otherwise existing header rows come from one batch read and everything
+        missing, plus the marker, is written with a single batchUpdate.
+        """
+        metadata = self.spreadsheet.fetch_sheet_metadata(
+            params={'fields': 'sheets.properties(sheetId,title),developerMetadata'}
+        )
+        sheet_ids = {sheet['properties']['title']: sheet['properties']['sheetId'] for sheet in metadata.get('sheets', [])}
+        marker = next((
+            entry for entry in metadata.get('developerMetadata', [])
+            if entry.get('metadataKey') == self.SCHEMA_METADATA_KEY
+        ), None)
+        schema = self._schema()
+        
+        if (marker and marker.get('metadataValue') == str(self.SCHEMA_VERSION)
+                and all(title in sheet_ids for title, _, _, _ in schema)):
+            logger.info(f"Schema v{self.SCHEMA_VERSION} marker found, skipping sheet validation")
+            return []
+        
+        existing = [(title, headers) for title, headers, _, _ in schema if title in sheet_ids]
+        header_rows = {}
+        if existing:
+            value_ranges = self.spreadsheet.values_batch_get([
+                absolute_range_name(title, f'A1:{rowcol_to_a1(1, len(headers))}') for title, headers in existing
+            ]).get('valueRanges', [])
+            for (title, _), value_range in zip(existing, value_ranges):
+                header_rows[title] = (value_range.get('values') or [[]])[0]
+        
+        requests = []
+        created = []
+        next_id = max(sheet_ids.values(), default=0) + 1
+        for title, headers, rows, background in schema:
+            if title not in sheet_ids:
+                sheet_ids[title] = next_id
+                next_id += 1
+                requests.append({'addSheet': {'properties': {
+                    'sheetId': sheet_ids[title],
+                    'title': title,
+                    'gridProperties': {'rowCount': rows, 'columnCount': len(headers)}
+                }}})
+                created.append(title)
+            elif header_rows.get(title):
+                if header_rows[title] != headers:
+                    logger.warning(f"{title} headers differ from the expected {headers}")
+                continue
+            requests.append(self._header_request(sheet_ids[title], headers, background))
+            logger.info(f"Created {title} headers")
+        
+        if marker:
+            requests.append({'updateDeveloperMetadata': {
+                'dataFilters': [{'developerMetadataLookup': {'metadataId': marker['metadataId']}}],
+                'developerMetadata': {'metadataValue': str(self.SCHEMA_VERSION)},
+                'fields': 'metadataValue'
+            }})
+        else:
+            requests.append({'createDeveloperMetadata': {'developerMetadata': {
+                'metadataKey': self.SCHEMA_METADATA_KEY,
+                'metadataValue': str(self.SCHEMA_VERSION),
+                'location': {'spreadsheet': True},
+                'visibility': 'DOCUMENT'
+            }}})
+        
+        self.spreadsheet.batch_update({'requests': requests})
+        # Handles of new sheets are fetched with the rest on first use
+        self._worksheets = None
+        return created
+    
+    @count_api_calls
+    @holds_sheets()
     def initialize_sheets(self):
         """Initialize sheets with headers if not exist"""
         try:
-            # Create Tingkat 1-4 sheets
-            tingkat_headers = ['Tanggal', 'Nama', 'Barang', 'Jumlah', 'Harga Satuan', 'Total']
-            
-            for tingkat_num in range(1, 5):
-                sheet_name = f'Tingkat {tingkat_num}'
-                try:
-                    tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-                except gspread.WorksheetNotFound:
-                    tingkat_sheet = self.spreadsheet.add_worksheet(
-                        title=sheet_name, rows=1000, cols=6
-                    )
-                
-                # Check if headers exist
-                if not tingkat_sheet.row_values(1):
-                    tingkat_sheet.append_row(tingkat_headers)
-                    # Format header with blue background
-                    tingkat_sheet.format('A1:F1', {
-                        'textFormat': {'bold': True},
-                        'backgroundColor': {'red': 0.2, 'green': 0.6, 'blue': 0.8}
-                    })
-                    logger.info(f"Created sheet: {sheet_name}")
+            created = self._bootstrap_schema()
             
-            # Create History sheet
-            history_headers = ['Tanggal Lunas', 'Tingkat', 'Tanggal Transaksi', 'Nama', 'Total']
-            try:
-                history_sheet = self.spreadsheet.worksheet('History')
-            except gspread.WorksheetNotFound:
-                history_sheet = self.spreadsheet.add_worksheet(
-                    title='History', rows=1000, cols=5
-                )
-            
-            # Check if headers exist
-            if not history_sheet.row_values(1):
-                history_sheet.append_row(history_headers)
-                # Format header with gray background
-                history_sheet.format('A1:E1', {
-                    'textFormat': {'bold': True},
-                    'backgroundColor': {'red': 0.8, 'green': 0.8, 'blue': 0.8}
-                })
-                logger.info("Created History sheet")
-            
-            # Create Keuangan sheet
-            self.initialize_keuangan_sheet()
+            if LEGACY_SHEET in created:
+                # Brand new ledger, nothing to read back
+                self.ledger = LedgerState()
+                self.dashboard = None
+            else:
+                # Load saldo once at startup, later appends keep it current
+                self.reload_ledger()
             
             logger.info("Sheets initialized successfully")
             
@@ -111,37 +737,36 @@ class SheetsManager:
             logger.error(f"Error initializing sheets: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Tingkat {data[tingkat]}')
     def add_transaction(self, data: Dict):
         """Add transaction to spreadsheet with auto-merge logic"""
         try:
             tingkat = data['tingkat']
             nama = data['nama']
             sheet_name = f'Tingkat {tingkat}'
-            tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
+            tingkat_sheet = self._tingkat_worksheet(sheet_name)
             
             # Get all records to check for existing customer
-            records = tingkat_sheet.get_all_records()
+            table = self._load_tingkat(sheet_name, tingkat_sheet)
             
             # Check if customer already exists (case-insensitive)
-            existing_row_idx = None
-            existing_record = None
-            for idx, record in enumerate(records, start=2):  # Start from row 2 (after header)
-                if record['Nama'].lower() == nama.lower():
-                    existing_row_idx = idx
-                    existing_record = record
-                    break
+            existing_row_idx = table.find(nama)
             
             if existing_row_idx:
                 # Customer exists - MERGE transaction
+                existing_record = table.record_at(existing_row_idx)
                 existing_total = int(existing_record['Total'])
                 new_total = existing_total + data['total']
                 
-                # Update existing row
-                tingkat_sheet.update_cell(existing_row_idx, 1, data['tanggal'])  # Tanggal
-                tingkat_sheet.update_cell(existing_row_idx, 3, 'Multiple')       # Barang
-                tingkat_sheet.update_cell(existing_row_idx, 4, '-')              # Jumlah
-                tingkat_sheet.update_cell(existing_row_idx, 5, '-')              # Harga Satuan
-                tingkat_sheet.update_cell(existing_row_idx, 6, new_total)        # Total
+                # Update existing row (Tanggal through Total in one write)
+                self._write_tingkat_row(tingkat_sheet, sheet_name, table, existing_row_idx, {
+                    'Tanggal': data['tanggal'],
+                    'Barang': 'Multiple',
+                    'Jumlah': '-',
+                    'Harga Satuan': '-',
+                    'Total': new_total
+                })
                 
                 logger.info(f"Transaction MERGED for {nama} in {sheet_name}: {existing_total} + {data['total']} = {new_total}")
             else:
@@ -155,13 +780,15 @@ class SheetsManager:
                     data['total']
                 ]
                 
-                tingkat_sheet.append_row(row)
+                self._append_tingkat_row(tingkat_sheet, sheet_name, table, row)
                 logger.info(f"New transaction added for {nama} in {sheet_name}")
             
         except Exception as e:
             logger.error(f"Error adding transaction: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Tingkat {tingkat}')
     def get_total_debt(self, nama: str, tingkat: int = None) -> int:
         """Get total debt for a customer, optionally filtered by tingkat"""
         try:
@@ -170,25 +797,14 @@ class SheetsManager:
             if tingkat:
                 # Get debt from specific tingkat only
                 sheet_name = f'Tingkat {tingkat}'
-                tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-                records = tingkat_sheet.get_all_records()
+                table = self._load_tingkat(sheet_name)
                 
-                for record in records:
-                    if record['Nama'].lower() == nama.lower():
-                        total += int(record['Total'])
+                row_idx = table.find(nama)
+                if row_idx:
+                    total += int(table.record_at(row_idx)['Total'])
             else:
-                # Get debt from all tingkat sheets
-                for tingkat_num in range(1, 5):
-                    sheet_name = f'Tingkat {tingkat_num}'
-                    try:
-                        tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-                        records = tingkat_sheet.get_all_records()
-                        
-                        for record in records:
-                            if record['Nama'].lower() == nama.lower():
-                                total += int(record['Total'])
-                    except gspread.WorksheetNotFound:
-                        continue
+                # Get debt from all tingkat sheets in one request
+                total = sum(self.get_debt_breakdown(nama).values())
             
             return total
             
@@ -196,6 +812,70 @@ class SheetsManager:
             logger.error(f"Error getting total debt: {e}")
             raise
     
+    def _fetch_tingkat_columns(self, tingkat_nums: List[int]) -> Dict[int, tuple]:
+        """Get (Nama values, Total values) of Tingkat sheets with one batched request
+        
+        Only columns B and F are read, as unformatted numbers; sheets that
+        do not exist come back as empty columns.
+        """
+        if self._worksheets is None:
+            self.reload_worksheets()
+        existing = [num for num in tingkat_nums if f'Tingkat {num}' in self._worksheets]
+        columns = {num: ([], []) for num in tingkat_nums}
+        if not existing:
+            return columns
+        
+        ranges = []
+        for tingkat_num in existing:
+            sheet_name = f'Tingkat {tingkat_num}'
+            ranges += [absolute_range_name(sheet_name, 'B2:B'), absolute_range_name(sheet_name, 'F2:F')]
+        
+        value_ranges = self.spreadsheet.values_batch_get(ranges, params={
+            'majorDimension': 'COLUMNS',
+            'valueRenderOption': 'UNFORMATTED_VALUE'
+        }).get('valueRanges', [])
+        
+        for position, tingkat_num in enumerate(existing):
+            names = value_ranges[2 * position].get('values', [[]])[0]
+            totals = value_ranges[2 * position + 1].get('values', [[]])[0]
+            columns[tingkat_num] = (names, totals)
+        return columns
+    
+    @count_api_calls
+    @holds_sheets(*ALL_TINGKAT)
+    def get_debt_breakdown(self, nama: str) -> Dict[int, int]:
+        """Get a customer's debt per tingkat (0 where none) with at most one request"""
+        try:
+            breakdown = {}
+            to_fetch = []
+            
+            for tingkat_num in range(1, 5):
+                table = self._cached_tingkat(f'Tingkat {tingkat_num}')
+                if table is None:
+                    to_fetch.append(tingkat_num)
+                    continue
+                row_idx = table.find(nama)
+                breakdown[tingkat_num] = int(table.record_at(row_idx)['Total']) if row_idx else 0
+            
+            if to_fetch:
+                key = canonical_name(nama)
+                for tingkat_num, (names, totals) in self._fetch_tingkat_columns(to_fetch).items():
+                    breakdown[tingkat_num] = 0
+                    
+                    # First row with the same canonical name, like TingkatTable.find
+                    for offset, row_nama in enumerate(names):
+                        if canonical_name(row_nama) == key:
+                            breakdown[tingkat_num] = int(totals[offset] or 0) if offset < len(totals) else 0
+                            break
+            
+            return dict(sorted(breakdown.items()))
+            
+        except Exception as e:
+            logger.error(f"Error getting debt breakdown: {e}")
+            raise
+    
+    @count_api_calls
+    @holds_sheets('Tingkat {tingkat}')
     def get_unpaid_customers(self, tingkat: int = None) -> List[Dict]:
         """Get list of customers with unpaid debt, optionally filtered by tingkat"""
         try:
@@ -207,8 +887,7 @@ class SheetsManager:
             for tingkat_num in tingkat_range:
                 sheet_name = f'Tingkat {tingkat_num}'
                 try:
-                    tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-                    records = tingkat_sheet.get_all_records()
+                    records = self._load_tingkat(sheet_name).records
                     
                     for record in records:
                         nama = record['Nama']
@@ -233,52 +912,84 @@ class SheetsManager:
             logger.error(f"Error getting unpaid customers: {e}")
             raise
     
-    def mark_as_paid(self, nama: str, tingkat: int) -> int:
+    @count_api_calls
+    @holds_sheets('Tingkat {tingkat}', 'History', 'Keuangan')
+    def mark_as_paid(self, nama: str, tingkat: int) -> Dict:
         """Delete row from tingkat sheet, backup to History, and update Keuangan"""
         try:
             sheet_name = f'Tingkat {tingkat}'
-            tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-            records = tingkat_sheet.get_all_records()
+            tingkat_sheet = self._tingkat_worksheet(sheet_name)
+            table = self._load_tingkat(sheet_name, tingkat_sheet)
             
             # Find the customer row
-            for idx, record in enumerate(records, start=2):  # Start from row 2 (after header)
-                if record['Nama'].lower() == nama.lower():
-                    # Get transaction data
-                    tanggal_transaksi = record['Tanggal']
-                    total = int(record['Total'])
-                    
-                    # Backup to History sheet
-                    tanggal_lunas = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    history_sheet = self.spreadsheet.worksheet('History')
-                    history_row = [
-                        tanggal_lunas,
-                        tingkat,
-                        tanggal_transaksi,
-                        nama,
-                        total
-                    ]
-                    history_sheet.append_row(history_row)
-                    
-                    # Delete row from tingkat sheet
-                    tingkat_sheet.delete_rows(idx)
-                    
-                    # Add to Keuangan sheet
-                    self.add_pelunasan_to_keuangan(nama, tingkat, total)
-                    
-                    logger.info(f"Payment processed for {nama} in {sheet_name}: Rp {total:,} - Row deleted, backed up to History, and added to Keuangan")
-                    return total
+            idx = table.find(nama)
+            if not idx:
+                logger.warning(f"Customer {nama} not found in {sheet_name}")
+                return {
+                    'success': False,
+                    'error': 'not_found',
+                    'nama': nama,
+                    'tingkat': tingkat
+                }
             
-            logger.warning(f"Customer {nama} not found in {sheet_name}")
-            return 0
+            record = table.record_at(idx)
+            
+            # Get transaction data
+            tanggal_transaksi = record['Tanggal']
+            total = int(record['Total'])
+            # Read under the Keuangan lock, so no other entry lands between it and our row
+            saldo_sebelum = self.get_current_saldo()
+            
+            # Backup to History sheet
+            tanggal_lunas = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            history_row = [
+                tanggal_lunas,
+                tingkat,
+                tanggal_transaksi,
+                nama,
+                total
+            ]
+            self._append_history_row(history_row)
+            
+            try:
+                # Delete row from tingkat sheet
+                self._delete_tingkat_row(tingkat_sheet, sheet_name, table, idx)
+                
+                # Add to Keuangan sheet
+                saldo_sekarang = self.add_pelunasan_to_keuangan(nama, tingkat, total)
+            except Exception as e:
+                # History already has the row, pressing the button again would duplicate it
+                raise PartialWriteError(f"Pelunasan of {nama} in {sheet_name} only partly written: {e}") from e
+            
+            logger.info(f"Payment processed for {nama} in {sheet_name}: Rp {total:,} - Row deleted, backed up to History, and added to Keuangan")
+            return {
+                'success': True,
+                'nama': nama,
+                'tingkat': tingkat,
+                'total': total,
+                'saldo_sebelum': saldo_sebelum,
+                'saldo_sekarang': saldo_sekarang
+            }
             
         except Exception as e:
             logger.error(f"Error marking as paid: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets(*ALL_TINGKAT)
     def get_stats(self) -> Dict:
-        """Get statistics for all tingkat sheets"""
+        """Get statistics for all tingkat sheets, reusing the last result while nothing changed"""
         try:
+            sheet_names = [f'Tingkat {num}' for num in range(1, 5)]
+            versions = tuple(self._tingkat_versions.get(sheet_name, 0) for sheet_name in sheet_names)
+            
+            # Writes through this manager bump the versions; the TTL bounds edits made directly in Sheets
+            memo = self._stats_memo
+            ttl = self.cache.ttl if self.cache else self.STATS_TTL
+            if memo and memo[0] == versions and time.monotonic() - memo[1] < ttl:
+                return copy.deepcopy(memo[2])
+            
             stats = {
                 'tingkat': {},
                 'grand_total': 0,
@@ -286,111 +997,107 @@ class SheetsManager:
                 'total_transactions': 0
             }
             
+            columns = {}
+            to_fetch = []
+            for tingkat_num, sheet_name in enumerate(sheet_names, start=1):
+                table = self._cached_tingkat(sheet_name)
+                if table is None:
+                    to_fetch.append(tingkat_num)
+                else:
+                    columns[tingkat_num] = (
+                        [record['Nama'] for record in table.records],
+                        [record['Total'] for record in table.records]
+                    )
+            if to_fetch:
+                columns.update(self._fetch_tingkat_columns(to_fetch))
+            
             for tingkat_num in range(1, 5):
-                sheet_name = f'Tingkat {tingkat_num}'
-                try:
-                    tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-                    records = tingkat_sheet.get_all_records()
-                    
-                    # Calculate stats for this tingkat
-                    total_debt = sum(int(record['Total']) for record in records)
-                    num_customers = len(records)
-                    num_transactions = num_customers  # 1 customer = 1 row
-                    
-                    stats['tingkat'][tingkat_num] = {
-                        'total_debt': total_debt,
-                        'num_customers': num_customers,
-                        'num_transactions': num_transactions
-                    }
-                    
-                    stats['grand_total'] += total_debt
-                    stats['total_customers'] += num_customers
-                    stats['total_transactions'] += num_transactions
-                    
-                except gspread.WorksheetNotFound:
-                    stats['tingkat'][tingkat_num] = {
-                        'total_debt': 0,
-                        'num_customers': 0,
-                        'num_transactions': 0
-                    }
+                names, totals = columns[tingkat_num]
+                
+                # Calculate stats for this tingkat
+                total_debt = sum(int(total) for total in totals if total != '')
+                num_customers = max(len(names), len(totals))
+                num_transactions = num_customers  # 1 customer = 1 row
+                
+                stats['tingkat'][tingkat_num] = {
+                    'total_debt': total_debt,
+                    'num_customers': num_customers,
+                    'num_transactions': num_transactions
+                }
+                
+                stats['grand_total'] += total_debt
+                stats['total_customers'] += num_customers
+                stats['total_transactions'] += num_transactions
             
-            return stats
+            self._stats_memo = (versions, time.monotonic(), stats)
+            return copy.deepcopy(stats)
             
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Tingkat {tingkat}')
     def import_data(self, tingkat: int, csv_content: str) -> Dict:
         """Import CSV data with auto-merge logic"""
         try:
-            import csv
-            from io import StringIO
-            
             sheet_name = f'Tingkat {tingkat}'
-            tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
+            tingkat_sheet = self._tingkat_worksheet(sheet_name)
             
             # Parse CSV
-            csv_reader = csv.DictReader(StringIO(csv_content))
+            csv_reader = csv.DictReader(io.StringIO(csv_content))
             
             imported_count = 0
             merged_count = 0
             skipped_count = 0
             
+            # Read the sheet once and merge the whole CSV in memory
+            table = self._load_tingkat(sheet_name, tingkat_sheet)
+            # Existing rows to rewrite (row number -> fields) and new customers in CSV order
+            merged_rows: Dict[int, Dict] = {}
+            new_rows: Dict[str, List] = {}
+            
             for row in csv_reader:
                 try:
-                    # Handle both lowercase and titlecase headers
-                    nama = row.get('Nama') or row.get('nama', '').strip()
-                    barang = row.get('Barang') or row.get('barang', '').strip()
-                    tanggal = row.get('Tanggal') or row.get('tanggal', '').strip()
-                    jumlah = row.get('Jumlah') or row.get('jumlah', '').strip()
-                    harga_satuan = row.get('Harga Satuan') or row.get('harga satuan', '').strip()
-                    total = row.get('Total') or row.get('total', '').strip()
-                    
-                    if not nama or not total:
-                        skipped_count += 1
-                        logger.warning(f"Skipping invalid row: {row}")
-                        continue
-                    
-                    # Convert numeric values
-                    try:
-                        total = int(total)
-                        if jumlah and jumlah != '-':
-                            jumlah = int(jumlah)
-                        if harga_satuan and harga_satuan != '-':
-                            harga_satuan = int(harga_satuan)
-                    except ValueError:
+                    parsed = parse_import_row(row)
+                    if parsed is None:
                         skipped_count += 1
-                        logger.warning(f"Invalid numeric values in row: {row}")
                         continue
+                    tanggal, nama, barang, jumlah, harga_satuan, total = parsed
                     
                     # Check if customer exists (for auto-merge)
-                    records = tingkat_sheet.get_all_records()
-                    existing_row_idx = None
-                    existing_record = None
-                    
-                    for idx, record in enumerate(records, start=2):
-                        if record['Nama'].lower() == nama.lower():
-                            existing_row_idx = idx
-                            existing_record = record
-                            break
+                    key = canonical_name(nama)
+                    existing_row_idx = table.find(nama)
                     
                     if existing_row_idx:
-                        # Merge with existing
-                        existing_total = int(existing_record['Total'])
+                        # Merge with existing (or with an earlier CSV row for the same customer)
+                        pending = merged_rows.get(existing_row_idx)
+                        existing_total = pending['Total'] if pending else int(table.record_at(existing_row_idx)['Total'])
+                        new_total = existing_total + total
+                        
+                        merged_rows[existing_row_idx] = {
+                            'Tanggal': tanggal,
+                            'Barang': 'Multiple',
+                            'Jumlah': '-',
+                            'Harga Satuan': '-',
+                            'Total': new_total
+                        }
+                        
+                        merged_count += 1
+                        logger.info(f"Merged import for {nama}: {existing_total} + {total} = {new_total}")
+                    elif key in new_rows:
+                        # Customer is new but appeared earlier in this CSV
+                        pending_row = new_rows[key]
+                        existing_total = pending_row[5]
                         new_total = existing_total + total
                         
-                        tingkat_sheet.update_cell(existing_row_idx, 1, tanggal)
-                        tingkat_sheet.update_cell(existing_row_idx, 3, 'Multiple')
-                        tingkat_sheet.update_cell(existing_row_idx, 4, '-')
-                        tingkat_sheet.update_cell(existing_row_idx, 5, '-')
-                        tingkat_sheet.update_cell(existing_row_idx, 6, new_total)
+                        new_rows[key] = [tanggal, pending_row[1], 'Multiple', '-', '-', new_total]
                         
                         merged_count += 1
                         logger.info(f"Merged import for {nama}: {existing_total} + {total} = {new_total}")
                     else:
                         # Add new row
-                        new_row = [tanggal, nama, barang, jumlah, harga_satuan, total]
-                        tingkat_sheet.append_row(new_row)
+                        new_rows[key] = [tanggal, nama, barang, jumlah, harga_satuan, total]
                         imported_count += 1
                         logger.info(f"Imported new customer: {nama}")
                     
@@ -399,6 +1106,11 @@ class SheetsManager:
                     logger.warning(f"Error processing row: {row}, Error: {e}")
                     continue
             
+            # One batched update for merged rows, one append for new customers
+            self._write_tingkat_batch(
+                tingkat_sheet, sheet_name, table, merged_rows, list(new_rows.values())
+            )
+            
             return {
                 'imported': imported_count,
                 'merged': merged_count,
@@ -410,49 +1122,88 @@ class SheetsManager:
             logger.error(f"Error importing data: {e}")
             raise
     
-    def export_data(self, tingkat: int) -> str:
-        """Export tingkat sheet data to CSV format"""
+    @count_api_calls
+    def export_data(self, tingkat: int, since: str = None):
+        """Export tingkat sheet to a CSV file (optionally only rows dated since YYYY-MM-DD)
+        
+        The sheet is read in EXPORT_CHUNK_ROWS row ranges and written straight
+        into a spooled temporary file, so memory stays flat while reading large
+        sheets. Sending it is not streamed: python-telegram-bot reads the whole
+        document into memory for the upload, so one copy of the CSV (at most
+        Telegram's 50 MB bot upload limit) is held while it is sent. Returns
+        the binary file positioned at the start (caller closes it), or None if
+        there is nothing to export.
+        """
         try:
-            sheet_name = f'Tingkat {tingkat}'
-            tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-            
-            # Get all values including headers
-            all_values = tingkat_sheet.get_all_values()
-            
-            if not all_values:
-                return ""
+            # Reads straight from the sheet, so send queued writes first
+            self.flush_outbox()
             
-            # Convert to CSV format
-            import csv
-            from io import StringIO
-            
-            output = StringIO()
-            csv_writer = csv.writer(output)
-            
-            for row in all_values:
-                csv_writer.writerow(row)
-            
-            return output.getvalue()
+            sheet_name = f'Tingkat {tingkat}'
+            # Locked only after the flush, which takes every sheet lock itself
+            with self._holding([sheet_name]):
+                # Appends grow the grid, so refresh metadata for an accurate row_count
+                self.reload_worksheets()
+                tingkat_sheet = self._worksheet(sheet_name)
+                last_col = len(self.TINGKAT_HEADERS)
+                
+                export_file = tempfile.SpooledTemporaryFile(max_size=self.EXPORT_SPOOL_SIZE, mode='w+b')
+                try:
+                    text = io.TextIOWrapper(export_file, encoding='utf-8', newline='')
+                    csv_writer = csv.writer(text)
+                    written = 0
+                    
+                    start_row = 1
+                    while start_row <= tingkat_sheet.row_count:
+                        end_row = start_row + self.EXPORT_CHUNK_ROWS - 1
+                        chunk = tingkat_sheet.get(
+                            f'{rowcol_to_a1(start_row, 1)}:{rowcol_to_a1(end_row, last_col)}'
+                        )
+                        
+                        for offset, row in enumerate(chunk):
+                            is_header = start_row + offset == 1
+                            if since and not is_header and str(row[0] if row else '')[:10] < since:
+                                continue
+                            csv_writer.writerow(row)
+                            if not is_header:
+                                written += 1
+                        
+                        if len(chunk) < self.EXPORT_CHUNK_ROWS:
+                            # Rows are contiguous, a short chunk means the end of the data
+                            break
+                        start_row = end_row + 1
+                    
+                    text.flush()
+                    text.detach()
+                except Exception:
+                    # Nothing reaches the caller, so nothing else would close the spool
+                    export_file.close()
+                    raise
+                
+                if export_file.tell() == 0 or (since and not written):
+                    export_file.close()
+                    return None
+                
+                export_file.seek(0)
+                logger.info(f"Exported {written} row(s) from {sheet_name}")
+                return export_file
             
         except Exception as e:
             logger.error(f"Error exporting data: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Keuangan')
     def set_modal_awal(self, jumlah: int) -> bool:
         """Set initial capital (can only be set once)"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-            records = keuangan_sheet.get_all_records()
-            
             # Check if modal already set
-            for record in records:
-                if record.get('Tipe') == 'Modal Awal':
-                    return False
+            if self._ledger_state().modal_awal is not None:
+                return False
             
             # Add modal awal transaction
             tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             row = [tanggal, 'Modal Awal', 'Modal awal usaha', jumlah, 0, jumlah]
-            keuangan_sheet.append_row(row)
+            self._append_keuangan_row(row)
             
             logger.info(f"Modal awal set to: Rp {jumlah:,}")
             return True
@@ -461,49 +1212,38 @@ class SheetsManager:
             logger.error(f"Error setting modal awal: {e}")
             raise
     
+    @count_api_calls
     def get_modal_awal(self) -> int:
         """Get initial capital from first Modal Awal transaction"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-            records = keuangan_sheet.get_all_records()
-            
-            for record in records:
-                if record.get('Tipe') == 'Modal Awal':
-                    return int(record.get('Debit', 0))
-            
-            return 0
+            return self._ledger_state().modal_awal or 0
             
         except Exception as e:
             logger.error(f"Error getting modal awal: {e}")
             raise
     
+    @count_api_calls
     def get_current_saldo(self) -> int:
         """Get current balance from last row in Keuangan sheet"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-            records = keuangan_sheet.get_all_records()
-            
-            if not records:
-                return 0
-            
-            # Get saldo from last transaction
-            last_record = records[-1]
-            return int(last_record.get('Saldo', 0))
+            # Saldo of the last row, tracked in memory since startup
+            return self._ledger_state().saldo
             
         except Exception as e:
             logger.error(f"Error getting current saldo: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Keuangan')
     def add_topup(self, jumlah: int):
         """Add top-up transaction"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
             current_saldo = self.get_current_saldo()
             new_saldo = current_saldo + jumlah
             
             tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             row = [tanggal, 'Top-up', 'Tambah modal', jumlah, 0, new_saldo]
-            keuangan_sheet.append_row(row)
+            self._append_keuangan_row(row)
             
             logger.info(f"Top-up added: Rp {jumlah:,}, New saldo: Rp {new_saldo:,}")
             
@@ -511,6 +1251,8 @@ class SheetsManager:
             logger.error(f"Error adding topup: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Keuangan')
     def add_penarikan(self, jumlah: int) -> bool:
         """Add withdrawal transaction"""
         try:
@@ -520,12 +1262,11 @@ class SheetsManager:
             if current_saldo < jumlah:
                 return False
             
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
             new_saldo = current_saldo - jumlah
             
             tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             row = [tanggal, 'Penarikan', 'Ambil saldo', 0, jumlah, new_saldo]
-            keuangan_sheet.append_row(row)
+            self._append_keuangan_row(row)
             
             logger.info(f"Penarikan added: Rp {jumlah:,}, New saldo: Rp {new_saldo:,}")
             return True
@@ -534,16 +1275,17 @@ class SheetsManager:
             logger.error(f"Error adding penarikan: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Keuangan')
     def add_pemasukan(self, jumlah: int, keterangan: str = 'Pemasukan cash'):
         """Add cash income transaction"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
             current_saldo = self.get_current_saldo()
             new_saldo = current_saldo + jumlah
             
             tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             row = [tanggal, 'Pemasukan', keterangan, jumlah, 0, new_saldo]
-            keuangan_sheet.append_row(row)
+            self._append_keuangan_row(row)
             
             logger.info(f"Pemasukan added: Rp {jumlah:,}, Keterangan: {keterangan}, New saldo: Rp {new_saldo:,}")
             
@@ -551,6 +1293,8 @@ class SheetsManager:
             logger.error(f"Error adding pemasukan: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Keuangan')
     def add_pengeluaran(self, jumlah: int, keterangan: str = 'Pengeluaran operasional') -> bool:
         """Add expense transaction"""
         try:
@@ -560,12 +1304,11 @@ class SheetsManager:
             if current_saldo < jumlah:
                 return False
             
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
             new_saldo = current_saldo - jumlah
             
             tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             row = [tanggal, 'Pengeluaran', keterangan, 0, jumlah, new_saldo]
-            keuangan_sheet.append_row(row)
+            self._append_keuangan_row(row)
             
             logger.info(f"Pengeluaran added: Rp {jumlah:,}, Keterangan: {keterangan}, New saldo: Rp {new_saldo:,}")
             return True
@@ -574,112 +1317,77 @@ class SheetsManager:
             logger.error(f"Error adding pengeluaran: {e}")
             raise
     
-    def add_pelunasan_to_keuangan(self, nama: str, tingkat: int, jumlah: int):
-        """Add pelunasan transaction to Keuangan"""
+    @count_api_calls
+    @holds_sheets('Keuangan')
+    def add_pelunasan_to_keuangan(self, nama: str, tingkat: int, jumlah: int) -> int:
+        """Add pelunasan transaction to Keuangan and return the new saldo"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
             current_saldo = self.get_current_saldo()
             new_saldo = current_saldo + jumlah
             
             tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             keterangan = f'{nama} - Tingkat {tingkat}'
             row = [tanggal, 'Pelunasan', keterangan, jumlah, 0, new_saldo]
-            keuangan_sheet.append_row(row)
+            self._append_keuangan_row(row)
             
             logger.info(f"Pelunasan added to Keuangan: {nama}, Tingkat {tingkat}, Rp {jumlah:,}, New saldo: Rp {new_saldo:,}")
+            return new_saldo
             
         except Exception as e:
             logger.error(f"Error adding pelunasan to keuangan: {e}")
             raise
     
+    @count_api_calls
+    @holds_sheets('Keuangan')
+    def append_keuangan_batch(self, entries: List[tuple]) -> List[int]:
+        """Append many Keuangan rows with one request, each on top of the previous row's saldo"""
+        try:
+            state = self._ledger_state()
+            saldo = state.saldo
+            saldos = []
+            rows = []
+            tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            for tipe, keterangan, debit, kredit in entries:
+                # Withdrawals and expenses never take the saldo below zero
+                if kredit and saldo < kredit:
+                    saldos.append(None)
+                    continue
+                saldo += debit - kredit
+                rows.append([tanggal, tipe, keterangan, debit, kredit, saldo])
+                saldos.append(saldo)
+            
+            if rows:
+                # One timestamp per batch, so every row lands in the same partition
+                expected = (state.transactions + len(rows), saldo)
+                try:
+                    self._append_keuangan_rows(rows)
+                except Exception:
+                    # A failed request may still have written the rows (e.g. a timeout after
+                    # the write); queued outbox rows are not on the sheet yet, so never re-read then
+                    if self.outbox or not self._ledger_landed(*expected):
+                        raise
+            
+            logger.info(f"Keuangan batch appended: {len(rows)} of {len(entries)} row(s), New saldo: Rp {saldo:,}")
+            return saldos
+            
+        except Exception as e:
+            logger.error(f"Error appending keuangan batch: {e}")
+            raise
+    
+    @count_api_calls
+    @holds_sheets('Tingkat {tingkat}', 'History', 'Keuangan')
     def process_payment(self, nama: str, tingkat: int, jumlah: int) -> Dict:
         """Process payment (partial or full) for a customer"""
         try:
             sheet_name = f'Tingkat {tingkat}'
-            tingkat_sheet = self.spreadsheet.worksheet(sheet_name)
-            records = tingkat_sheet.get_all_records()
+            tingkat_sheet = self._tingkat_worksheet(sheet_name)
+            table = self._load_tingkat(sheet_name, tingkat_sheet)
             
             # Find the customer row
-            customer_found = False
-            for idx, record in enumerate(records, start=2):  # Start from row 2 (after header)
-                if record['Nama'].strip().lower() == nama.strip().lower():
-                    customer_found = True
-                    current_debt = int(record['Total'])
-                    
-                    # Validate payment amount
-                    if jumlah > current_debt:
-                        return {
-                            'success': False,
-                            'error': 'exceeds_debt',
-                            'current_debt': current_debt,
-                            'payment': jumlah
-                        }
-                    
-                    # Calculate remaining debt
-                    sisa_utang = current_debt - jumlah
-                    saldo_sebelum = self.get_current_saldo()
-                    
-                    if sisa_utang == 0:
-                        # Full payment - DELETE row and backup to History
-                        tanggal_transaksi = record['Tanggal']
-                        tanggal_lunas = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        
-                        # Backup to History
-                        history_sheet = self.spreadsheet.worksheet('History')
-                        history_row = [tanggal_lunas, tingkat, tanggal_transaksi, nama, current_debt]
-                        history_sheet.append_row(history_row)
-                        
-                        # Delete row from tingkat sheet
-                        tingkat_sheet.delete_rows(idx)
-                        
-                        # Add to Keuangan as Pelunasan
-                        keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-                        new_saldo = saldo_sebelum + jumlah
-                        keterangan = f'{nama} - Tingkat {tingkat}'
-                        keuangan_row = [tanggal_lunas, 'Pelunasan', keterangan, jumlah, 0, new_saldo]
-                        keuangan_sheet.append_row(keuangan_row)
-                        
-                        logger.info(f"Full payment processed: {nama}, Tingkat {tingkat}, Rp {jumlah:,}")
-                        
-                        return {
-                            'success': True,
-                            'is_full_payment': True,
-                            'nama': nama,
-                            'tingkat': tingkat,
-                            'payment': jumlah,
-                            'previous_debt': current_debt,
-                            'remaining_debt': 0,
-                            'saldo_sebelum': saldo_sebelum,
-                            'saldo_sekarang': new_saldo
-                        }
-                    else:
-                        # Partial payment - UPDATE Total column
-                        tingkat_sheet.update_cell(idx, self.TOTAL_COLUMN_INDEX, sisa_utang)
-                        
-                        # Add to Keuangan as Pembayaran Cicilan
-                        keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-                        new_saldo = saldo_sebelum + jumlah
-                        tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        keterangan = f'{nama} - Tingkat {tingkat} (Bayar: Rp {jumlah:,}, Sisa: Rp {sisa_utang:,})'
-                        keuangan_row = [tanggal, 'Pembayaran Cicilan', keterangan, jumlah, 0, new_saldo]
-                        keuangan_sheet.append_row(keuangan_row)
-                        
-                        logger.info(f"Partial payment processed: {nama}, Tingkat {tingkat}, Rp {jumlah:,}, Remaining: Rp {sisa_utang:,}")
-                        
-                        return {
-                            'success': True,
-                            'is_full_payment': False,
-                            'nama': nama,
-                            'tingkat': tingkat,
-                            'payment': jumlah,
-                            'previous_debt': current_debt,
-                            'remaining_debt': sisa_utang,
-                            'saldo_sebelum': saldo_sebelum,
-                            'saldo_sekarang': new_saldo
-                        }
-            
-            # Customer not found
-            if not customer_found:
+            idx = table.find(nama)
+            if not idx:
+                # Customer not found
                 return {
                     'success': False,
                     'error': 'not_found',
@@ -687,83 +1395,247 @@ class SheetsManager:
                     'tingkat': tingkat
                 }
             
+            record = table.record_at(idx)
+            current_debt = int(record['Total'])
+            
+            # Validate payment amount
+            if jumlah > current_debt:
+                return {
+                    'success': False,
+                    'error': 'exceeds_debt',
+                    'current_debt': current_debt,
+                    'payment': jumlah
+                }
+            
+            # Calculate remaining debt
+            sisa_utang = current_debt - jumlah
+            saldo_sebelum = self.get_current_saldo()
+            
+            if sisa_utang == 0:
+                # Full payment - DELETE row and backup to History
+                tanggal_transaksi = record['Tanggal']
+                tanggal_lunas = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                
+                # Backup to History
+                history_row = [tanggal_lunas, tingkat, tanggal_transaksi, nama, current_debt]
+                self._append_history_row(history_row)
+                
+                # Delete row from tingkat sheet
+                self._delete_tingkat_row(tingkat_sheet, sheet_name, table, idx)
+                
+                # Add to Keuangan as Pelunasan
+                new_saldo = saldo_sebelum + jumlah
+                keterangan = f'{nama} - Tingkat {tingkat}'
+                keuangan_row = [tanggal_lunas, 'Pelunasan', keterangan, jumlah, 0, new_saldo]
+                self._append_keuangan_row(keuangan_row)
+                
+                logger.info(f"Full payment processed: {nama}, Tingkat {tingkat}, Rp {jumlah:,}")
+                
+                return {
+                    'success': True,
+                    'is_full_payment': True,
+                    'nama': nama,
+                    'tingkat': tingkat,
+                    'payment': jumlah,
+                    'previous_debt': current_debt,
+                    'remaining_debt': 0,
+                    'saldo_sebelum': saldo_sebelum,
+                    'saldo_sekarang': new_saldo
+                }
+            else:
+                # Partial payment - UPDATE Total column
+                self._write_tingkat_row(tingkat_sheet, sheet_name, table, idx, {'Total': sisa_utang})
+                
+                # Add to Keuangan as Pembayaran Cicilan
+                new_saldo = saldo_sebelum + jumlah
+                tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                keterangan = f'{nama} - Tingkat {tingkat} (Bayar: Rp {jumlah:,}, Sisa: Rp {sisa_utang:,})'
+                keuangan_row = [tanggal, 'Pembayaran Cicilan', keterangan, jumlah, 0, new_saldo]
+                self._append_keuangan_row(keuangan_row)
+                
+                logger.info(f"Partial payment processed: {nama}, Tingkat {tingkat}, Rp {jumlah:,}, Remaining: Rp {sisa_utang:,}")
+                
+                return {
+                    'success': True,
+                    'is_full_payment': False,
+                    'nama': nama,
+                    'tingkat': tingkat,
+                    'payment': jumlah,
+                    'previous_debt': current_debt,
+                    'remaining_debt': sisa_utang,
+                    'saldo_sebelum': saldo_sebelum,
+                    'saldo_sekarang': new_saldo
+                }
+            
         except Exception as e:
             logger.error(f"Error processing payment: {e}")
             raise
     
+    @count_api_calls
     def get_keuangan_summary(self) -> Dict:
         """Return summary for financial dashboard"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-            records = keuangan_sheet.get_all_records()
+            # Running totals kept by the ledger state, no rescan of the Keuangan sheet
+            return self._ledger_state().summary()
             
-            current_saldo = self.get_current_saldo()
-            modal_awal = self.get_modal_awal()
-            profit = current_saldo - modal_awal
-            
-            # Calculate totals by type
-            total_pelunasan = 0
-            total_cicilan = 0
-            total_pemasukan = 0
-            total_pengeluaran_ops = 0
-            total_penarikan = 0
-            
-            for record in records:
-                tipe = record.get('Tipe', '')
-                debit = int(record.get('Debit', 0))
-                kredit = int(record.get('Kredit', 0))
-                
-                if tipe == 'Pelunasan':
-                    total_pelunasan += debit
-                elif tipe == 'Pembayaran Cicilan':
-                    total_cicilan += debit
-                elif tipe == 'Pemasukan':
-                    total_pemasukan += debit
-                elif tipe == 'Pengeluaran':
-                    total_pengeluaran_ops += kredit
-                elif tipe == 'Penarikan':
-                    total_penarikan += kredit
-            
-            total_pendapatan = total_pelunasan + total_cicilan + total_pemasukan
-            total_pengeluaran = total_pengeluaran_ops + total_penarikan
+        except Exception as e:
+            logger.error(f"Error getting keuangan summary: {e}")
+            raise
+    
+    @count_api_calls
+    @holds_sheets()
+    def verify_ledger(self, repair: bool = False) -> Dict:
+        """Rescan the Keuangan sheet and report where the in-memory ledger drifted from it"""
+        try:
+            # Queued rows are already counted in memory, send them before comparing
+            self.flush_outbox()
+            state = self._ledger_state()
+            scanned = self._read_ledger()
+            
+            drift = state.drift(scanned)
+            if not drift:
+                logger.info("Ledger verified: running totals match the Keuangan sheet")
+            else:
+                logger.warning(f"Ledger drift (memory, sheet): {drift}")
+                if repair:
+                    self.ledger = scanned
+                    self.dashboard = None
+            return drift
             
-            return {
-                'saldo': current_saldo,
-                'modal_awal': modal_awal,
-                'profit': profit,
-                'total_pelunasan': total_pelunasan,
-                'total_cicilan': total_cicilan,
-                'total_pemasukan': total_pemasukan,
-                'total_pendapatan': total_pendapatan,
-                'total_pengeluaran_ops': total_pengeluaran_ops,
-                'total_penarikan': total_penarikan,
-                'total_pengeluaran': total_pengeluaran
-            }
+        except Exception as e:
+            logger.error(f"Error verifying ledger: {e}")
+            raise
+    
+    @holds_sheets()
+    def reload_dashboard(self):
+        """Rebuild the /saldo snapshot and the ledger state from one batched read"""
+        # Reads straight from the sheet, so send queued writes first
+        self.flush_outbox()
+        if self._worksheets is None:
+            self.reload_worksheets()
+        
+        sheet_name, ledger_ranges = self._ledger_ranges()
+        tingkat_nums = [num for num in range(1, 5) if f'Tingkat {num}' in self._worksheets]
+        ranges = ledger_ranges + [
+            absolute_range_name(f'Tingkat {num}', 'F2:F') for num in tingkat_nums
+        ]
+        value_ranges = self.spreadsheet.values_batch_get(ranges, params={
+            'valueRenderOption': 'UNFORMATTED_VALUE'
+        }).get('valueRanges', [])
+        
+        tingkat_totals = {
+            num: [row[0] if row else '' for row in value_ranges[position].get('values', [])]
+            for position, num in enumerate(tingkat_nums, start=len(ledger_ranges))
+        }
+        
+        # The snapshot shares this ledger state, so both come from the same read
+        self.ledger = self._ledger_from(sheet_name, value_ranges[:len(ledger_ranges)])
+        self.dashboard = DashboardSnapshot.from_values(self.ledger, tingkat_totals)
+        logger.info(f"Dashboard loaded: saldo Rp {self.ledger.saldo:,}, {self.ledger.transactions} Keuangan row(s)")
+    
+    @count_api_calls
+    @holds_sheets()
+    def get_dashboard(self) -> Dict:
+        """Get /saldo figures from memory, rebuilding the snapshot with one request when stale"""
+        try:
+            ttl = self.cache.ttl if self.cache else self.STATS_TTL
+            if self.dashboard is None or not self.dashboard.is_fresh(ttl):
+                self.reload_dashboard()
+            return self.dashboard.to_dict()
             
         except Exception as e:
-            logger.error(f"Error getting keuangan summary: {e}")
+            logger.error(f"Error getting dashboard: {e}")
             raise
     
-    def get_keuangan_history(self, limit: int = 10) -> List[Dict]:
-        """Get last N transactions from Keuangan sheet"""
+    @count_api_calls
+    def get_customer_history(self, nama: str, limit: int = 20) -> List[Dict]:
+        """Get a customer's settled debts from History (newest first) using the name index"""
         try:
-            keuangan_sheet = self.spreadsheet.worksheet('Keuangan')
-            records = keuangan_sheet.get_all_records()
+            # Reads straight from the sheet, so send queued writes first
+            self.flush_outbox()
             
-            # Get last N records (newest first)
-            last_records = list(reversed(records[-limit:]))
+            # Locked only after the flush, which takes every sheet lock itself
+            with self._holding(['History']):
+                rows = self._history_index().find(nama)[-limit:]
+            if not rows:
+                return []
+            
+            # Only the customer's own rows, newest first, in one request
+            value_ranges = self.spreadsheet.values_batch_get([
+                absolute_range_name('History', f'A{row_idx}:E{row_idx}') for row_idx in reversed(rows)
+            ]).get('valueRanges', [])
             
-            # Format records
             history = []
-            for record in last_records:
-                history.append({
-                    'tanggal': record.get('Tanggal', ''),
-                    'tipe': record.get('Tipe', ''),
-                    'keterangan': record.get('Keterangan', ''),
-                    'debit': int(record.get('Debit', 0)),
-                    'kredit': int(record.get('Kredit', 0)),
-                    'saldo': int(record.get('Saldo', 0))
-                })
+            for value_range in value_ranges:
+                for row in value_range.get('values', []):
+                    row = row + [''] * (5 - len(row))
+                    history.append({
+                        'tanggal_lunas': row[0],
+                        'tingkat': int(row[1] or 0),
+                        'tanggal_transaksi': row[2],
+                        'nama': row[3],
+                        'total': int(row[4] or 0)
+                    })
+            
+            return history
+            
+        except Exception as e:
+            logger.error(f"Error getting customer history: {e}")
+            raise
+    
+    @count_api_calls
+    def get_keuangan_count(self) -> int:
+        """Number of Keuangan transactions, from the in-memory ledger"""
+        try:
+            return self._ledger_state().transactions
+            
+        except Exception as e:
+            logger.error(f"Error getting keuangan count: {e}")
+            raise
+    
+    @count_api_calls
+    def get_keuangan_history(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Get N transactions from Keuangan sheet (newest first), skipping the `offset` newest"""
+        try:
+            # Reads straight from the sheet, so send queued writes first
+            self.flush_outbox()
+            
+            # The ledger knows where every partition ends, so only the requested rows are read
+            ranges = []
+            skip, remaining = offset, limit
+            with self._holding(['Keuangan']):
+                segments = self._ledger_state().segments()
+            for sheet_name, first, last in segments:
+                count = max(0, last - first + 1)
+                if remaining <= 0:
+                    break
+                if skip >= count:
+                    skip -= count
+                    continue
+                
+                end = last - skip
+                start = max(first, end - remaining + 1)
+                ranges.append(absolute_range_name(sheet_name, f'A{start}:F{end}'))
+                remaining -= end - start + 1
+                skip = 0
+            
+            if not ranges:
+                return []
+            value_ranges = self.spreadsheet.values_batch_get(ranges).get('valueRanges', [])
+            
+            # Format records (newest first)
+            history = []
+            for value_range in value_ranges:
+                for row in reversed(value_range.get('values', [])):
+                    record = dict(zip(LedgerState.HEADERS, row))
+                    history.append({
+                        'tanggal': record.get('Tanggal', ''),
+                        'tipe': record.get('Tipe', ''),
+                        'keterangan': record.get('Keterangan', ''),
+                        'debit': int(record.get('Debit') or 0),
+                        'kredit': int(record.get('Kredit') or 0),
+                        'saldo': int(record.get('Saldo') or 0)
+                    })
             
             return history
             
@@ -771,6 +1643,7 @@ class SheetsManager:
             logger.error(f"Error getting keuangan history: {e}")
             raise
     
+    @count_api_calls
     def add_debt_quick(self, tingkat: int, nama: str, jumlah: int):
         """Quick add debt without going through full flow"""
         try:
@@ -0,0 +1,90 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+def load_credentials(credentials_path: str = None, credentials_info: Dict = None) -> service_account.Credentials:
+    """Service account credentials from the parsed key JSON (kept in memory) or a key file"""
+    if credentials_info:
+        return service_account.Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+    return service_account.Credentials.from_service_account_file(credentials_path, scopes=SCOPES)
+
+def _keep_alive(session: requests.Session, pool_size: int) -> requests.Session:
+    """Reuse up to pool_size open HTTPS connections and ask for gzip responses"""
+    session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    # Google APIs only compress responses when the User-Agent mentions gzip as well
+    session.headers.update({'Accept-Encoding': 'gzip', 'User-Agent': 'botutangjoshop (gzip)'})
+    return session
+
+
+class SheetsTransport:
+    """Pooled keep-alive HTTP sessions for Google APIs with background token refresh
+    
+    API calls go through one AuthorizedSession whose connection pool covers
+    the Sheets worker threads, so warm TLS connections are reused instead of
+    reopened per request. A daemon thread refreshes the access token
+    REFRESH_MARGIN seconds before it expires, ahead of google-auth's own
+    on-request refresh, so commands never wait on the token endpoint.
+    """
+    
+    # Refresh this many seconds before expiry (google-auth itself refreshes at 3m45s)
+    REFRESH_MARGIN = 600.0
+    
+    # Wait before retrying a failed refresh
+    RETRY_DELAY = 30.0
+    
+    def __init__(self, credentials: service_account.Credentials, pool_size: int = 10):
+        self.credentials = credentials
+        # Token endpoint requests use their own plain session, also kept alive
+        self.auth_request = Request(_keep_alive(requests.Session(), 2))
+        self.session = _keep_alive(
+            AuthorizedSession(credentials, auth_request=self.auth_request), pool_size
+        )
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def _seconds_left(self) -> float:
+        """Seconds until the current access token expires (0 without a token)"""
+        if not self.credentials.token or self.credentials.expiry is None:
+            return 0.0
+        expiry = self.credentials.expiry.replace(tzinfo=timezone.utc)
+        return (expiry - datetime.now(timezone.utc)).total_seconds()
+    
+    def refresh(self):
+        """Fetch a new access token"""
+        self.credentials.refresh(self.auth_request)
+        logger.info(f"Access token refreshed, valid for {self._seconds_left():.0f}s")
+    
+    def start(self):
+        """Get the first token now and keep it fresh on a daemon thread"""
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the refresh thread and close pooled connections"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.session.close()
+    
+    def _run(self):
+        """Sleep until REFRESH_MARGIN before expiry, refresh, repeat"""
+        # RETRY_DELAY is also the floor, so a failing or short-lived token never spins the loop
+        while not self._stopped.wait(max(self._seconds_left() - self.REFRESH_MARGIN, self.RETRY_DELAY)):
+            try:
+                self.refresh()
+            except Exception as e:
+                # The on-request refresh still covers us until the token expires
+                logger.error(f"Error refreshing access token: {e}")
@@ -0,0 +1,706 @@
+import csv
+import io
+import logging
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict
+from sheet_cache import canonical_name
+from storage_backend import StorageBackend, parse_import_row
+
+logger = logging.getLogger(__name__)
+
+# Jumlah and Harga Satuan hold either a number or '-', so they are declared
+# without a type to keep values exactly as written (like the sheet cells)
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tingkat (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tingkat INTEGER NOT NULL,
+    tanggal TEXT NOT NULL,
+    nama TEXT NOT NULL,
+    nama_key TEXT NOT NULL,
+    barang TEXT,
+    jumlah,
+    harga_satuan,
+    total INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tingkat_nama ON tingkat (tingkat, nama_key, id);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tanggal_lunas TEXT NOT NULL,
+    tingkat INTEGER NOT NULL,
+    tanggal_transaksi TEXT,
+    nama TEXT NOT NULL,
+    nama_key TEXT NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_nama ON history (nama_key, id);
+
+CREATE TABLE IF NOT EXISTS keuangan (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tanggal TEXT NOT NULL,
+    tipe TEXT NOT NULL,
+    keterangan TEXT,
+    debit INTEGER NOT NULL DEFAULT 0,
+    kredit INTEGER NOT NULL DEFAULT 0,
+    saldo INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_keuangan_tipe ON keuangan (tipe, id);
+'''
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite storage with the same Tingkat/History/Keuangan semantics as Sheets
+    
+    Rows keep their insertion order through the AUTOINCREMENT id, which plays
+    the role of the sheet row number. Each worker thread gets its own
+    connection; the database runs in WAL mode so reads never wait for a
+    writer, and every command that writes runs in one BEGIN IMMEDIATE
+    transaction so saldo reads and the row that extends it are atomic.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        # Every thread's connection, so close() can reach them from the shutting-down thread
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+    
+    def _conn(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, transactions are opened explicitly in _transaction; only this
+            # thread uses the connection, other threads merely close it in close()
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close every thread's connection (call once no command is running)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        # Threads that run another command afterwards open a fresh connection
+        self._local = threading.local()
+        logger.info(f"SQLite storage closed: {len(connections)} connection(s)")
+    
+    @contextmanager
+    def _transaction(self):
+        """Run a block of statements as one write transaction"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def _find_row(self, conn, tingkat: int, nama: str):
+        """Get (id, tanggal, total) of the customer's row in a tingkat, or None"""
+        return conn.execute(
+            'SELECT id, tanggal, total FROM tingkat '
+            'WHERE tingkat = ? AND nama_key = ? ORDER BY id LIMIT 1',
+            (int(tingkat), canonical_name(nama))
+        ).fetchone()
+    
+    def _saldo(self, conn) -> int:
+        """Get saldo of the newest Keuangan row"""
+        row = conn.execute('SELECT saldo FROM keuangan ORDER BY id DESC LIMIT 1').fetchone()
+        return row[0] if row else 0
+    
+    def _append_keuangan(self, conn, tanggal: str, tipe: str, keterangan: str,
+                         debit: int, kredit: int) -> int:
+        """Append a Keuangan row on top of the current saldo and return the new saldo"""
+        new_saldo = self._saldo(conn) + debit - kredit
+        conn.execute(
+            'INSERT INTO keuangan (tanggal, tipe, keterangan, debit, kredit, saldo) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (tanggal, tipe, keterangan, debit, kredit, new_saldo)
+        )
+        return new_saldo
+    
+    def _merge_or_insert(self, conn, tingkat: int, row: List) -> bool:
+        """Merge a Tingkat row into the customer's existing row or insert it, True if merged"""
+        tanggal, nama, barang, jumlah, harga_satuan, total = row
+        existing = self._find_row(conn, tingkat, nama)
+        
+        if existing:
+            existing_id, _, existing_total = existing
+            new_total = existing_total + total
+            conn.execute(
+                "UPDATE tingkat SET tanggal = ?, barang = 'Multiple', jumlah = '-', "
+                "harga_satuan = '-', total = ? WHERE id = ?",
+                (tanggal, new_total, existing_id)
+            )
+            logger.info(f"Transaction MERGED for {nama} in Tingkat {tingkat}: {existing_total} + {total} = {new_total}")
+            return True
+        
+        conn.execute(
+            'INSERT INTO tingkat (tingkat, tanggal, nama, nama_key, barang, jumlah, harga_satuan, total) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (int(tingkat), tanggal, nama, canonical_name(nama), barang, jumlah, harga_satuan, total)
+        )
+        logger.info(f"New transaction added for {nama} in Tingkat {tingkat}")
+        return False
+    
+    def _settle(self, conn, row_id: int, tingkat: int, tanggal_transaksi: str,
+                nama: str, total: int, tanggal_lunas: str):
+        """Move a fully paid row to History"""
+        conn.execute(
+            'INSERT INTO history (tanggal_lunas, tingkat, tanggal_transaksi, nama, nama_key, total) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (tanggal_lunas, int(tingkat), tanggal_transaksi, nama, canonical_name(nama), total)
+        )
+        conn.execute('DELETE FROM tingkat WHERE id = ?', (row_id,))
+    
+    def initialize_sheets(self):
+        """Create tables and indexes if not exist"""
+        try:
+            self._conn().executescript(SCHEMA)
+            logger.info(f"SQLite storage initialized: {self.db_path}")
+        
+        except Exception as e:
+            logger.error(f"Error initializing SQLite storage: {e}")
+            raise
+    
+    def add_transaction(self, data: Dict):
+        """Add transaction with auto-merge logic"""
+        try:
+            row = [
+                data['tanggal'],
+                data['nama'],
+                data['barang'],
+                data['jumlah'],
+                data['harga_satuan'],
+                data['total']
+            ]
+            with self._transaction() as conn:
+                self._merge_or_insert(conn, data['tingkat'], row)
+        
+        except Exception as e:
+            logger.error(f"Error adding transaction: {e}")
+            raise
+    
+    def get_total_debt(self, nama: str, tingkat: int = None) -> int:
+        """Get total debt for a customer, optionally filtered by tingkat"""
+        try:
+            conn = self._conn()
+            total = 0
+            
+            for tingkat_num in ([tingkat] if tingkat else range(1, 5)):
+                row = self._find_row(conn, tingkat_num, nama)
+                if row:
+                    total += row[2]
+            
+            return total
+        
+        except Exception as e:
+            logger.error(f"Error getting total debt: {e}")
+            raise
+    
+    def get_debt_breakdown(self, nama: str) -> Dict[int, int]:
+        """Get a customer's debt per tingkat (0 where none) with one indexed query"""
+        try:
+            breakdown = {tingkat_num: 0 for tingkat_num in range(1, 5)}
+            seen = set()
+            
+            for tingkat_num, total in self._conn().execute(
+                'SELECT tingkat, total FROM tingkat '
+                'WHERE tingkat IN (1, 2, 3, 4) AND nama_key = ? ORDER BY id',
+                (canonical_name(nama),)
+            ):
+                # First row per tingkat, like _find_row
+                if tingkat_num not in seen:
+                    seen.add(tingkat_num)
+                    breakdown[tingkat_num] = total
+            
+            return breakdown
+            
+        except Exception as e:
+            logger.error(f"Error getting debt breakdown: {e}")
+            raise
+    
+    def get_unpaid_customers(self, tingkat: int = None) -> List[Dict]:
+        """Get list of customers with unpaid debt, optionally filtered by tingkat"""
+        try:
+            query = 'SELECT tingkat, nama, total FROM tingkat'
+            params = ()
+            if tingkat:
+                query += ' WHERE tingkat = ?'
+                params = (int(tingkat),)
+            
+            customers_debt = {}
+            for tingkat_num, nama, total in self._conn().execute(query + ' ORDER BY id', params):
+                # First row wins for an exact duplicate name, like the Sheets backend
+                customers_debt.setdefault((nama, tingkat_num), {
+                    'nama': nama,
+                    'tingkat': tingkat_num,
+                    'total': total
+                })
+            
+            return sorted(customers_debt.values(), key=lambda x: (x['tingkat'], x['nama']))
+        
+        except Exception as e:
+            logger.error(f"Error getting unpaid customers: {e}")
+            raise
+    
+    def mark_as_paid(self, nama: str, tingkat: int) -> Dict:
+        """Delete customer row, backup to History, and update Keuangan"""
+        try:
+            with self._transaction() as conn:
+                row = self._find_row(conn, tingkat, nama)
+                if not row:
+                    logger.warning(f"Customer {nama} not found in Tingkat {tingkat}")
+                    return {
+                        'success': False,
+                        'error': 'not_found',
+                        'nama': nama,
+                        'tingkat': tingkat
+                    }
+                
+                row_id, tanggal_transaksi, total = row
+                tanggal_lunas = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                saldo_sebelum = self._saldo(conn)
+                self._settle(conn, row_id, tingkat, tanggal_transaksi, nama, total, tanggal_lunas)
+                saldo_sekarang = self._append_keuangan(
+                    conn, tanggal_lunas, 'Pelunasan', f'{nama} - Tingkat {tingkat}', total, 0
+                )
+            
+            logger.info(f"Payment processed for {nama} in Tingkat {tingkat}: Rp {total:,}")
+            return {
+                'success': True,
+                'nama': nama,
+                'tingkat': tingkat,
+                'total': total,
+                'saldo_sebelum': saldo_sebelum,
+                'saldo_sekarang': saldo_sekarang
+            }
+        
+        except Exception as e:
+            logger.error(f"Error marking as paid: {e}")
+            raise
+    
+    def get_stats(self) -> Dict:
+        """Get statistics for all tingkat"""
+        try:
+            stats = {
+                'tingkat': {},
+                'grand_total': 0,
+                'total_customers': 0,
+                'total_transactions': 0
+            }
+            
+            totals = {
+                tingkat_num: (total_debt, num_customers)
+                for tingkat_num, total_debt, num_customers in self._conn().execute(
+                    'SELECT tingkat, SUM(total), COUNT(*) FROM tingkat GROUP BY tingkat'
+                )
+            }
+            
+            for tingkat_num in range(1, 5):
+                total_debt, num_customers = totals.get(tingkat_num, (0, 0))
+                
+                stats['tingkat'][tingkat_num] = {
+                    'total_debt': total_debt,
+                    'num_customers': num_customers,
+                    'num_transactions': num_customers  # 1 customer = 1 row
+                }
+                
+                stats['grand_total'] += total_debt
+                stats['total_customers'] += num_customers
+                stats['total_transactions'] += num_customers
+            
+            return stats
+        
+        except Exception as e:
+            logger.error(f"Error getting stats: {e}")
+            raise
+    
+    def import_data(self, tingkat: int, csv_content: str) -> Dict:
+        """Import CSV data with auto-merge logic"""
+        try:
+            csv_reader = csv.DictReader(io.StringIO(csv_content))
+            
+            imported_count = 0
+            merged_count = 0
+            skipped_count = 0
+            
+            with self._transaction() as conn:
+                for row in csv_reader:
+                    parsed = parse_import_row(row)
+                    if parsed is None:
+                        skipped_count += 1
+                        continue
+                    
+                    if self._merge_or_insert(conn, tingkat, parsed):
+                        merged_count += 1
+                    else:
+                        imported_count += 1
+            
+            return {
+                'imported': imported_count,
+                'merged': merged_count,
+                'skipped': skipped_count,
+                'total': imported_count + merged_count
+            }
+        
+        except Exception as e:
+            logger.error(f"Error importing data: {e}")
+            raise
+    
+    def export_data(self, tingkat: int, since: str = None):
+        """Export tingkat rows to a CSV file (optionally only rows dated since YYYY-MM-DD)"""
+        try:
+            query = ('SELECT tanggal, nama, barang, jumlah, harga_satuan, total '
+                     'FROM tingkat WHERE tingkat = ?')
+            params = [int(tingkat)]
+            if since:
+                query += ' AND substr(tanggal, 1, 10) >= ?'
+                params.append(since)
+            
+            export_file = tempfile.SpooledTemporaryFile(max_size=self.EXPORT_SPOOL_SIZE, mode='w+b')
+            try:
+                text = io.TextIOWrapper(export_file, encoding='utf-8', newline='')
+                csv_writer = csv.writer(text)
+                csv_writer.writerow(self.TINGKAT_HEADERS)
+                
+                # The cursor streams rows, so the table is never loaded at once
+                written = 0
+                for row in self._conn().execute(query + ' ORDER BY id', params):
+                    csv_writer.writerow(row)
+                    written += 1
+                
+                text.flush()
+                text.detach()
+            except Exception:
+                # Nothing reaches the caller, so nothing else would close the spool
+                export_file.close()
+                raise
+            
+            if since and not written:
+                export_file.close()
+                return None
+            
+            export_file.seek(0)
+            logger.info(f"Exported {written} row(s) from Tingkat {tingkat}")
+            return export_file
+        
+        except Exception as e:
+            logger.error(f"Error exporting data: {e}")
+            raise
+    
+    def set_modal_awal(self, jumlah: int) -> bool:
+        """Set initial capital (can only be set once)"""
+        try:
+            with self._transaction() as conn:
+                if conn.execute("SELECT 1 FROM keuangan WHERE tipe = 'Modal Awal' LIMIT 1").fetchone():
+                    return False
+                
+                tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                # Modal awal opens the ledger, so its saldo is the amount itself
+                conn.execute(
+                    'INSERT INTO keuangan (tanggal, tipe, keterangan, debit, kredit, saldo) '
+                    "VALUES (?, 'Modal Awal', 'Modal awal usaha', ?, 0, ?)",
+                    (tanggal, jumlah, jumlah)
+                )
+            
+            logger.info(f"Modal awal set to: Rp {jumlah:,}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error setting modal awal: {e}")
+            raise
+    
+    def get_modal_awal(self) -> int:
+        """Get initial capital from first Modal Awal transaction"""
+        try:
+            row = self._conn().execute(
+                "SELECT debit FROM keuangan WHERE tipe = 'Modal Awal' ORDER BY id LIMIT 1"
+            ).fetchone()
+            return row[0] if row else 0
+        
+        except Exception as e:
+            logger.error(f"Error getting modal awal: {e}")
+            raise
+    
+    def get_current_saldo(self) -> int:
+        """Get current balance from the newest Keuangan row"""
+        try:
+            return self._saldo(self._conn())
+        
+        except Exception as e:
+            logger.error(f"Error getting current saldo: {e}")
+            raise
+    
+    def _add_keuangan(self, tipe: str, keterangan: str, debit: int, kredit: int) -> int:
+        """Append a Keuangan row in its own transaction, None if saldo would go negative"""
+        with self._transaction() as conn:
+            if kredit and self._saldo(conn) < kredit:
+                return None
+            tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            return self._append_keuangan(conn, tanggal, tipe, keterangan, debit, kredit)
+    
+    def add_topup(self, jumlah: int):
+        """Add top-up transaction"""
+        try:
+            new_saldo = self._add_keuangan('Top-up', 'Tambah modal', jumlah, 0)
+            logger.info(f"Top-up added: Rp {jumlah:,}, New saldo: Rp {new_saldo:,}")
+        
+        except Exception as e:
+            logger.error(f"Error adding topup: {e}")
+            raise
+    
+    def add_penarikan(self, jumlah: int) -> bool:
+        """Add withdrawal transaction"""
+        try:
+            new_saldo = self._add_keuangan('Penarikan', 'Ambil saldo', 0, jumlah)
+            if new_saldo is None:
+                return False
+            
+            logger.info(f"Penarikan added: Rp {jumlah:,}, New saldo: Rp {new_saldo:,}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error adding penarikan: {e}")
+            raise
+    
+    def add_pemasukan(self, jumlah: int, keterangan: str = 'Pemasukan cash'):
+        """Add cash income transaction"""
+        try:
+            new_saldo = self._add_keuangan('Pemasukan', keterangan, jumlah, 0)
+            logger.info(f"Pemasukan added: Rp {jumlah:,}, Keterangan: {keterangan}, New saldo: Rp {new_saldo:,}")
+        
+        except Exception as e:
+            logger.error(f"Error adding pemasukan: {e}")
+            raise
+    
+    def add_pengeluaran(self, jumlah: int, keterangan: str = 'Pengeluaran operasional') -> bool:
+        """Add expense transaction"""
+        try:
+            new_saldo = self._add_keuangan('Pengeluaran', keterangan, 0, jumlah)
+            if new_saldo is None:
+                return False
+            
+            logger.info(f"Pengeluaran added: Rp {jumlah:,}, Keterangan: {keterangan}, New saldo: Rp {new_saldo:,}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error adding pengeluaran: {e}")
+            raise
+    
+    def add_pelunasan_to_keuangan(self, nama: str, tingkat: int, jumlah: int) -> int:
+        """Add pelunasan transaction to Keuangan and return the new saldo"""
+        try:
+            new_saldo = self._add_keuangan('Pelunasan', f'{nama} - Tingkat {tingkat}', jumlah, 0)
+            logger.info(f"Pelunasan added to Keuangan: {nama}, Tingkat {tingkat}, Rp {jumlah:,}, New saldo: Rp {new_saldo:,}")
+            return new_saldo
+        
+        except Exception as e:
+            logger.error(f"Error adding pelunasan to keuangan: {e}")
+            raise
+    
+    def append_keuangan_batch(self, entries: List[tuple]) -> List[int]:
+        """Append many Keuangan rows in one transaction, each on top of the previous saldo"""
+        try:
+            saldos = []
+            tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self._transaction() as conn:
+                for tipe, keterangan, debit, kredit in entries:
+                    if kredit and self._saldo(conn) < kredit:
+                        saldos.append(None)
+                        continue
+                    saldos.append(self._append_keuangan(conn, tanggal, tipe, keterangan, debit, kredit))
+            
+            logger.info(f"Keuangan batch appended: {len(entries)} row(s)")
+            return saldos
+        
+        except Exception as e:
+            logger.error(f"Error appending keuangan batch: {e}")
+            raise
+    
+    def process_payment(self, nama: str, tingkat: int, jumlah: int) -> Dict:
+        """Process payment (partial or full) for a customer"""
+        try:
+            with self._transaction() as conn:
+                row = self._find_row(conn, tingkat, nama)
+                if not row:
+                    # Customer not found
+                    return {
+                        'success': False,
+                        'error': 'not_found',
+                        'nama': nama,
+                        'tingkat': tingkat
+                    }
+                
+                row_id, tanggal_transaksi, current_debt = row
+                
+                # Validate payment amount
+                if jumlah > current_debt:
+                    return {
+                        'success': False,
+                        'error': 'exceeds_debt',
+                        'current_debt': current_debt,
+                        'payment': jumlah
+                    }
+                
+                sisa_utang = current_debt - jumlah
+                saldo_sebelum = self._saldo(conn)
+                tanggal = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                
+                if sisa_utang == 0:
+                    # Full payment - move row to History and record Pelunasan
+                    self._settle(conn, row_id, tingkat, tanggal_transaksi, nama, current_debt, tanggal)
+                    new_saldo = self._append_keuangan(
+                        conn, tanggal, 'Pelunasan', f'{nama} - Tingkat {tingkat}', jumlah, 0
+                    )
+                else:
+                    # Partial payment - reduce Total and record Pembayaran Cicilan
+                    conn.execute('UPDATE tingkat SET total = ? WHERE id = ?', (sisa_utang, row_id))
+                    keterangan = f'{nama} - Tingkat {tingkat} (Bayar: Rp {jumlah:,}, Sisa: Rp {sisa_utang:,})'
+                    new_saldo = self._append_keuangan(
+                        conn, tanggal, 'Pembayaran Cicilan', keterangan, jumlah, 0
+                    )
+            
+            logger.info(f"Payment processed: {nama}, Tingkat {tingkat}, Rp {jumlah:,}, Remaining: Rp {sisa_utang:,}")
+            
+            return {
+                'success': True,
+                'is_full_payment': sisa_utang == 0,
+                'nama': nama,
+                'tingkat': tingkat,
+                'payment': jumlah,
+                'previous_debt': current_debt,
+                'remaining_debt': sisa_utang,
+                'saldo_sebelum': saldo_sebelum,
+                'saldo_sekarang': new_saldo
+            }
+        
+        except Exception as e:
+            logger.error(f"Error processing payment: {e}")
+            raise
+    
+    def get_keuangan_summary(self) -> Dict:
+        """Return summary for financial dashboard"""
+        try:
+            conn = self._conn()
+            current_saldo = self._saldo(conn)
+            modal_awal = self.get_modal_awal()
+            
+            totals = {
+                tipe: (debit, kredit)
+                for tipe, debit, kredit in conn.execute(
+                    'SELECT tipe, SUM(debit), SUM(kredit) FROM keuangan GROUP BY tipe'
+                )
+            }
+            
+            total_pelunasan = totals.get('Pelunasan', (0, 0))[0]
+            total_cicilan = totals.get('Pembayaran Cicilan', (0, 0))[0]
+            total_pemasukan = totals.get('Pemasukan', (0, 0))[0]
+            total_pengeluaran_ops = totals.get('Pengeluaran', (0, 0))[1]
+            total_penarikan = totals.get('Penarikan', (0, 0))[1]
+            
+            total_pendapatan = total_pelunasan + total_cicilan + total_pemasukan
+            total_pengeluaran = total_pengeluaran_ops + total_penarikan
+            
+            return {
+                'saldo': current_saldo,
+                'modal_awal': modal_awal,
+                'profit': current_saldo - modal_awal,
+                'total_pelunasan': total_pelunasan,
+                'total_cicilan': total_cicilan,
+                'total_pemasukan': total_pemasukan,
+                'total_pendapatan': total_pendapatan,
+                'total_pengeluaran_ops': total_pengeluaran_ops,
+                'total_penarikan': total_penarikan,
+                'total_pengeluaran': total_pengeluaran
+            }
+        
+        except Exception as e:
+            logger.error(f"Error getting keuangan summary: {e}")
+            raise
+    
+    def get_customer_history(self, nama: str, limit: int = 20) -> List[Dict]:
+        """Get a customer's settled debts from History (newest first)"""
+        try:
+            rows = self._conn().execute(
+                'SELECT tanggal_lunas, tingkat, tanggal_transaksi, nama, total '
+                'FROM history WHERE nama_key = ? ORDER BY id DESC LIMIT ?',
+                (canonical_name(nama), limit)
+            )
+            
+            return [
+                {
+                    'tanggal_lunas': tanggal_lunas,
+                    'tingkat': tingkat,
+                    'tanggal_transaksi': tanggal_transaksi or '',
+                    'nama': row_nama,
+                    'total': total
+                }
+                for tanggal_lunas, tingkat, tanggal_transaksi, row_nama, total in rows
+            ]
+        
+        except Exception as e:
+            logger.error(f"Error getting customer history: {e}")
+            raise
+    
+    def get_keuangan_count(self) -> int:
+        """Number of Keuangan transactions"""
+        try:
+            return self._conn().execute('SELECT COUNT(*) FROM keuangan').fetchone()[0]
+        
+        except Exception as e:
+            logger.error(f"Error getting keuangan count: {e}")
+            raise
+    
+    def get_keuangan_history(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Get N transactions from Keuangan (newest first), skipping the `offset` newest"""
+        try:
+            rows = self._conn().execute(
+                'SELECT tanggal, tipe, keterangan, debit, kredit, saldo '
+                'FROM keuangan ORDER BY id DESC LIMIT ? OFFSET ?',
+                (limit, offset)
+            )
+            
+            return [
+                {
+                    'tanggal': tanggal,
+                    'tipe': tipe,
+                    'keterangan': keterangan,
+                    'debit': debit,
+                    'kredit': kredit,
+                    'saldo': saldo
+                }
+                for tanggal, tipe, keterangan, debit, kredit, saldo in rows
+            ]
+        
+        except Exception as e:
+            logger.error(f"Error getting keuangan history: {e}")
+            raise
+    
+    def add_debt_quick(self, tingkat: int, nama: str, jumlah: int):
+        """Quick add debt without going through full flow"""
+        try:
+            # Use existing add_transaction with auto-merge
+            self.add_transaction({
+                'tanggal': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'tingkat': tingkat,
+                'nama': nama,
+                'barang': 'Quick Entry',
+                'jumlah': '-',
+                'harga_satuan': '-',
+                'total': jumlah
+            })
+            logger.info(f"Quick debt added: {nama}, Tingkat {tingkat}, Rp {jumlah:,}")
+        
+        except Exception as e:
+            logger.error(f"Error adding quick debt: {e}")
+            raise
@@ -0,0 +1,183 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Dict
+
+logger = logging.getLogger(__name__)
+
+class PartialWriteError(Exception):
+    """A multi-step write failed after some of its steps were already stored, so it must not be retried as a whole"""
+
+def parse_import_row(row: Dict) -> List:
+    """Parse one /import CSV row into a Tingkat row, or None if it must be skipped"""
+    # Handle both lowercase and titlecase headers
+    nama = row.get('Nama') or row.get('nama', '').strip()
+    barang = row.get('Barang') or row.get('barang', '').strip()
+    tanggal = row.get('Tanggal') or row.get('tanggal', '').strip()
+    jumlah = row.get('Jumlah') or row.get('jumlah', '').strip()
+    harga_satuan = row.get('Harga Satuan') or row.get('harga satuan', '').strip()
+    total = row.get('Total') or row.get('total', '').strip()
+    
+    if not nama or not total:
+        logger.warning(f"Skipping invalid row: {row}")
+        return None
+    
+    # Convert numeric values
+    try:
+        total = int(total)
+        if jumlah and jumlah != '-':
+            jumlah = int(jumlah)
+        if harga_satuan and harga_satuan != '-':
+            harga_satuan = int(harga_satuan)
+    except ValueError:
+        logger.warning(f"Invalid numeric values in row: {row}")
+        return None
+    
+    return [tanggal, nama, barang, jumlah, harga_satuan, total]
+
+class StorageBackend(ABC):
+    """Persistence API used by the bot (Tingkat debts, History, Keuangan ledger)
+    
+    SheetsManager stores everything in Google Sheets, SQLiteBackend in a
+    local database. Both keep the same semantics: one row per customer per
+    tingkat (matched by canonical name, new debts merge into it), paid rows
+    move to History, and every money movement appends a Keuangan row with
+    the running saldo.
+    """
+    
+    TINGKAT_HEADERS = ['Tanggal', 'Nama', 'Barang', 'Jumlah', 'Harga Satuan', 'Total']
+    
+    # Exports spill from memory to disk past this many bytes
+    EXPORT_SPOOL_SIZE = 1024 * 1024
+    
+    # ApiMetrics of the remote API calls, None for local backends
+    metrics = None
+    
+    @abstractmethod
+    def initialize_sheets(self):
+        """Create Tingkat 1-4, History and Keuangan storage if missing"""
+    
+    def flush_outbox(self) -> int:
+        """Write out queued changes, returns number of write requests sent"""
+        return 0
+    
+    def invalidate_cache(self, tingkat: int = None):
+        """Drop cached Tingkat data so the next read reloads it"""
+    
+    def reload_worksheets(self):
+        """Refresh cached handles of remote sheets"""
+    
+    def close(self):
+        """Release connections and background threads"""
+    
+    def get_pressure(self) -> Dict:
+        """Current load on remote API quotas (0.0 idle to 1.0 saturated)"""
+        return {'read': 0.0, 'write': 0.0, 'throttled': False}
+    
+    @abstractmethod
+    def add_transaction(self, data: Dict):
+        """Add transaction with auto-merge into the customer's existing row"""
+    
+    @abstractmethod
+    def get_total_debt(self, nama: str, tingkat: int = None) -> int:
+        """Get total debt for a customer, optionally filtered by tingkat"""
+    
+    @abstractmethod
+    def get_debt_breakdown(self, nama: str) -> Dict[int, int]:
+        """Get a customer's debt per tingkat 1-4 (0 where none)"""
+    
+    @abstractmethod
+    def get_unpaid_customers(self, tingkat: int = None) -> List[Dict]:
+        """Get list of customers with unpaid debt, optionally filtered by tingkat"""
+    
+    @abstractmethod
+    def mark_as_paid(self, nama: str, tingkat: int) -> Dict:
+        """Remove customer row, back it up to History and add Pelunasan to Keuangan, with saldo before and after"""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """Get statistics for all tingkat"""
+    
+    @abstractmethod
+    def import_data(self, tingkat: int, csv_content: str) -> Dict:
+        """Import CSV data with auto-merge logic"""
+    
+    @abstractmethod
+    def export_data(self, tingkat: int, since: str = None):
+        """Export tingkat rows to a binary CSV file positioned at the start, or None"""
+    
+    @abstractmethod
+    def set_modal_awal(self, jumlah: int) -> bool:
+        """Set initial capital (can only be set once)"""
+    
+    @abstractmethod
+    def get_modal_awal(self) -> int:
+        """Get initial capital from first Modal Awal transaction"""
+    
+    @abstractmethod
+    def get_current_saldo(self) -> int:
+        """Get current balance (saldo of the newest Keuangan row)"""
+    
+    @abstractmethod
+    def add_topup(self, jumlah: int):
+        """Add top-up transaction"""
+    
+    @abstractmethod
+    def add_penarikan(self, jumlah: int) -> bool:
+        """Add withdrawal transaction, False if saldo is insufficient"""
+    
+    @abstractmethod
+    def add_pemasukan(self, jumlah: int, keterangan: str = 'Pemasukan cash'):
+        """Add cash income transaction"""
+    
+    @abstractmethod
+    def add_pengeluaran(self, jumlah: int, keterangan: str = 'Pengeluaran operasional') -> bool:
+        """Add expense transaction, False if saldo is insufficient"""
+    
+    @abstractmethod
+    def add_pelunasan_to_keuangan(self, nama: str, tingkat: int, jumlah: int) -> int:
+        """Add pelunasan transaction to Keuangan and return the new saldo"""
+    
+    @abstractmethod
+    def append_keuangan_batch(self, entries: List[tuple]) -> List[int]:
+        """Append (tipe, keterangan, debit, kredit) rows in order, returns each row's saldo (None if it would go negative)"""
+    
+    @abstractmethod
+    def process_payment(self, nama: str, tingkat: int, jumlah: int) -> Dict:
+        """Process payment (partial or full) for a customer"""
+    
+    @abstractmethod
+    def get_keuangan_summary(self) -> Dict:
+        """Return summary for financial dashboard"""
+    
+    def verify_ledger(self, repair: bool = False) -> Dict:
+        """Compare running Keuangan totals with a full rescan, as {field: (memory, rescanned)}"""
+        return {}
+    
+    def get_dashboard(self) -> Dict:
+        """Get /saldo figures: the Keuangan summary plus debt per tingkat"""
+        summary = self.get_keuangan_summary()
+        stats = self.get_stats()
+        tingkat_debt = {num: stats['tingkat'][num]['total_debt'] for num in range(1, 5)}
+        total_utang = sum(tingkat_debt.values())
+        return dict(
+            summary,
+            tingkat_debt=tingkat_debt,
+            total_utang=total_utang,
+            potensi_total=summary['saldo'] + total_utang
+        )
+    
+    @abstractmethod
+    def get_customer_history(self, nama: str, limit: int = 20) -> List[Dict]:
+        """Get a customer's settled debts from History (newest first)"""
+    
+    @abstractmethod
+    def get_keuangan_count(self) -> int:
+        """Number of Keuangan transactions"""
+    
+    @abstractmethod
+    def get_keuangan_history(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Get N Keuangan transactions (newest first), skipping the `offset` newest"""
+    
+    @abstractmethod
+    def add_debt_quick(self, tingkat: int, nama: str, jumlah: int):
+        """Quick add debt without going through full flow"""
@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+import benchmark
+from async_sheets_manager import AsyncSheetsManager
+from testkit import make_manager
+from fake_gspread import FakeSpreadsheet
+from update_processor import ChatUpdateProcessor
+
+@pytest.mark.parametrize('mode', list(benchmark.MODES))
+def test_concurrent_debts_and_topups_lose_no_updates(mode):
+    # Latency keeps several calls in flight, which is what exposes lost updates
+    spreadsheet = FakeSpreadsheet(latency=0.002)
+    benchmark.seed(spreadsheet, 20)
+    manager = make_manager(spreadsheet, **benchmark.MODES[mode])
+    sheets = AsyncSheetsManager(manager, max_workers=16)
+    saldo = manager.get_current_saldo()
+    debt = manager.get_total_debt('Pelanggan 3')
+    
+    async def burst():
+        jobs = []
+        for i in range(30):
+            jobs.append(sheets.add_debt_quick(1 + i % 4, f'Baru {i % 5}', 1000))
+            jobs.append(sheets.add_debt_quick(1 + i % 4, 'Pelanggan 3', 500))
+            jobs.append(sheets.add_topup(100))
+            jobs.append(sheets.get_stats())
+        await asyncio.gather(*jobs)
+        await sheets.close()
+    
+    try:
+        asyncio.run(burst())
+        manager.flush_outbox()
+        
+        assert manager.get_current_saldo() == saldo + 30 * 100
+        assert manager.get_total_debt('Pelanggan 3') == debt + 30 * 500
+        for k in range(5):
+            assert manager.get_total_debt(f'Baru {k}') == 1000 * len(range(k, 30, 5))
+        assert manager.verify_ledger() == {}
+        
+        # Everything above must also be on the sheets, not only in memory
+        fresh = make_manager(spreadsheet, **benchmark.MODES[mode])
+        assert fresh.get_current_saldo() == saldo + 30 * 100
+        assert fresh.get_total_debt('Pelanggan 3') == debt + 30 * 500
+    finally:
+        sheets.shutdown()
+
+def test_ledger_saldo_follows_submission_order():
+    manager = make_manager()
+    sheets = AsyncSheetsManager(manager)
+    
+    async def entries():
+        results = await asyncio.gather(
+            sheets.add_topup(1000),
+            sheets.add_penarikan(300),
+            # More than is left, so it is refused without a row
+            sheets.add_pengeluaran(5000),
+            sheets.add_pemasukan(50)
+        )
+        await sheets.close()
+        return results
+    
+    try:
+        assert asyncio.run(entries()) == [1000, 700, None, 750]
+        assert manager.get_keuangan_count() == 3
+    finally:
+        sheets.shutdown()
+
+def test_ledger_batch_that_reached_the_sheet_is_not_failed(monkeypatch):
+    manager = make_manager()
+    manager.add_topup(1000)
+    worksheet = manager._worksheet('Keuangan')
+    append_rows = worksheet.append_rows
+    
+    def append_then_time_out(*args, **kwargs):
+        append_rows(*args, **kwargs)
+        raise TimeoutError('read timeout')
+    
+    monkeypatch.setattr(worksheet, 'append_rows', append_then_time_out)
+    assert manager.append_keuangan_batch([('Top-up', 'x', 100, 0), ('Penarikan', 'y', 0, 50)]) == [1100, 1050]
+    
+    def time_out(*args, **kwargs):
+        raise TimeoutError('connect timeout')
+    
+    monkeypatch.setattr(worksheet, 'append_rows', time_out)
+    with pytest.raises(TimeoutError):
+        manager.append_keuangan_batch([('Top-up', 'x', 7, 0)])
+    
+    monkeypatch.setattr(worksheet, 'append_rows', append_rows)
+    manager.add_topup(1)
+    assert manager.get_current_saldo() == 1051
+    assert manager.verify_ledger() == {}
+
+def test_update_processor_orders_each_chat_and_overlaps_chats():
+    from datetime import datetime
+    from telegram import Chat, Message, Update, User
+    
+    def update(update_id: int, user_id: int) -> Update:
+        user = User(user_id, 'Test', False)
+        chat = Chat(user_id, Chat.PRIVATE)
+        return Update(update_id, message=Message(update_id, datetime.now(), chat, from_user=user, text='x'))
+    
+    processor = ChatUpdateProcessor(8)
+    log = []
+    
+    async def handle(tag: str, delay: float):
+        log.append(('start', tag))
+        await asyncio.sleep(delay)
+        log.append(('end', tag))
+    
+    async def run():
+        await asyncio.gather(
+            processor.process_update(update(1, 1), handle('a1', 0.05)),
+            processor.process_update(update(2, 1), handle('a2', 0.01)),
+            processor.process_update(update(3, 2), handle('b1', 0.01))
+        )
+    
+    asyncio.run(run())
+    # The second update of user 1 waits for the first, user 2 runs alongside it
+    assert log.index(('start', 'a2')) > log.index(('end', 'a1'))
+    assert log.index(('end', 'b1')) < log.index(('end', 'a1'))
+    assert processor._pending == {}
+
+def test_update_processor_backlog_in_one_chat_does_not_delay_others():
+    from datetime import datetime
+    from telegram import Chat, Message, Update, User
+    
+    def update(update_id: int, user_id: int) -> Update:
+        user = User(user_id, 'Test', False)
+        chat = Chat(user_id, Chat.PRIVATE)
+        return Update(update_id, message=Message(update_id, datetime.now(), chat, from_user=user, text='x'))
+    
+    # Fewer slots than the backlog of user 1
+    processor = ChatUpdateProcessor(2)
+    finished = {}
+    
+    async def handle(tag: str, delay: float):
+        await asyncio.sleep(delay)
+        finished[tag] = asyncio.get_running_loop().time()
+    
+    async def run():
+        start = asyncio.get_running_loop().time()
+        backlog = [processor.process_update(update(i, 1), handle(f'a{i}', 0.1)) for i in range(4)]
+        other = processor.process_update(update(10, 2), handle('b', 0.01))
+        await asyncio.gather(*backlog, other)
+        return start
+    
+    start = asyncio.run(run())
+    # User 2 runs alongside the first update of user 1, not after the whole backlog
+    assert finished['b'] - start < 0.08
+    assert [tag for tag in sorted(finished, key=finished.get) if tag != 'b'] == ['a0', 'a1', 'a2', 'a3']
+    assert processor._pending == {}
@@ -0,0 +1,91 @@
+import datetime
+import random
+import pytest
+import benchmark
+from testkit import make_manager
+from fake_gspread import FakeSpreadsheet
+from ledger import SUMMARY_SHEET
+from sqlite_backend import SQLiteBackend
+
+def without_dates(history):
+    return [{key: value for key, value in entry.items() if key != 'tanggal'} for entry in history]
+
+@pytest.mark.parametrize('mode', ['plain', 'cache', 'write-behind'])
+def test_monthly_partitions_roll_over_and_match_single_ledger(clock, tmp_path, mode):
+    rnd = random.Random(1)
+    spreadsheet = FakeSpreadsheet()
+    manager = make_manager(spreadsheet, monthly_keuangan=True, **benchmark.MODES[mode])
+    # SQLite keeps one unpartitioned ledger, so it is the reference
+    reference = SQLiteBackend(str(tmp_path / 'ledger.db'))
+    reference.initialize_sheets()
+    
+    for step in range(200):
+        if step % 40 == 39:
+            clock.current += datetime.timedelta(days=rnd.randint(20, 70))
+        jumlah = rnd.randint(1, 50) * 100
+        method, args = rnd.choice([
+            ('add_topup', (jumlah,)), ('add_penarikan', (jumlah,)), ('add_pemasukan', (jumlah, 'x')),
+            ('add_pengeluaran', (jumlah, 'y')), ('set_modal_awal', (jumlah,)),
+            ('add_debt_quick', (1, 'Budi', jumlah)), ('process_payment', ('Budi', 1, jumlah))
+        ])
+        assert getattr(manager, method)(*args) == getattr(reference, method)(*args), (step, method)
+    
+    partitions = sorted(title for title in spreadsheet._worksheets if title.startswith('Keuangan 20'))
+    assert len(partitions) == 5
+    
+    total = reference.get_keuangan_count()
+    assert manager.get_keuangan_summary() == reference.get_keuangan_summary()
+    assert manager.get_keuangan_count() == total
+    for offset in range(0, total + 5, 9):
+        assert without_dates(manager.get_keuangan_history(10, offset)) == without_dates(reference.get_keuangan_history(10, offset))
+    assert manager.verify_ledger() == {}
+    
+    # A restart rebuilds the state from the summary rows and the newest partition only
+    manager.flush_outbox()
+    # One summary row per closed partition
+    assert [row[0] for row in spreadsheet.worksheet(SUMMARY_SHEET).get_all_values()[1:]] == partitions[:-1]
+    restarted = make_manager(spreadsheet, monthly_keuangan=True)
+    assert restarted.get_keuangan_summary() == reference.get_keuangan_summary()
+    assert restarted.get_current_saldo() == reference.get_current_saldo()
+    assert without_dates(restarted.get_keuangan_history(25, 40)) == without_dates(reference.get_keuangan_history(25, 40))
+
+def test_legacy_sheet_becomes_the_first_partition(clock):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 10)
+    manager = make_manager(spreadsheet, monthly_keuangan=True)
+    saldo = manager.get_current_saldo()
+    count = manager.get_keuangan_count()
+    
+    manager.add_topup(500)
+    
+    assert 'Keuangan 2026-08' in spreadsheet._worksheets
+    assert manager.get_current_saldo() == saldo + 500
+    assert manager.get_keuangan_count() == count + 1
+    assert manager.get_keuangan_history(1)[0]['debit'] == 500
+    assert manager.verify_ledger() == {}
+
+@pytest.mark.parametrize('mode', ['plain', 'cache', 'write-behind'])
+def test_verify_ledger_reports_and_repairs_drift(clock, mode):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 3)
+    manager = make_manager(spreadsheet, **benchmark.MODES[mode])
+    manager.add_pemasukan(2000, 'Titipan')
+    # Queued rows are sent before the rescan, so they are no drift
+    assert manager.verify_ledger() == {}
+    
+    # A row typed straight into the sheet is not in the running totals
+    spreadsheet.worksheet('Keuangan').append_row(['2026-08-20 11:00:00', 'Pengeluaran', 'Gas', 0, 7000, 1005000])
+    drift = {
+        'saldo': (1012000, 1005000),
+        'last_row': (5, 6),
+        'transactions': (4, 5),
+        'total_pengeluaran_ops': (0, 7000)
+    }
+    assert manager.verify_ledger() == drift
+    assert manager.get_current_saldo() == 1012000
+    
+    assert manager.verify_ledger(repair=True) == drift
+    assert manager.verify_ledger() == {}
+    assert manager.get_current_saldo() == 1005000
+    assert manager.get_keuangan_summary()['total_pengeluaran_ops'] == 7000
+    assert manager.get_dashboard()['saldo'] == 1005000
@@ -0,0 +1,63 @@
+import pytest
+import benchmark
+from testkit import make_manager, sheet_contents
+from fake_gspread import FakeSpreadsheet
+
+def run_scenario(mode: str) -> tuple:
+    """Run the benchmark scenario in one mode, returns (results, sheet contents after a flush)"""
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 30)
+    manager = make_manager(spreadsheet, **benchmark.MODES[mode])
+    results = []
+    for label, method, args in benchmark.scenario(30):
+        if method in ('initialize_sheets', 'flush_outbox'):
+            # Flush counts differ by design, the sheets are compared instead
+            continue
+        result = getattr(manager, method)(*args)
+        if method == 'export_data':
+            with result:
+                result = result.read()
+        results.append((label, result))
+    manager.flush_outbox()
+    return results, sheet_contents(spreadsheet)
+
+@pytest.mark.parametrize('mode', ['cache', 'write-behind'])
+def test_flushed_outbox_matches_inline_writes(clock, mode):
+    inline_results, inline_sheets = run_scenario('plain')
+    results, sheets = run_scenario(mode)
+    assert results == inline_results
+    assert sheets == inline_sheets
+
+def test_flush_is_one_append_per_sheet(clock):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet, **benchmark.MODES['write-behind'])
+    for i in range(10):
+        manager.add_topup(100)
+        manager.add_debt_quick(1, f'Baru {i}', 1000)
+    
+    before = spreadsheet.request_count
+    assert manager.flush_outbox() == 20
+    assert spreadsheet.request_count - before == 2
+    # Nothing left to send
+    assert manager.flush_outbox() == 0
+
+def test_flush_leaves_nama_cells_alone(clock, monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet, **benchmark.MODES['write-behind'])
+    worksheet = spreadsheet.worksheet('Tingkat 2')
+    ranges = []
+    batch_update = worksheet.batch_update
+    
+    def recording(data, **kwargs):
+        ranges.extend(value_range['range'] for value_range in data)
+        return batch_update(data, **kwargs)
+    
+    monkeypatch.setattr(worksheet, 'batch_update', recording)
+    manager.add_debt_quick(2, 'Pelanggan 1', 500)
+    manager.process_payment('Pelanggan 3', 2, 1000)
+    
+    # Two changed Tingkat rows plus the Pembayaran Cicilan row in Keuangan
+    assert manager.flush_outbox() == 3
+    assert ranges == ['A3:A3', 'C3:F3', 'A5:A5', 'C5:F5']
@@ -0,0 +1,64 @@
+import benchmark
+from testkit import make_manager, sheet_contents
+from fake_gspread import FakeSpreadsheet
+from ledger import LedgerState, SUMMARY_SHEET
+from sheets_manager import SheetsManager
+
+def requests_for(spreadsheet: FakeSpreadsheet, func) -> int:
+    before = spreadsheet.request_count
+    func()
+    return spreadsheet.request_count - before
+
+def test_bootstrap_creates_schema_once():
+    spreadsheet = FakeSpreadsheet()
+    manager = SheetsManager(None, None, spreadsheet=spreadsheet, **benchmark.UNPACED)
+    
+    # Cold: one metadata read and one batchUpdate creating every sheet
+    assert requests_for(spreadsheet, manager.initialize_sheets) == 2
+    for tingkat in range(1, 5):
+        assert spreadsheet.worksheet(f'Tingkat {tingkat}').row_values(1) == SheetsManager.TINGKAT_HEADERS
+    assert spreadsheet.worksheet('History').row_values(1) == SheetsManager.HISTORY_HEADERS
+    assert spreadsheet.worksheet('Keuangan').row_values(1) == LedgerState.HEADERS
+    
+    manager.set_modal_awal(1000)
+    manager.add_debt_quick(1, 'Budi', 500)
+    contents = sheet_contents(spreadsheet)
+    
+    # Warm: the version marker skips validation, nothing is written again
+    restarted = SheetsManager(None, None, spreadsheet=spreadsheet, **benchmark.UNPACED)
+    assert requests_for(spreadsheet, restarted.initialize_sheets) == 2
+    assert sheet_contents(spreadsheet) == contents
+    assert len(spreadsheet.developer_metadata) == 1
+    assert restarted.get_current_saldo() == 1000
+    assert restarted.get_total_debt('Budi') == 500
+
+def test_existing_sheets_are_marked_without_rewriting_data():
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 10)
+    contents = sheet_contents(spreadsheet)
+    
+    make_manager(spreadsheet)
+    make_manager(spreadsheet)
+    
+    assert sheet_contents(spreadsheet) == contents
+    assert len(spreadsheet.developer_metadata) == 1
+    assert spreadsheet.developer_metadata[0]['metadataValue'] == str(SheetsManager.SCHEMA_VERSION)
+
+def test_missing_headers_and_sheets_are_repaired():
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.add_worksheet('History', rows=10, cols=5)
+    make_manager(spreadsheet)
+    assert spreadsheet.worksheet('History').row_values(1) == SheetsManager.HISTORY_HEADERS
+    
+    # Turning on monthly partitions adds the summary sheet to a marked spreadsheet
+    make_manager(spreadsheet, monthly_keuangan=True)
+    assert spreadsheet.worksheet(SUMMARY_SHEET).row_values(1) == LedgerState.SUMMARY_HEADERS
+    assert len(spreadsheet.developer_metadata) == 1
+
+def test_schema_version_bump_revalidates(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    make_manager(spreadsheet)
+    monkeypatch.setattr(SheetsManager, 'SCHEMA_VERSION', SheetsManager.SCHEMA_VERSION + 1)
+    make_manager(spreadsheet)
+    assert len(spreadsheet.developer_metadata) == 1
+    assert spreadsheet.developer_metadata[0]['metadataValue'] == str(SheetsManager.SCHEMA_VERSION)
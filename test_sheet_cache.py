@@ -0,0 +1,44 @@
+from sheet_cache import TingkatTable, canonical_name
+
+def table(*names) -> TingkatTable:
+    return TingkatTable([{'Nama': nama, 'Total': 1000} for nama in names])
+
+def test_names_match_case_width_and_spacing_insensitively():
+    assert canonical_name('  Budi   Santoso ') == canonical_name('BUDI santoso')
+    # Full-width letters fold to ASCII under NFKC
+    assert canonical_name('Ｂｕｄｉ') == 'budi'
+    assert canonical_name(7) == '7'
+
+def test_first_row_wins_for_duplicate_names():
+    rows = table('Ani', 'Budi', 'ani ', 'Cici')
+    assert rows.find('ANI') == 2
+    assert rows.find('budi') == 3
+    assert rows.find('Dodi') is None
+    # Appending another duplicate keeps the first row
+    assert rows.append({'Nama': 'Ani', 'Total': 5}) == 6
+    assert rows.find('Ani') == 2
+
+def test_delete_shifts_rows_below_up():
+    rows = table('Ani', 'Budi', 'Cici', 'Dodi')
+    assert rows.delete(3)['Nama'] == 'Budi'
+    assert (rows.find('Ani'), rows.find('Budi'), rows.find('Cici'), rows.find('Dodi')) == (2, None, 3, 4)
+    assert rows.record_at(3)['Nama'] == 'Cici'
+    assert rows.append({'Nama': 'Eka', 'Total': 1}) == 5
+
+def test_delete_promotes_the_next_duplicate():
+    rows = table('Ani', 'Budi', 'ANI', 'Cici', 'ani')
+    rows.delete(2)
+    # The old row 4 moved up to row 3 and is now the one found
+    assert rows.find('Ani') == 3
+    assert rows.record_at(3)['Nama'] == 'ANI'
+    rows.delete(3)
+    assert rows.find('Ani') == 4
+    rows.delete(4)
+    assert rows.find('Ani') is None
+    assert rows.find('Cici') == 3
+
+def test_deleting_a_later_duplicate_keeps_the_first():
+    rows = table('Ani', 'Budi', 'ani')
+    rows.delete(4)
+    assert rows.find('Ani') == 2
+    assert rows.find('Budi') == 3
@@ -0,0 +1,297 @@
+import pytest
+import benchmark
+from fake_gspread import FakeSpreadsheet, api_error
+from rate_limiter import is_quota_error
+from storage_backend import PartialWriteError
+from testkit import make_manager
+
+def quota_exhausted(*args, **kwargs):
+    raise api_error(429, 'Quota exceeded', 'RESOURCE_EXHAUSTED')
+
+def test_mark_as_paid_quota_error_before_any_write_can_be_retried(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet)
+    history_rows = len(spreadsheet.worksheet('History').get_all_values())
+    
+    monkeypatch.setattr(manager, '_append_history_row', quota_exhausted)
+    with pytest.raises(Exception) as raised:
+        manager.mark_as_paid('Pelanggan 1', 1)
+    assert is_quota_error(raised.value)
+    assert len(spreadsheet.worksheet('History').get_all_values()) == history_rows
+    assert manager.get_total_debt('Pelanggan 1', 1) == 6000
+
+def test_mark_as_paid_failing_after_history_is_not_a_quota_error(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet)
+    
+    monkeypatch.setattr(manager, '_delete_tingkat_row', quota_exhausted)
+    with pytest.raises(PartialWriteError) as raised:
+        manager.mark_as_paid('Pelanggan 1', 1)
+    # The bot must not offer a retry that would write History twice
+    assert not is_quota_error(raised.value)
+    assert is_quota_error(raised.value.__cause__)
+
+@pytest.mark.parametrize('mode', list(benchmark.MODES))
+def test_mark_as_paid_reports_saldo_around_its_own_row(mode):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet, **benchmark.MODES[mode])
+    saldo = manager.get_current_saldo()
+    
+    result = manager.mark_as_paid('Pelanggan 2', 3)
+    
+    assert result == {
+        'success': True, 'nama': 'Pelanggan 2', 'tingkat': 3, 'total': 6000,
+        'saldo_sebelum': saldo, 'saldo_sekarang': saldo + 6000
+    }
+    assert manager.get_current_saldo() == saldo + 6000
+    assert manager.mark_as_paid('Pelanggan 2', 3) == {
+        'success': False, 'error': 'not_found', 'nama': 'Pelanggan 2', 'tingkat': 3
+    }
+
+def written_ranges(monkeypatch, worksheet) -> list:
+    """Record the A1 ranges of every values batch_update sent to the worksheet"""
+    ranges = []
+    batch_update = worksheet.batch_update
+    
+    def recording(data, **kwargs):
+        ranges.extend(value_range['range'] for value_range in data)
+        return batch_update(data, **kwargs)
+    
+    monkeypatch.setattr(worksheet, 'batch_update', recording)
+    return ranges
+
+def test_merge_rewrites_changed_columns_but_never_nama(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet)
+    worksheet = spreadsheet.worksheet('Tingkat 1')
+    ranges = written_ranges(monkeypatch, worksheet)
+    
+    manager.add_transaction({
+        'tanggal': '2024-02-01 10:00:00', 'tingkat': 1, 'nama': 'Pelanggan 2',
+        'barang': 'Singkong', 'jumlah': 1, 'harga_satuan': 3000, 'total': 3000
+    })
+    manager.process_payment('Pelanggan 2', 1, 1000)
+    
+    # One request per write: Tanggal, then Barang..Total, skipping Nama in column B
+    assert ranges == ['A4:A4', 'C4:F4', 'F4:F4']
+    assert worksheet.get_all_values()[3] == ['2024-02-01 10:00:00', 'Pelanggan 2', 'Multiple', '-', '-', '8000']
+
+IMPORT_CSV = (
+    'Tanggal,Nama,Barang,Jumlah,Harga Satuan,Total\n'
+    '2024-02-01,Pelanggan 1,Roti,1,3000,3000\n'
+    '2024-02-01,pelanggan 1 ,Roti,1,3000,3000\n'
+    '2024-02-02,Baru,Singkong,2,2000,4000\n'
+    '2024-02-03,BARU,Basreng,1,7500,7500\n'
+    '2024-02-03,Lain,Roti,1,3000,3000\n'
+    'bad,,,,,\n'
+    '2024-02-04,Rusak,Roti,x,3000,abc\n'
+)
+
+@pytest.mark.parametrize('mode', list(benchmark.MODES))
+def test_import_merges_existing_and_repeated_customers(mode):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 3)
+    manager = make_manager(spreadsheet, **benchmark.MODES[mode])
+    
+    assert manager.import_data(1, IMPORT_CSV) == {'imported': 2, 'merged': 3, 'skipped': 2, 'total': 5}
+    manager.flush_outbox()
+    
+    assert manager.get_total_debt('Pelanggan 1', 1) == 6000 + 3000 + 3000
+    assert manager.get_total_debt('Baru', 1) == 4000 + 7500
+    assert manager.get_total_debt('Lain', 1) == 3000
+    rows = spreadsheet.worksheet('Tingkat 1').get_all_values()
+    # Existing rows keep their place and spelling, new customers follow in CSV order
+    assert [row[1] for row in rows] == ['Nama', 'Pelanggan 0', 'Pelanggan 1', 'Pelanggan 2', 'Baru', 'Lain']
+    assert rows[4] == ['2024-02-03', 'Baru', 'Multiple', '-', '-', '11500']
+
+def test_import_is_one_read_and_one_request_per_write_kind(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 3)
+    manager = make_manager(spreadsheet)
+    ranges = written_ranges(monkeypatch, spreadsheet.worksheet('Tingkat 1'))
+    # Worksheet handles are fetched once on first use, not per import
+    manager.reload_worksheets()
+    
+    before = spreadsheet.request_count
+    manager.import_data(1, IMPORT_CSV)
+    # Sheet read, merged rows update, new rows append
+    assert spreadsheet.request_count - before == 3
+    assert ranges == ['A3:A3', 'C3:F3']
+
+def test_failed_ledger_resync_drops_the_saldo_snapshot(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    manager = make_manager(spreadsheet)
+    assert manager.get_dashboard()['saldo'] == manager.get_current_saldo()
+    
+    def time_out(*args, **kwargs):
+        raise TimeoutError('read timeout')
+    
+    monkeypatch.setattr(manager._worksheet('Keuangan'), 'append_rows', time_out)
+    monkeypatch.setattr(manager, 'reload_ledger', time_out)
+    with pytest.raises(TimeoutError):
+        manager.append_keuangan_batch([('Top-up', 'x', 100, 0)])
+    
+    assert manager.ledger is None
+    assert manager.dashboard is None
+
+def test_customer_history_is_newest_first_and_limited(clock):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 8)
+    manager = make_manager(spreadsheet)
+    for tingkat in (1, 2, 3):
+        manager.mark_as_paid('Pelanggan 4', tingkat)
+    
+    history = manager.get_customer_history('pelanggan 4')
+    assert [entry['tingkat'] for entry in history] == [3, 2, 1]
+    assert history[0] == {
+        'tanggal_lunas': '2026-08-20 10:00:00', 'tingkat': 3,
+        'tanggal_transaksi': '2024-01-01 10:00:00', 'nama': 'Pelanggan 4', 'total': 6000
+    }
+    assert [entry['tingkat'] for entry in manager.get_customer_history('Pelanggan 4', 2)] == [3, 2]
+    assert manager.get_customer_history('Nobody') == []
+
+def test_history_index_counts_rows_with_an_empty_trailing_nama(clock):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 5)
+    # A settled row whose Nama was cleared by hand, at the end of History
+    spreadsheet.worksheet('History').append_row(['2024-01-03 10:00:00', 1, '2024-01-01 10:00:00', '', 5000])
+    manager = make_manager(spreadsheet)
+    # Index built before the append, which then extends it
+    assert manager.get_customer_history('Pelanggan 2') == []
+    
+    manager.mark_as_paid('Pelanggan 2', 1)
+    
+    assert manager.get_customer_history('Pelanggan 2') == [{
+        'tanggal_lunas': '2026-08-20 10:00:00', 'tingkat': 1,
+        'tanggal_transaksi': '2024-01-01 10:00:00', 'nama': 'Pelanggan 2', 'total': 6000
+    }]
+
+def export_rows(export_file) -> list:
+    with export_file:
+        return export_file.read().decode('utf-8').splitlines()
+
+def test_export_reads_in_chunks_and_filters_by_date(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 6)
+    worksheet = spreadsheet.worksheet('Tingkat 2')
+    for day in range(1, 5):
+        worksheet.append_row([f'2024-03-0{day} 10:00:00', f'Maret {day}', 'Roti', 1, 3000, 3000])
+    manager = make_manager(spreadsheet)
+    monkeypatch.setattr(manager, 'EXPORT_CHUNK_ROWS', 4)
+    reads = []
+    get = worksheet.get
+    
+    def recording(range_name=None, **kwargs):
+        reads.append(range_name)
+        return get(range_name, **kwargs)
+    
+    monkeypatch.setattr(worksheet, 'get', recording)
+    
+    rows = export_rows(manager.export_data(2))
+    # Header plus 10 rows: two full chunks and a short one that ends the read
+    assert reads == ['A1:F4', 'A5:F8', 'A9:F12']
+    assert rows[0] == 'Tanggal,Nama,Barang,Jumlah,Harga Satuan,Total'
+    assert len(rows) == 11
+    assert rows[-1] == '2024-03-04 10:00:00,Maret 4,Roti,1,3000,3000'
+    
+    rows = export_rows(manager.export_data(2, '2024-03-03'))
+    assert [row.split(',')[1] for row in rows] == ['Nama', 'Maret 3', 'Maret 4']
+    assert manager.export_data(2, '2025-01-01') is None
+
+def test_export_of_an_empty_sheet_is_only_the_header():
+    manager = make_manager()
+    assert export_rows(manager.export_data(1)) == ['Tanggal,Nama,Barang,Jumlah,Harga Satuan,Total']
+
+def test_debt_breakdown_reads_every_tingkat_in_one_request():
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 4)
+    spreadsheet.worksheet('Tingkat 2').append_row(['2024-02-01 10:00:00', 'pelanggan 1 ', 'Roti', 1, 3000, 3000])
+    spreadsheet.worksheet('Tingkat 3').append_row(['2024-02-01 10:00:00', 'Baru', 'Roti', 1, 2500, 2500])
+    manager = make_manager(spreadsheet)
+    manager.reload_worksheets()
+    
+    before = spreadsheet.request_count
+    # Matched by canonical name, and the first row wins like TingkatTable.find
+    assert manager.get_debt_breakdown('PELANGGAN 1') == {1: 6000, 2: 6000, 3: 6000, 4: 6000}
+    assert manager.get_debt_breakdown('Baru') == {1: 0, 2: 0, 3: 2500, 4: 0}
+    assert spreadsheet.request_count - before == 2
+    assert manager.get_total_debt('Baru') == 2500
+    assert manager.get_debt_breakdown('Tidak Ada') == {1: 0, 2: 0, 3: 0, 4: 0}
+
+def test_debt_breakdown_uses_cached_tables_without_a_request():
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 4)
+    manager = make_manager(spreadsheet, **benchmark.MODES['cache'])
+    for tingkat in range(1, 5):
+        manager.get_unpaid_customers(tingkat)
+    manager.add_debt_quick(2, 'Pelanggan 3', 1000)
+    
+    before = spreadsheet.request_count
+    assert manager.get_debt_breakdown('Pelanggan 3') == {1: 6000, 2: 7000, 3: 6000, 4: 6000}
+    assert spreadsheet.request_count == before
+
+def test_stats_are_memoized_until_a_write_or_the_ttl(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 3)
+    spreadsheet.worksheet('Tingkat 4').append_row(['2024-02-01 10:00:00', 'Baru', 'Roti', 1, 500, 500])
+    manager = make_manager(spreadsheet)
+    manager.reload_worksheets()
+    
+    before = spreadsheet.request_count
+    stats = manager.get_stats()
+    assert spreadsheet.request_count - before == 1
+    assert stats['tingkat'][4] == {'total_debt': 18500, 'num_customers': 4, 'num_transactions': 4}
+    assert (stats['grand_total'], stats['total_customers'], stats['total_transactions']) == (72500, 13, 13)
+    
+    # Callers get a copy, so editing it leaves the memo alone
+    stats['grand_total'] = 0
+    before = spreadsheet.request_count
+    assert manager.get_stats()['grand_total'] == 72500
+    assert spreadsheet.request_count == before
+    
+    manager.add_debt_quick(1, 'Pelanggan 1', 1000)
+    assert manager.get_stats()['tingkat'][1]['total_debt'] == 19000
+    
+    # Edits made directly in Sheets show up once the TTL runs out
+    spreadsheet.worksheet('Tingkat 3').append_row(['2024-02-01 10:00:00', 'Langsung', 'Roti', 1, 700, 700])
+    assert manager.get_stats()['tingkat'][3]['num_customers'] == 3
+    monkeypatch.setattr(manager, 'STATS_TTL', 0)
+    assert manager.get_stats()['tingkat'][3]['num_customers'] == 4
+
+@pytest.mark.parametrize('mode', list(benchmark.MODES))
+def test_keuangan_history_pages_backwards_with_bounded_reads(clock, monkeypatch, mode):
+    spreadsheet = FakeSpreadsheet()
+    benchmark.seed(spreadsheet, 10)
+    manager = make_manager(spreadsheet, **benchmark.MODES[mode])
+    for jumlah in (100, 200, 300):
+        manager.add_pemasukan(jumlah, f'Masuk {jumlah}')
+    
+    reads = []
+    batch_get = spreadsheet.values_batch_get
+    
+    def recording(ranges, params=None):
+        reads.extend(ranges)
+        return batch_get(ranges, params)
+    
+    monkeypatch.setattr(spreadsheet, 'values_batch_get', recording)
+    
+    expected = ['Masuk 300', 'Masuk 200', 'Masuk 100'] + [f'Lunas {i} - Tingkat 1' for i in range(8, -1, -1)] + ['Modal awal usaha']
+    assert manager.get_keuangan_count() == len(expected)
+    
+    pages = [manager.get_keuangan_history(5, offset) for offset in range(0, 15, 5)]
+    assert [len(page) for page in pages] == [5, 5, 3]
+    assert [entry['keterangan'] for page in pages for entry in page] == expected
+    assert pages[0][0] == {
+        'tanggal': '2026-08-20 10:00:00', 'tipe': 'Pemasukan', 'keterangan': 'Masuk 300',
+        'debit': 300, 'kredit': 0, 'saldo': 1045600
+    }
+    # Every read is a bounded A1 range, never the whole sheet
+    assert reads and all(range_name.rsplit('!', 1)[1].startswith('A') and ':F' in range_name for range_name in reads)
+    
+    assert manager.get_keuangan_history(5, 13) == []
+    assert manager.get_keuangan_history(0) == []
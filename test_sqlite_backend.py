@@ -0,0 +1,83 @@
+import random
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import benchmark
+from sqlite_backend import SQLiteBackend
+from testkit import make_manager
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'botutang.db'))
+    backend.initialize_sheets()
+    yield backend
+    backend.close()
+
+def test_close_closes_every_thread_connection(backend):
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        connections = list(executor.map(lambda _: backend._conn(), range(3)))
+    connections.append(backend._conn())
+    
+    backend.close()
+    
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+    # Still usable afterwards, with a fresh connection
+    backend.add_topup(100)
+    assert backend.get_current_saldo() == 100
+
+def test_export_closes_the_spool_when_writing_fails(backend, monkeypatch):
+    backend.add_debt_quick(1, 'Budi', 1000)
+    spools = []
+    spooled_file = tempfile.SpooledTemporaryFile
+    
+    def tracked(*args, **kwargs):
+        spools.append(spooled_file(*args, **kwargs))
+        return spools[-1]
+    
+    def failing_writer(*args, **kwargs):
+        raise OSError('disk full')
+    
+    monkeypatch.setattr(tempfile, 'SpooledTemporaryFile', tracked)
+    monkeypatch.setattr('csv.writer', failing_writer)
+    with pytest.raises(OSError):
+        backend.export_data(1)
+    assert spools[0].closed
+
+@pytest.mark.parametrize('mode', list(benchmark.MODES))
+def test_sqlite_matches_sheets_for_random_commands(clock, backend, mode):
+    rnd = random.Random(mode)
+    sheets = make_manager(**benchmark.MODES[mode])
+    names = ['Budi', 'budi ', 'Ani', 'ANI', 'Cici']
+    
+    for step in range(150):
+        tingkat = rnd.randint(1, 4)
+        nama = rnd.choice(names)
+        jumlah = rnd.randint(1, 50) * 100
+        method, args = rnd.choice([
+            ('add_debt_quick', (tingkat, nama, jumlah)),
+            ('process_payment', (nama, tingkat, jumlah)),
+            ('mark_as_paid', (nama, tingkat)),
+            ('add_topup', (jumlah,)),
+            ('add_penarikan', (jumlah,)),
+            ('add_pemasukan', (jumlah, 'x')),
+            ('add_pengeluaran', (jumlah, 'y')),
+            ('set_modal_awal', (jumlah,)),
+            ('import_data', (tingkat, f'Tanggal,Nama,Barang,Jumlah,Harga Satuan,Total\n2024-01-01,{nama},Roti,1,5,{jumlah}\n')),
+        ])
+        assert getattr(sheets, method)(*args) == getattr(backend, method)(*args), (step, method)
+        for query, query_args in [
+            ('get_unpaid_customers', ()), ('get_stats', ()), ('get_dashboard', ()),
+            ('get_total_debt', (nama,)), ('get_debt_breakdown', (nama,)), ('get_keuangan_summary', ())
+        ]:
+            assert getattr(sheets, query)(*query_args) == getattr(backend, query)(*query_args), (step, query)
+    
+    assert sheets.get_keuangan_count() == backend.get_keuangan_count()
+    assert sheets.get_keuangan_history(20, 5) == backend.get_keuangan_history(20, 5)
+    for nama in names:
+        assert sheets.get_customer_history(nama) == backend.get_customer_history(nama)
+    for tingkat in range(1, 5):
+        with sheets.export_data(tingkat) as expected, backend.export_data(tingkat) as exported:
+            assert exported.read() == expected.read()
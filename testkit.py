@@ -0,0 +1,23 @@
+"""Shared helpers for the tests: a settable clock and fake-backed managers"""
+import datetime as real_datetime
+from benchmark import UNPACED
+from fake_gspread import FakeSpreadsheet
+from sheets_manager import SheetsManager
+
+class FrozenClock(real_datetime.datetime):
+    """datetime whose now() is set by the test"""
+    current = real_datetime.datetime(2026, 8, 20, 10, 0, 0)
+    
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+def make_manager(spreadsheet: FakeSpreadsheet = None, **kwargs) -> SheetsManager:
+    """Initialized SheetsManager on a fake spreadsheet, without client-side quota pacing"""
+    manager = SheetsManager(None, None, spreadsheet=spreadsheet or FakeSpreadsheet(), **UNPACED, **kwargs)
+    manager.initialize_sheets()
+    return manager
+
+def sheet_contents(spreadsheet: FakeSpreadsheet) -> dict:
+    """Every worksheet's values by title"""
+    return {worksheet.title: worksheet.get_all_values() for worksheet in spreadsheet.worksheets()}
@@ -0,0 +1,73 @@
+import logging
+from collections import deque
+from typing import Awaitable, Deque, Dict, Hashable
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Process updates one at a time per chat/user, concurrently across users
+    
+    ConversationHandler keeps its state per (chat, user) and expects that
+    user's updates in order. PTB takes a concurrency slot before calling
+    do_process_update, so an update that only waits for its chat must not
+    keep one: it is queued behind the running update of the same chat and
+    returns at once, and the running update works through that queue in
+    order. Each busy chat therefore holds exactly one of the
+    max_concurrent_updates slots, and a long backlog in one chat never
+    delays the others. A chat's queue is dropped with its last update.
+    """
+    
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Updates waiting behind the running one, per chat/user
+        self._pending: Dict[Hashable, Deque[Awaitable]] = {}
+    
+    @staticmethod
+    def _key(update: object):
+        """Conversation key of the update, None for updates without chat or user"""
+        if not isinstance(update, Update):
+            return None
+        chat, user = update.effective_chat, update.effective_user
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+    
+    async def do_process_update(self, update: object, coroutine) -> None:
+        """Run the update now, or queue it behind the running update of its chat/user"""
+        key = self._key(update)
+        if key is None:
+            await coroutine
+            return
+        
+        if key in self._pending:
+            # The chat's running update picks it up, so no slot is held while it waits
+            self._pending[key].append(coroutine)
+            return
+        
+        pending = self._pending[key] = deque()
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception as e:
+                    # Later updates of the chat must still run
+                    logger.error(f"Error processing update for {key}: {e}")
+                if not pending:
+                    break
+                coroutine = pending.popleft()
+        finally:
+            del self._pending[key]
+            # Only reached with updates left on cancellation; close them unawaited
+            for coroutine in pending:
+                coroutine.close()
+    
+    async def initialize(self) -> None:
+        """Nothing to set up, queues are created per chat"""
+        pass
+    
+    async def shutdown(self) -> None:
+        """Nothing to release, queues go away with their last update"""
+        pass
@@ -0,0 +1,92 @@
+"""Post recorded Telegram updates to a locally running webhook endpoint
+
+Usage:
+    python webhook_harness.py --secret <WEBHOOK_SECRET_TOKEN>
+    python webhook_harness.py --url http://127.0.0.1:8443/telegram --secret s3cret --updates updates.jsonl
+
+Start the bot in webhook mode first (WEBHOOK_URL set; Telegram does not need
+to reach it for this). Each update is posted with the secret token header and
+must be accepted with 200; one extra post with a wrong token must be rejected
+with 403. --updates takes one Update JSON object per line, e.g. the `result`
+entries of getUpdates; without it a few built-in updates are sent. Replies go
+to the recorded chat through the real Bot API, so use your own chat id.
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from typing import List, Dict
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+def sample_updates(chat_id: int) -> List[Dict]:
+    """Updates covering both subscribed types: commands, plain text and a button press"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Harness'}
+    chat = {'id': chat_id, 'type': 'private', 'first_name': 'Harness'}
+    now = int(time.time())
+    
+    def message(message_id: int, text: str) -> Dict:
+        entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}] if text.startswith('/') else []
+        return {'message_id': message_id, 'date': now, 'chat': chat, 'from': user, 'text': text, 'entities': entities}
+    
+    return [
+        {'update_id': 1, 'message': message(1, '/saldo')},
+        {'update_id': 2, 'message': message(2, '/start')},
+        {'update_id': 3, 'callback_query': {
+            'id': '3', 'from': user, 'chat_instance': str(chat_id), 'data': 'tingkat_1',
+            'message': dict(message(3, 'Pilih tingkat:'), **{'from': dict(user, is_bot=True, id=1)})
+        }},
+        {'update_id': 4, 'message': message(4, '/cancel')},
+        {'update_id': 5, 'message': message(5, '/history')},
+    ]
+
+def load_updates(path: str) -> List[Dict]:
+    """Read recorded updates, one JSON object per line"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def post(url: str, update: Dict, secret: str) -> int:
+    """Send one update the way Telegram does and return the HTTP status"""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode('utf-8'),
+        headers={'Content-Type': 'application/json', SECRET_HEADER: secret},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram',
+                        help='local webhook endpoint (listen address, port and WEBHOOK_PATH)')
+    parser.add_argument('--secret', required=True, help='WEBHOOK_SECRET_TOKEN of the bot')
+    parser.add_argument('--updates', help='recorded updates, one JSON object per line')
+    parser.add_argument('--chat-id', type=int, default=1, help='chat/user id of the built-in updates')
+    parser.add_argument('--delay', type=float, default=0.5, help='seconds between updates')
+    args = parser.parse_args()
+    
+    updates = load_updates(args.updates) if args.updates else sample_updates(args.chat_id)
+    failures = 0
+    
+    for update in updates:
+        kind = next((key for key in update if key != 'update_id'), '?')
+        status = post(args.url, update, args.secret)
+        print(f"update {update.get('update_id')} ({kind}): HTTP {status}")
+        failures += status != 200
+        time.sleep(args.delay)
+    
+    # A wrong token must never reach the handlers
+    status = post(args.url, updates[0], args.secret + '-wrong')
+    print(f"wrong secret token: HTTP {status}")
+    failures += status != 403
+    
+    print('OK' if not failures else f'{failures} unexpected response(s)')
+    raise SystemExit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()